@@ -0,0 +1,121 @@
+"""Multiple partner events providers controller module."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, ItemsView
+
+from app.controllers.search import NOT_MODIFIED, PartnerEventsController
+from app.controllers.search import store_events
+from app.core import settings
+from app.core.executors import create_parse_executor
+from app.core.logger import logger
+from app.core.storage import BaseStorage
+from app.models import PartnerEvent
+
+
+# Name of the primary provider, the one at settings.EVENT_PROVIDER_URL.
+PRIMARY_PROVIDER = ""
+
+
+class ProviderRegistry:
+    """Partner events providers by name. Every provider has its own
+    controller, i.e. fetcher and parser, circuit breaker, limit of
+    concurrent fetches and refresh deadline."""
+
+    def __init__(self):
+        self._controllers: Dict[str, PartnerEventsController] = {}
+
+    def register(self, name: str, controller: PartnerEventsController):
+        if name in self._controllers:
+            raise ValueError(f"Provider {name!r} is registered already")
+        self._controllers[name] = controller
+
+    def items(self) -> ItemsView[str, PartnerEventsController]:
+        return self._controllers.items()
+
+    def __len__(self) -> int:
+        return len(self._controllers)
+
+
+def namespaced(event: PartnerEvent, provider: str) -> PartnerEvent:
+    """Returns event with base_event_id prefixed by provider name, so that
+    events of different providers never share storage key. Events of the
+    primary provider keep their ids, so events stored before providers
+    were added keep their keys (and UUIDs)."""
+
+    if provider == PRIMARY_PROVIDER:
+        return event
+    return event.copy(
+        update={"base_event_id": f"{provider}:{event.base_event_id}"})
+
+
+class ProvidersController:
+    """Refreshes storage with events of all registered providers.
+
+    Providers are fetched concurrently, so refresh takes about as long as
+    the slowest of them rather than the sum of them. New events of all the
+    providers are written to storage in one batch. Has the interface of
+    PartnerEventsController, so RefreshScheduler can run either.
+    """
+
+    def __init__(self, registry: ProviderRegistry):
+        self.registry = registry
+
+    async def aclose(self):
+        """Closes HTTP clients of all the providers."""
+
+        await asyncio.gather(*(
+            controller.aclose() for _, controller in self.registry.items()))
+
+    async def handle_new_events_request(self, storage: BaseStorage) -> bool:
+        """Fetches and parses events of all the providers concurrently, then
+        stores them in one batch. Returns False if requests to all the
+        providers failed."""
+
+        names, controllers = zip(*self.registry.items())
+        results = await asyncio.gather(
+            *(controller.fetch_new_events() for controller in controllers),
+            return_exceptions=True)
+
+        succeeded = False
+        merged_events = []
+        commits = []
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logger.error("Provider %r refresh failed", name,
+                             exc_info=result)
+                continue
+            if result is None:
+                logger.warning("Provider %r refresh failed", name)
+                continue
+            succeeded = True
+            if result is NOT_MODIFIED:
+                logger.info("Provider %r events not modified since the last "
+                            "fetch.", name)
+                continue
+            merged_events.extend(
+                namespaced(event, name) for event in result.events)
+            commits.append(result.commit)
+
+        if commits:
+            await store_events(storage, merged_events)
+            for commit in commits:
+                commit()
+        return succeeded
+
+
+def create_providers_controller() -> ProvidersController:
+    """Returns controller of the primary provider and the ones configured
+    in settings.EVENT_PROVIDERS, which share one parse worker pool."""
+
+    executor = create_parse_executor()
+    registry = ProviderRegistry()
+    registry.register(PRIMARY_PROVIDER,
+                      PartnerEventsController(executor=executor))
+    for provider in settings.EVENT_PROVIDERS.split(","):
+        if provider.strip():
+            name, url = provider.strip().split("=", 1)
+            registry.register(
+                name, PartnerEventsController(executor=executor, url=url))
+    return ProvidersController(registry)
@@ -1,19 +1,156 @@
 """Partner Events API controller module."""
 
-from datetime import datetime
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+import logging
+from functools import partial
+import time
+from typing import Awaitable, Callable, List, NamedTuple
 
 import httpx
 from lxml import etree
 
+from app.core import metrics
 from app.core import parsers
 from app.core import settings
+from app.core.executors import create_parse_executor
+from app.core.http_client import create_http_client
 from app.core.logger import logger
+from app.core.resilience import CircuitBreaker, backoff_delay
 from app.core.storage import BaseStorage
 from app.models import PartnerEvent
 
 
+# Returned by fetch_events_from_partner_api when partner API responded
+# with 304 Not Modified, i.e. events did not change since the last fetch.
+NOT_MODIFIED = object()
+
+
+class FetchedEvents(NamedTuple):
+    """New partner events fetched from partner API, and the callback which
+    must be called once they are stored (it remembers the response, of
+    streamed and whole responses alike, so that the next fetch is
+    conditional or incremental to it). Until then, the next fetch gets
+    the same events again."""
+
+    events: List[PartnerEvent]
+    commit: Callable[[], None]
+
+
 class PartnerEventsController:
-    """Partner API events controller."""
+    """Partner API events controller.
+
+    Fetches and parses events of one partner API: the one at url (by
+    default settings.EVENT_PROVIDER_URL) in partner xml format, or in
+    other format, if parse_content is given (then the response is parsed
+    as a whole, neither streamed nor incrementally, in the worker pool as
+    xml is, so with worker processes it must be a module-level function).
+    Partner API is
+    requested by at most max_concurrent_fetches fetches at once, and
+    refresh is given up after deadline seconds (0 - no deadline).
+    """
+
+    def __init__(self, client: httpx.AsyncClient | None = None,
+                 executor: Executor | None = None,
+                 url: str | None = None,
+                 parse_content: Callable[[bytes], List[PartnerEvent]]
+                 | None = None,
+                 max_concurrent_fetches: int | None = None,
+                 deadline: float | None = None):
+        self._client = client
+        self._executor = executor or create_parse_executor()
+        self.url = url or settings.EVENT_PROVIDER_URL
+        self._parse_content = parse_content
+        self.deadline = (settings.REFRESH_DEADLINE if deadline is None
+                         else deadline)
+        # Validators of the last partner API response, for conditional GET.
+        self._etag: str | None = None
+        self._last_modified: str | None = None
+        # base_event fingerprints of the last stored response, for
+        # incremental refresh
+        self._feed = parsers.FeedFingerprints()
+        self.circuit_breaker = CircuitBreaker(
+            settings.CIRCUIT_BREAKER_FAILURES,
+            settings.CIRCUIT_BREAKER_RESET_TIMEOUT)
+        self._fetch_slots = asyncio.Semaphore(
+            max_concurrent_fetches or settings.MAX_CONCURRENT_FETCHES)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """HTTP client with connection pool, shared by all the fetches."""
+
+        if self._client is None or self._client.is_closed:
+            self._client = create_http_client()
+        return self._client
+
+    async def aclose(self):
+        """Closes HTTP client and its pooled connections."""
+
+        if self._client is not None:
+            await self._client.aclose()
+
+    @property
+    def offline_events(self) -> set:
+        """Keys of stored events, which incremental refresh found gone from
+        partner feed or not online anymore."""
+
+        return self._feed.offline_events
+
+    async def parse_events(
+            self, content: bytes,
+            incremental: parsers.IncrementalParser | None = None,
+    ) -> list[PartnerEvent]:
+        """Parses partner API response into Partner Events. In worker pool,
+        if configured, so that large responses do not block event loop.
+
+        With incremental parser, only new and changed events are returned.
+        It is passed to the worker pool with fingerprints of the previous
+        response, and takes over the state of its copy which parsed the
+        response there (with worker processes).
+        """
+
+        with metrics.PARSE_SECONDS.time():
+            if self._parse_content is not None:
+                if self._executor is None:
+                    return self._parse_content(content)
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self._executor, self._parse_content, content)
+
+            if incremental is not None:
+                if self._executor is None:
+                    return self._parse_incrementally(content, incremental)
+                loop = asyncio.get_running_loop()
+                compact_events, parsed = await loop.run_in_executor(
+                    self._executor, parsers.parse_compact_events_incrementally,
+                    content, incremental)
+                incremental.adopt(parsed)
+                return [parsers.partner_event_from_compact(compact_event)
+                        for compact_event in compact_events]
+
+            if self._executor is None:
+                # Parse the XML response
+                xml_tree = etree.fromstring(content)
+                root = xml_tree.getroottree().getroot()
+
+                # Access specific elements and data
+                return parsers.parse_events_data_from_xml(root)
+
+            loop = asyncio.get_running_loop()
+            compact_events, filtered = await loop.run_in_executor(
+                self._executor, parsers.parse_compact_events_from_xml, content)
+            metrics.EVENTS_FILTERED.inc(filtered)
+            return [parsers.partner_event_from_compact(compact_event)
+                    for compact_event in compact_events]
+
+    @staticmethod
+    def _parse_incrementally(
+            content: bytes,
+            incremental: parsers.IncrementalParser) -> list[PartnerEvent]:
+        root = etree.fromstring(content).getroottree().getroot()
+        return incremental.parse(root)
 
     async def fetch_events_from_partner_api(self):
         """Makes request to event partner API.
@@ -21,57 +158,259 @@ class PartnerEventsController:
         async/await allows not to block server on waiting response and it can go
         and do something else in the meanwhile (like receiving another request).
         More info: https://fastapi.tiangolo.com/async/#async-and-await
+
+        Returns the response. Request is conditional (If-None-Match /
+        If-Modified-Since) once events of a response with validators were
+        stored (see _commit), so NOT_MODIFIED is returned instead of
+        downloading the same events again. Failed request is retried (see
+        _with_retries), and None is returned if it failed anyway.
         """
 
-        async with httpx.AsyncClient() as client:
+        try:
+            return await self._with_retries(self._fetch_once)
+        except httpx.HTTPError:
+            return None
+
+    async def _fetch_once(self):
+        with metrics.PROVIDER_FETCH_SECONDS.time():
+            response = await self.client.get(
+                self.url,
+                headers=self._conditional_headers(),
+                timeout=settings.REQUEST_TIMEOUT)
+        if response.status_code == httpx.codes.NOT_MODIFIED:
+            return NOT_MODIFIED
+        response.raise_for_status()
+        # validators are remembered once events are stored, so that events
+        # which failed to parse or store are fetched again
+        return response
+
+    async def _with_retries(self, attempt: Callable[[], Awaitable]):
+        """Returns result of partner API request attempt(). Attempts which
+        failed on a transient error (connection error, timeout, 5xx or 429
+        response) are retried up to FETCH_RETRIES times after jittered
+        exponential backoff, while circuit breaker allows. Raises the last
+        error if all the attempts failed. Any failed attempt is recorded by
+        circuit breaker."""
+
+        breaker = self.circuit_breaker
+        retry = 0
+        while True:
             try:
-                response = await client.get(settings.EVENT_PROVIDER_URL,
-                                            timeout=settings.REQUEST_TIMEOUT)
+                result = await attempt()
+            except httpx.HTTPError as exc:
+                breaker.record_failure()
+                self._log_request_error(exc)
+                if (retry >= settings.FETCH_RETRIES
+                        or not self._is_transient(exc)
+                        or not breaker.allow_request()):
+                    raise
+            except asyncio.CancelledError:
+                # refresh deadline passed while waiting for partner API
+                breaker.record_failure()
+                raise
+            except Exception:
+                # e.g. malformed response parsed while streamed, which is
+                # not retried, but must not leave half-open breaker so
+                breaker.record_failure()
+                raise
+            else:
+                breaker.record_success()
+                return result
+
+            metrics.PROVIDER_FETCH_RETRIES.inc()
+            await asyncio.sleep(backoff_delay(
+                retry, settings.FETCH_BACKOFF_BASE, settings.FETCH_BACKOFF_MAX))
+            retry += 1
+
+    @staticmethod
+    def _is_transient(exc: httpx.HTTPError) -> bool:
+        if isinstance(exc, httpx.HTTPStatusError):
+            status_code = exc.response.status_code
+            return (status_code >= 500
+                    or status_code == httpx.codes.TOO_MANY_REQUESTS)
+        return isinstance(exc, httpx.TransportError)
+
+    def _conditional_headers(self) -> dict:
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+        return headers
+
+    def _remember_validators(self, response: httpx.Response):
+        self._etag = response.headers.get("ETag")
+        self._last_modified = response.headers.get("Last-Modified")
+
+    @staticmethod
+    def _log_request_error(exc: httpx.HTTPError):
+        if isinstance(exc, httpx.HTTPStatusError):
+            logger.error("Error response %s while requesting %s",
+                         exc.response.status_code, exc.request.url)
+        else:
+            logger.error("An error occurred while requesting %s",
+                         exc.request.url)
+
+    async def handle_new_events_request(self, storage: BaseStorage) -> bool:
+        """Handles request, parse and then store partner event data.
+
+        Returns False if partner API request failed or was not made (see
+        fetch_new_events).
+        """
+
+        fetched = await self.fetch_new_events()
+        if fetched is None:
+            return False
+        if fetched is NOT_MODIFIED:
+            logger.info("Partner events not modified since the last fetch.")
+            return True
+
+        await store_events(storage, fetched.events)
+        fetched.commit()
+        return True
+
+    async def fetch_new_events(self):
+        """Fetches and parses partner events, which are new since the last
+        stored fetch. Returns FetchedEvents, NOT_MODIFIED, or None if
+        partner API request failed or was not made.
+
+        Partner API is not called while circuit breaker is open, and the
+        whole fetch is given up after deadline seconds, so stored events
+        are served meanwhile.
+        """
+
+        if not self.circuit_breaker.allow_request():
+            metrics.PROVIDER_FETCH_REJECTED.inc()
+            logger.warning("Partner API circuit breaker is open, "
+                           "events are served from storage.")
+            return None
+
+        try:
+            async with asyncio.timeout(self.deadline or None):
+                # fetches beyond the limit wait here, within the deadline
+                async with self._fetch_slots:
+                    if (settings.XML_STREAM_PARSING
+                            and self._parse_content is None):
+                        return await self._fetch_stream()
+                    return await self._fetch_content()
+        except TimeoutError:
+            logger.error("Partner events refresh exceeded deadline of "
+                         "%s seconds.", self.deadline)
+            return None
+
+    def _incremental_parser(self) -> parsers.IncrementalParser | None:
+        if settings.INCREMENTAL_REFRESH and self._parse_content is None:
+            return self._feed.parser()
+        return None
+
+    async def _fetch_content(self):
+        response = await self.fetch_events_from_partner_api()
+        if response is None or response is NOT_MODIFIED:
+            return response
+
+        incremental = self._incremental_parser()
+        partner_events_data = await self.parse_events(response.content,
+                                                      incremental)
+        metrics.EVENTS_PARSED.inc(len(partner_events_data))
+        # the list may be huge, so it is not even passed to logger, unless
+        # it is going to be logged
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("partner_events_data from xml: %s",
+                         partner_events_data)
+        return FetchedEvents(partner_events_data,
+                             partial(self._commit, incremental, response))
+
+    async def _fetch_stream(self):
+        """Same as _fetch_content, but parses partner API response while it
+        is being downloaded. So neither the whole response nor its whole xml
+        tree are kept in memory, only parsed events. Failed download is
+        retried from the start.
+        """
+
+        try:
+            streamed = await self._with_retries(self._stream_once)
+        except httpx.HTTPError:
+            return None
+        if streamed is NOT_MODIFIED:
+            return NOT_MODIFIED
+
+        partner_events_data, incremental, response = streamed
+        return FetchedEvents(partner_events_data,
+                             partial(self._commit, incremental, response))
+
+    def _commit(self, incremental: parsers.IncrementalParser | None,
+                response: httpx.Response | None):
+        if incremental is not None:
+            self._commit_feed(incremental)
+        if response is not None:
+            self._remember_validators(response)
+
+    async def _stream_once(self):
+        """Returns events parsed while partner API response is downloaded,
+        their incremental parser (if enabled) and the response."""
+
+        incremental = self._incremental_parser()
+        parser = parsers.EventsStreamParser(incremental)
+        partner_events_data = []
+        # parsing is interleaved with download, so their times are summed up
+        # separately
+        parse_seconds = 0.0
+        started_at = time.perf_counter()
+        try:
+            async with self.client.stream(
+                    "GET", self.url,
+                    headers=self._conditional_headers(),
+                    timeout=settings.REQUEST_TIMEOUT) as response:
+                if response.status_code == httpx.codes.NOT_MODIFIED:
+                    return NOT_MODIFIED
                 response.raise_for_status()
-            except httpx.RequestError as exc:
-                logger.error("An error occurred while requesting %s",
-                             exc.request.url)
-                return
-            except httpx.HTTPStatusError as exc:
-                logger.error("Error response %s while requesting %s",
-                             exc.response.status_code, exc.request.url)
-                return
-            return response.content
-
-    async def handle_new_events_request(self, starts_from: datetime,
-                                        ends_to: datetime,
-                                        storage: BaseStorage):
-        """Handles request, parse and then store partner event data."""
-
-        response_content = await self.fetch_events_from_partner_api()
-        if response_content is None:
-            return
-
-        # Parse the XML response
-        xml_tree = etree.fromstring(response_content)
-        root = xml_tree.getroottree().getroot()
-
-        # Access specific elements and data
-        partner_events_data: list[PartnerEvent | None] = (
-            parsers.parse_events_data_from_xml(root))
-        logger.debug("partner_events_data from xml: %s", partner_events_data)
-
-        # Filter partner data so that we will store only events between user
-        # specified start and end datetime.
-        for idx, event in enumerate(partner_events_data):
-            if not (starts_from <= event.start and event.end <= ends_to):
-                # avoid expensive shift of element
-                partner_events_data[idx] = None
-
-        logger.debug("partner_events_data after filter: %s",
-                     partner_events_data)
-
-        # then store events in the storage
-        if partner_events_data:
-
-            for event in partner_events_data:
-                if event is not None:
-                    storage.set_event(event)
-
-            logger.info("Partner events saved in storage. "
-                        "They will be available on the next request.")
+
+                async for chunk in response.aiter_bytes():
+                    parse_started_at = time.perf_counter()
+                    partner_events_data.extend(parser.feed(chunk))
+                    parse_seconds += time.perf_counter() - parse_started_at
+        finally:
+            metrics.PROVIDER_FETCH_SECONDS.observe(
+                time.perf_counter() - started_at - parse_seconds)
+
+        parse_started_at = time.perf_counter()
+        partner_events_data.extend(parser.close())
+        metrics.PARSE_SECONDS.observe(
+            parse_seconds + time.perf_counter() - parse_started_at)
+        metrics.EVENTS_PARSED.inc(len(partner_events_data))
+        return partner_events_data, incremental, response
+
+    def _commit_feed(self, incremental: parsers.IncrementalParser):
+        """Makes stored response the previous one for incremental refresh,
+        and records events which went offline."""
+
+        disappeared = self._feed.commit(incremental)
+        metrics.EVENTS_FILTERED.inc(incremental.filtered)
+        metrics.EVENTS_UNCHANGED_SKIPPED.inc(incremental.unchanged)
+        metrics.EVENTS_WENT_OFFLINE.inc(len(disappeared))
+        logger.info("Incremental refresh: %s events unchanged, "
+                    "%s events went offline.",
+                    incremental.unchanged, len(disappeared))
+
+
+async def store_events(storage: BaseStorage, events: list[PartnerEvent]):
+    """Writes partner events to storage in one batch, and reports it.
+
+    The batch is written in the default thread pool of event loop, as
+    storages build the new version of their events and indexes (a copy,
+    with local storage) on write, which would block requests meanwhile.
+    Storages publish it at once, so requests keep reading the previous one
+    until then.
+    """
+
+    loop = asyncio.get_running_loop()
+    with metrics.STORAGE_APPLY_SECONDS.time():
+        write_result = await loop.run_in_executor(None, storage.set_events,
+                                                  events)
+
+    for result, count in write_result._asdict().items():
+        metrics.EVENTS_STORED.inc(count, (result,))
+    logger.info("Partner events saved in storage: %s inserted, "
+                "%s updated, %s unchanged. "
+                "They will be available on the next request.",
+                *write_result)
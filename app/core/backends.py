@@ -0,0 +1,49 @@
+"""Storage backends module."""
+
+from __future__ import annotations
+
+from app.core import settings
+from app.core.cached_storage import CachedStorage
+from app.core.storage import BaseStorage
+from app.core.storage import local_event_storage
+
+
+def create_event_storage() -> BaseStorage:
+    """Returns events storage configured by STORAGE_BACKEND setting, with
+    query results cache if STORAGE_CACHE_SIZE is set."""
+
+    storage = create_storage_backend()
+    if settings.STORAGE_CACHE_SIZE:
+        return CachedStorage(storage, settings.STORAGE_CACHE_SIZE,
+                             settings.STORAGE_CACHE_TTL or None)
+    return storage
+
+
+def create_storage_backend() -> BaseStorage:
+    """Returns events storage configured by STORAGE_BACKEND setting."""
+
+    if settings.STORAGE_BACKEND == "sqlite":
+        # pylint: disable=import-outside-toplevel
+        from app.core.sqlite_storage import SQLiteEventStorage
+        return SQLiteEventStorage(settings.SQLITE_PATH)
+    if settings.STORAGE_BACKEND == "shared":
+        # pylint: disable=import-outside-toplevel
+        from app.core.shared_storage import SharedSnapshotStorage
+        return SharedSnapshotStorage(settings.SHARED_SNAPSHOT_PATH)
+    if settings.STORAGE_BACKEND == "columnar":
+        # pylint: disable=import-outside-toplevel
+        from app.core.columnar_storage import ColumnarEventStorage
+        return ColumnarEventStorage()
+    if settings.STORAGE_BACKEND == "local":
+        if settings.SNAPSHOT_PATH:
+            # pylint: disable=import-outside-toplevel
+            from app.core.warm_storage import WarmStartStorage
+            return WarmStartStorage(local_event_storage,
+                                    settings.SNAPSHOT_PATH,
+                                    settings.SNAPSHOT_INTERVAL)
+        return local_event_storage
+    raise ValueError(
+        f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND!r}")
+
+
+event_storage = create_event_storage()
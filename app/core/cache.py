@@ -0,0 +1,101 @@
+"""Caches module."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Hashable
+
+from app.core import metrics
+from app.core import settings
+
+
+class VersionedLRUCache:
+    """LRU cache of values derived from storage data.
+
+    Values are cached together with storage version they were computed
+    for, and all of them are dropped as soon as a newer version is seen,
+    so that every storage write invalidates the cache. With ttl, values
+    also expire ttl seconds after they were cached.
+
+    Lookups, evictions and expirations of a named cache are also counted
+    on /metrics, labelled by its name.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None,
+                 name: str | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._metric_labels = (name,) if name else None
+        # key -> (value, monotonic time it expires at or None)
+        self._values: OrderedDict[Hashable, tuple] = OrderedDict()
+        self._version: int | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, key: Hashable, version: int) -> Any | None:
+        """Returns value cached for given key and storage version, or None.
+        """
+
+        with self._lock:
+            if version != self._version:
+                self._values.clear()
+                self._version = version
+
+            value, expires_at = self._values.get(key, (None, None))
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._values[key]
+                self.expirations += 1
+                self._count(metrics.CACHE_EXPIRATIONS)
+                value = None
+            if value is None:
+                self.misses += 1
+                self._count(metrics.CACHE_MISSES)
+                return None
+
+            self._values.move_to_end(key)
+            self.hits += 1
+            self._count(metrics.CACHE_HITS)
+            return value
+
+    def set(self, key: Hashable, version: int, value: Any):
+        """Caches value computed for given key and storage version."""
+
+        with self._lock:
+            if version != self._version or not self.maxsize:
+                return
+
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            self._values[key] = (value, expires_at)
+            self._values.move_to_end(key)
+            if len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+                self.evictions += 1
+                self._count(metrics.CACHE_EVICTIONS)
+
+    def _count(self, counter: metrics.Counter):
+        if self._metric_labels is not None:
+            counter.inc(labels=self._metric_labels)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._values),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# /search response bodies, already encoded to JSON
+search_response_cache = VersionedLRUCache(settings.RESPONSE_CACHE_SIZE,
+                                          name="search_response")
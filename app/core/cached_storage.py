@@ -0,0 +1,157 @@
+"""Query results caching storage module."""
+
+from __future__ import annotations
+
+from concurrent.futures import Future
+from datetime import date, datetime
+import threading
+from typing import Callable, Hashable, Iterable, Iterator, List
+
+from app.core import metrics
+from app.core.cache import VersionedLRUCache
+from app.core.storage import BaseStorage, EventFilter, WriteResult
+from app.models import EventSummary
+from app.models import PartnerEvent
+
+
+class CachedStorage(BaseStorage):
+    """BaseStorage wrapper, which memoizes range query results of any
+    storage.
+
+    Results are cached per (start_from, ends_to) range and storage version
+    (see VersionedLRUCache), so every storage write invalidates them, while
+    maxsize and ttl bound the cache size and age of results. Concurrent
+    identical queries are coalesced: the first one computes the result and
+    the others wait for it, instead of computing it again. Cache hits,
+    misses, evictions, expirations and coalesced queries are counted on
+    /metrics (and reported on /health).
+
+    Cached results are shared by all the callers, so they must not be
+    changed. Lazy iter_events and iter_events_json are not cached.
+    """
+
+    def __init__(self, storage: BaseStorage, maxsize: int,
+                 ttl: float | None = None):
+        self.storage = storage
+        self._cache = VersionedLRUCache(maxsize, ttl, name="storage")
+        # (query key, storage version) -> Future of the query result
+        self._in_flight: dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def _cached(self, key: Hashable, compute: Callable):
+        """Returns cached result of the query, or computes it once for all
+        the concurrent callers."""
+
+        version = self.storage.version
+        result = self._cache.get(key, version)
+        if result is not None:
+            return result
+
+        in_flight_key = (key, version)
+        with self._lock:
+            future = self._in_flight.get(in_flight_key)
+            is_computing = future is None
+            if is_computing:
+                future = self._in_flight[in_flight_key] = Future()
+            else:
+                self.coalesced += 1
+                metrics.STORAGE_QUERIES_COALESCED.inc()
+        if not is_computing:
+            return future.result()
+
+        try:
+            result = compute()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            self._cache.set(key, version, result)
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._in_flight[in_flight_key]
+        return result
+
+    @property
+    def version(self) -> int:
+        return self.storage.version
+
+    @property
+    def is_read_only(self) -> bool:
+        return self.storage.is_read_only
+
+    @property
+    def refreshed_at(self) -> datetime | None:
+        return self.storage.refreshed_at
+
+    def get_events(self,
+                   start_from: datetime,
+                   ends_to: datetime) -> List[EventSummary]:
+        """Returns list of EventSummary from wrapped storage within
+        specified start_from and ends_to time range, cached."""
+
+        return self._cached(
+            ("events", start_from, ends_to),
+            lambda: self.storage.get_events(start_from, ends_to))
+
+    def get_events_json(self,
+                        start_from: datetime,
+                        ends_to: datetime) -> bytes:
+        """Returns JSON array of EventSummary from wrapped storage within
+        specified start_from and ends_to time range, cached."""
+
+        return self._cached(
+            ("json", start_from, ends_to),
+            lambda: self.storage.get_events_json(start_from, ends_to))
+
+    def iter_events(self,
+                    start_from: datetime,
+                    ends_to: datetime) -> Iterator[EventSummary]:
+        return self.storage.iter_events(start_from, ends_to)
+
+    def iter_events_json(self,
+                         start_from: datetime,
+                         ends_to: datetime) -> Iterator[bytes]:
+        return self.storage.iter_events_json(start_from, ends_to)
+
+    def iter_matching_events(self,
+                             start_from: datetime,
+                             ends_to: datetime,
+                             event_filter: EventFilter,
+                             ) -> Iterator[EventSummary]:
+        return self.storage.iter_matching_events(start_from, ends_to,
+                                                 event_filter)
+
+    def iter_matching_events_json(self,
+                                  start_from: datetime,
+                                  ends_to: datetime,
+                                  event_filter: EventFilter,
+                                  ) -> Iterator[bytes]:
+        return self.storage.iter_matching_events_json(start_from, ends_to,
+                                                      event_filter)
+
+    def get_aggregates(self, start_day: date, end_day: date) -> List[dict]:
+        """Returns per day aggregates from wrapped storage, cached."""
+
+        return self._cached(
+            ("aggregates", start_day, end_day),
+            lambda: self.storage.get_aggregates(start_day, end_day))
+
+    def set_event(self, event: PartnerEvent):
+        """Updates event in wrapped storage. Creates new record if need."""
+
+        self.storage.set_event(event)
+
+    def set_events(self, events: Iterable[PartnerEvent]) -> WriteResult:
+        """Updates events in wrapped storage in one batch."""
+
+        return self.storage.set_events(events)
+
+    def close(self):
+        """Closes wrapped storage."""
+
+        self.storage.close()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "coalesced": self.coalesced}
@@ -0,0 +1,27 @@
+"""JSON encoders module."""
+
+from __future__ import annotations
+
+import json
+
+try:
+    import orjson
+except ImportError:  # optional dependency: pip install orjson
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    """Encodes content to compact UTF-8 JSON, in the same way JSONResponse
+    does. With orjson, if it is installed, which is several times faster.
+    """
+
+    if orjson is not None:
+        return orjson.dumps(content)
+
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
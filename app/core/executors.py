@@ -0,0 +1,24 @@
+"""Worker pools module."""
+
+from __future__ import annotations
+
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core import settings
+
+
+def create_parse_executor() -> Executor | None:
+    """Returns worker pool for partner response parsing, as configured in
+    settings, or None if parsing should run on the event loop."""
+
+    if settings.PARSE_EXECUTOR == "process":
+        return ProcessPoolExecutor(max_workers=settings.PARSE_WORKERS)
+    if settings.PARSE_EXECUTOR == "thread":
+        return ThreadPoolExecutor(max_workers=settings.PARSE_WORKERS,
+                                  thread_name_prefix="parse")
+    if settings.PARSE_EXECUTOR:
+        raise ValueError(
+            f"Unknown PARSE_EXECUTOR: {settings.PARSE_EXECUTOR!r}")
+    return None
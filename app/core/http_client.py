@@ -0,0 +1,30 @@
+"""HTTP client module."""
+
+from __future__ import annotations
+
+import httpx
+
+from app.core import settings
+from app.core.logger import logger
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Returns async HTTP client with connection pool, that is meant to be
+    reused for the app lifetime, so that every request to partner API
+    does not pay for new TCP and TLS handshakes.
+    """
+
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY)
+
+    if settings.HTTP2:
+        try:
+            return httpx.AsyncClient(http2=True, limits=limits,
+                                     timeout=settings.REQUEST_TIMEOUT)
+        except ImportError:
+            logger.warning("HTTP/2 requested, but `h2` package is not "
+                           "installed. Falling back to HTTP/1.1.")
+
+    return httpx.AsyncClient(limits=limits, timeout=settings.REQUEST_TIMEOUT)
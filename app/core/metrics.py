@@ -0,0 +1,176 @@
+"""App metrics module.
+
+Counters and histograms of the hot paths (partner events fetch, parse,
+storage writes and /search), rendered in Prometheus text format on
+/metrics. Metrics are process-wide and thread-safe.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+
+# Latency buckets (seconds), from sub-millisecond /search responses up to
+# partner feed downloads.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# metrics rendered on /metrics
+_registry: List[Counter | Histogram] = []
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(
+        f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by label values."""
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Tuple[str, ...] = (),
+                 registry: list | None = _registry):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.append(self)
+
+    def inc(self, amount: float = 1, labels: Tuple[str, ...] = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Tuple[str, ...] = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        if not self.labelnames and not values:
+            values = [((), 0)]
+        for labels, value in values:
+            yield (f"{self.name}{_labels_text(self.labelnames, labels)} "
+                   f"{value}")
+
+
+class Histogram:
+    """Distribution of observed values (e.g. latencies) over buckets."""
+
+    def __init__(self, name: str, documentation: str,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 registry: list | None = _registry):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # observations per bucket, the last one is +Inf
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.append(self)
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        """Observes duration (seconds) of the with block."""
+
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at)
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound}"}} {cumulative}'
+        yield f"{self.name}_sum {total}"
+        yield f"{self.name}_count {cumulative}"
+
+
+def render() -> str:
+    """Returns all the metrics in Prometheus text exposition format."""
+
+    return "".join(f"{line}\n"
+                   for metric in _registry for line in metric.collect())
+
+
+PROVIDER_FETCH_SECONDS = Histogram(
+    "fever_provider_fetch_seconds",
+    "Time of partner API requests, including download of the response.")
+PARSE_SECONDS = Histogram(
+    "fever_parse_seconds", "Time of partner API response parsing.")
+STORAGE_APPLY_SECONDS = Histogram(
+    "fever_storage_apply_seconds",
+    "Time of writing a batch of partner events to storage.")
+SEARCH_SECONDS = Histogram(
+    "fever_search_seconds", "Time of /search request handling.")
+
+EVENTS_PARSED = Counter(
+    "fever_events_parsed_total", "Online partner events parsed.")
+EVENTS_FILTERED = Counter(
+    "fever_events_filtered_total",
+    "Partner events skipped by parser, as they are not sold online.")
+EVENTS_STORED = Counter(
+    "fever_events_stored_total",
+    "Partner events written to storage, by write result.", ("result",))
+EVENTS_UNCHANGED_SKIPPED = Counter(
+    "fever_events_unchanged_skipped_total",
+    "Partner events skipped by incremental refresh, as their base event "
+    "did not change.")
+EVENTS_WENT_OFFLINE = Counter(
+    "fever_events_went_offline_total",
+    "Stored partner events which disappeared from partner feed or are not "
+    "online anymore.")
+PROVIDER_FETCH_RETRIES = Counter(
+    "fever_provider_fetch_retries_total",
+    "Partner API requests retried after a transient error.")
+PROVIDER_FETCH_REJECTED = Counter(
+    "fever_provider_fetch_rejected_total",
+    "Partner events refreshes not made, as circuit breaker was open.")
+CACHE_HITS = Counter(
+    "fever_cache_hits_total", "Cache lookups which found a value, by cache.",
+    ("cache",))
+CACHE_MISSES = Counter(
+    "fever_cache_misses_total",
+    "Cache lookups which found no value (or an expired one), by cache.",
+    ("cache",))
+CACHE_EVICTIONS = Counter(
+    "fever_cache_evictions_total",
+    "Values dropped from a full cache as least recently used, by cache.",
+    ("cache",))
+CACHE_EXPIRATIONS = Counter(
+    "fever_cache_expirations_total",
+    "Values dropped from cache as older than its ttl, by cache.", ("cache",))
+STORAGE_QUERIES_COALESCED = Counter(
+    "fever_storage_queries_coalesced_total",
+    "Storage queries which waited for the result of the same query in "
+    "flight, instead of computing it again.")
+PROFILES_CAPTURED = Counter(
+    "fever_profiles_captured_total",
+    "Profiles of /search requests and refreshes captured, by kind.",
+    ("kind",))
@@ -3,56 +3,337 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List
+from functools import lru_cache
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
 
 from lxml import etree
 
+from app.core import metrics
+from app.core import settings
 from app.models import PartnerEvent
 
 
-def parse_events_data_from_xml(root: etree._Element) -> List[PartnerEvent]:
-    """Parses given xml document and returns list of Partner Events."""
+# PartnerEvent field values as a plain tuple, in PartnerEvent fields order.
+# Cheap to pickle, so it is used to pass events between processes.
+CompactEvent = Tuple[str, str, str, datetime, datetime, float, float]
+# (base_event_id, event id)
+EventKey = Tuple[str, str]
+
+
+def parse_events_data_from_xml(root: etree._Element,
+                               strict: bool | None = None,
+                               ) -> List[PartnerEvent]:
+    """Parses given xml document and returns list of Partner Events.
+    See parse_base_event for strict."""
+
+    events_list, filtered = _parse_events(root, strict)
+    metrics.EVENTS_FILTERED.inc(filtered)
+    return events_list
+
+
+def _parse_events(root: etree._Element,
+                  strict: bool | None) -> Tuple[List[PartnerEvent], int]:
+    """Returns Partner Events of given xml document, and number of events
+    skipped as offline."""
 
     if root.tag != "eventList":
-        return []
+        return [], 0
+
+    if strict is None:
+        strict = bool(settings.PARSE_STRICT_VALIDATION)
 
     events_list = []
+    filtered = 0
     output = root.find("output")
-    for base_event in output.findall("base_event"):
-        if base_event.attrib["sell_mode"] == "online":
-            event = base_event.find("event")
-
-            event_id = event.attrib["event_id"]
-            base_event_id = base_event.attrib["base_event_id"]
-            base_event_title = base_event.attrib["title"]
-            event_start_date = event.attrib["event_start_date"]
-            event_end_date = event.attrib["event_end_date"]
-
-            # construct UTC tz-aware datetime objects
-            if not event_start_date.endswith("Z"):
-                event_start_date += "Z"
-            event_start = datetime.fromisoformat(event_start_date)
-
-            if not event_end_date.endswith("Z"):
-                event_end_date += "Z"
-            event_end = datetime.fromisoformat(event_end_date)
-
-            min_price = min(
-                float(zone.attrib["price"]) for zone
-                in event.findall("zone"))
-            max_price = max(
-                float(zone.attrib["price"]) for zone
-                in event.findall("zone"))
-
-            partner_event = PartnerEvent(
-                id=event_id,
-                base_event_id=base_event_id,
-                title=base_event_title,
-                start=event_start,
-                end=event_end,
-                min_price=min_price,
-                max_price=max_price,
-            )
+    for base_event in output.iterchildren("base_event"):
+        partner_event = parse_base_event(base_event, strict)
+        if partner_event is not None:
             events_list.append(partner_event)
+        else:
+            filtered += 1
 
-    return events_list
+    return events_list, filtered
+
+
+def parse_compact_events_from_xml(
+        content: bytes) -> Tuple[List[CompactEvent], int]:
+    """Parses given xml document bytes and returns list of Partner Events
+    in compact form, and number of events skipped as offline. Meant to run
+    in a worker pool, so metrics are left to the caller."""
+
+    root = etree.fromstring(content).getroottree().getroot()
+    events_list, filtered = _parse_events(root, None)
+    return [compact_event(event) for event in events_list], filtered
+
+
+def parse_compact_events_incrementally(
+        content: bytes, incremental: IncrementalParser,
+) -> Tuple[List[CompactEvent], IncrementalParser]:
+    """Same as parse_compact_events_from_xml, but returns only new and
+    changed events, parsed by given incremental parser, and the parser.
+    In worker processes, the parser is a copy, so the caller takes its
+    state over (see IncrementalParser.adopt)."""
+
+    root = etree.fromstring(content).getroottree().getroot()
+    return ([compact_event(event) for event in incremental.parse(root)],
+            incremental)
+
+
+def compact_event(event: PartnerEvent) -> CompactEvent:
+    """Returns compact form of Partner Event."""
+
+    return (event.id, event.base_event_id, event.title, event.start,
+            event.end, event.min_price, event.max_price)
+
+
+def partner_event_from_compact(compact_event: CompactEvent) -> PartnerEvent:
+    """Returns Partner Event from its compact form, which is validated
+    already, so validation is skipped."""
+
+    return PartnerEvent.construct(
+        **dict(zip(PartnerEvent.__fields__, compact_event)))
+
+
+@lru_cache(maxsize=4096)
+def parse_datetime(value: str) -> datetime:
+    """Returns UTC tz-aware datetime of partner API date and time string.
+    Cached, as partner events often share start and end times."""
+
+    if not value.endswith("Z"):
+        value += "Z"
+    return datetime.fromisoformat(value)
+
+
+def parse_base_event(base_event: etree._Element,
+                     strict: bool | None = None) -> PartnerEvent | None:
+    """Parses base_event xml element. Returns None for offline events.
+
+    Parsed values have the types of PartnerEvent fields already, so the
+    event is built without validation, unless strict (by default
+    settings.PARSE_STRICT_VALIDATION) is set.
+    """
+
+    base_event_attrib = base_event.attrib
+    if base_event_attrib["sell_mode"] != "online":
+        return None
+
+    # iterchildren is several times cheaper than find/findall, which
+    # compile their path argument on every call
+    event = next(base_event.iterchildren("event"), None)
+    event_attrib = event.attrib
+
+    # min and max price in one pass over zones
+    min_price = max_price = None
+    for zone in event.iterchildren("zone"):
+        price = float(zone.attrib["price"])
+        if min_price is None or price < min_price:
+            min_price = price
+        if max_price is None or price > max_price:
+            max_price = price
+    if min_price is None:
+        raise ValueError(
+            f"Event {event_attrib['event_id']} has no zones with price")
+
+    if strict is None:
+        strict = bool(settings.PARSE_STRICT_VALIDATION)
+    make_event = PartnerEvent if strict else PartnerEvent.construct
+    return make_event(
+        id=event_attrib["event_id"],
+        base_event_id=base_event_attrib["base_event_id"],
+        title=base_event_attrib["title"],
+        start=parse_datetime(event_attrib["event_start_date"]),
+        end=parse_datetime(event_attrib["event_end_date"]),
+        min_price=min_price,
+        max_price=max_price,
+    )
+
+
+def fingerprint_base_event(base_event: etree._Element) -> bytes:
+    """Returns digest of base_event xml subtree, which changes whenever
+    anything in the subtree (attributes, events, zones) changes."""
+
+    return hashlib.blake2b(etree.tostring(base_event, with_tail=False),
+                           digest_size=16).digest()
+
+
+class IncrementalParser:
+    """Parser of one partner response, which skips base_event subtrees
+    that did not change since the previous response (see FeedFingerprints),
+    so that only changed events are built.
+
+    Fingerprinting a subtree is several times cheaper than parsing it, and
+    unchanged events do not reach storage at all, so refresh cost follows
+    the number of changed events rather than the feed size.
+    """
+
+    def __init__(self, previous: Dict[str, tuple]):
+        self._previous = previous
+        # base_event_id -> (fingerprint, key of its online event or None)
+        self.base_events: Dict[str, tuple] = {}
+        # keys of online events of new and changed base events
+        self.parsed: Set[EventKey] = set()
+        # keys of previously online events, which changed event id or went
+        # offline in this response
+        self._gone: Set[EventKey] = set()
+        self.unchanged = 0
+        self.filtered = 0
+
+    def parse(self, root: etree._Element,
+              strict: bool | None = None) -> List[PartnerEvent]:
+        """Returns Partner Events of given xml document, which are new or
+        changed since the previous response."""
+
+        if root.tag != "eventList":
+            return []
+
+        events_list = []
+        for base_event in root.find("output").iterchildren("base_event"):
+            partner_event = self.parse_base_event(base_event, strict)
+            if partner_event is not None:
+                events_list.append(partner_event)
+        return events_list
+
+    def parse_base_event(self, base_event: etree._Element,
+                         strict: bool | None = None) -> PartnerEvent | None:
+        """Parses base_event xml element, unless it did not change since the
+        previous response. Returns None for unchanged and offline events."""
+
+        base_event_id = base_event.attrib["base_event_id"]
+        fingerprint = fingerprint_base_event(base_event)
+        previous = self._previous.get(base_event_id)
+        if previous is not None and previous[0] == fingerprint:
+            self.base_events[base_event_id] = previous
+            if previous[1] is None:
+                self.filtered += 1
+            else:
+                self.unchanged += 1
+            return None
+
+        partner_event = parse_base_event(base_event, strict)
+        if partner_event is None:
+            event_key = None
+            self.filtered += 1
+        else:
+            event_key = (base_event_id, partner_event.id)
+            self.parsed.add(event_key)
+        self.base_events[base_event_id] = (fingerprint, event_key)
+        if previous is not None and previous[1] not in (None, event_key):
+            self._gone.add(previous[1])
+        return partner_event
+
+    def adopt(self, parser: IncrementalParser):
+        """Takes over the state of given copy of this parser, which parsed
+        the response in a worker process."""
+
+        if parser is not self:
+            self.base_events = parser.base_events
+            self.parsed = parser.parsed
+            self._gone = parser._gone  # pylint: disable=protected-access
+            self.unchanged = parser.unchanged
+            self.filtered = parser.filtered
+
+    def disappeared_events(self) -> Set[EventKey]:
+        """Returns keys of events which were online in the previous response,
+        but are not in this one or are not online anymore."""
+
+        disappeared = set(self._gone)
+        for base_event_id in self._previous.keys() - self.base_events.keys():
+            event_key = self._previous[base_event_id][1]
+            if event_key is not None:
+                disappeared.add(event_key)
+        return disappeared
+
+
+class FeedFingerprints:
+    """Fingerprints of base_event subtrees of the last stored partner
+    response, and keys of stored events which are no longer online.
+
+    Stored events stay available on /search after they are gone from the
+    partner feed, they are only recorded in offline_events.
+    """
+
+    def __init__(self):
+        self._base_events: Dict[str, tuple] = {}
+        self.offline_events: Set[EventKey] = set()
+
+    def parser(self) -> IncrementalParser:
+        """Returns parser of the next partner response."""
+
+        return IncrementalParser(self._base_events)
+
+    def commit(self, parser: IncrementalParser) -> Set[EventKey]:
+        """Makes response parsed by given parser the previous one, once its
+        events are stored. Returns keys of events which went offline."""
+
+        disappeared = parser.disappeared_events()
+        # only changed base events may bring an offline event back
+        self.offline_events -= parser.parsed
+        self.offline_events |= disappeared
+        self._base_events = parser.base_events
+        return disappeared
+
+
+class EventsStreamParser:
+    """Incremental parser of partner events xml document.
+
+    Unlike parse_events_data_from_xml, does not need the whole document:
+    feed() it with chunks of bytes as they arrive, and it returns Partner
+    Events parsed so far. Processed elements are cleared, so memory usage
+    stays flat no matter how large the document is.
+    """
+
+    def __init__(self, incremental: IncrementalParser | None = None):
+        self._parser = etree.XMLPullParser(events=("end",), tag="base_event")
+        # skips unchanged base events, and counts offline ones itself
+        self._incremental = incremental
+
+    def feed(self, chunk: bytes) -> List[PartnerEvent]:
+        """Feeds next chunk of the document, returns parsed events."""
+
+        self._parser.feed(chunk)
+        return self._read_events()
+
+    def close(self) -> List[PartnerEvent]:
+        """Finishes parsing of the document, returns remaining events."""
+
+        self._parser.close()
+        return self._read_events()
+
+    def _read_events(self) -> List[PartnerEvent]:
+        parse = (parse_base_event if self._incremental is None
+                 else self._incremental.parse_base_event)
+        events_list = []
+        filtered = 0
+        for _, base_event in self._parser.read_events():
+            output = base_event.getparent()
+            if output is None:
+                continue
+
+            root = output.getparent()
+            if (output.tag == "output" and root is not None
+                    and root.tag == "eventList"):
+                partner_event = parse(base_event)
+                if partner_event is not None:
+                    events_list.append(partner_event)
+                elif self._incremental is None:
+                    filtered += 1
+
+            # free memory of already processed elements
+            base_event.clear(keep_tail=True)
+            while base_event.getprevious() is not None:
+                del output[0]
+
+        metrics.EVENTS_FILTERED.inc(filtered)
+        return events_list
+
+
+def iter_events_from_xml_chunks(
+        chunks: Iterable[bytes]) -> Iterator[PartnerEvent]:
+    """Parses xml document given as chunks of bytes, yields Partner Events
+    as soon as they are parsed."""
+
+    parser = EventsStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
@@ -0,0 +1,154 @@
+"""Sampling profiler module."""
+
+from __future__ import annotations
+
+import cProfile
+from contextlib import contextmanager
+import hmac
+import io
+import itertools
+import os
+import pstats
+import random
+import threading
+import time
+from typing import Callable, Iterator, List, Tuple
+
+from app.core import metrics
+from app.core import settings
+from app.core.logger import logger
+
+
+# Request header which asks to profile the request, with PROFILE_TOKEN as
+# its value.
+PROFILE_HEADER = "X-Profile"
+
+
+class CapturedProfile:
+    """Profile of one request or refresh, complete once it is captured."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.seconds = 0.0
+        # saved pstats file, None if profiles are not saved
+        self.path: str | None = None
+        # top (function, cumulative seconds) by cumulative time
+        self.top_functions: List[Tuple[str, float]] = []
+
+    def server_timing(self, count: int = 5) -> str:
+        """Returns top functions as Server-Timing header value, which
+        browser dev tools show next to the response."""
+
+        return ", ".join(
+            f'f{idx};desc="{name}";dur={seconds * 1000:.2f}'
+            for idx, (name, seconds) in enumerate(
+                self.top_functions[:count], 1))
+
+
+class SamplingProfiler:
+    """Profiles requests and refreshes with cProfile: the ones requested
+    with PROFILE_HEADER and a sample_rate fraction of all of them.
+
+    Only one profile is captured at a time, others are not profiled
+    meanwhile. A profile covers all work of the thread it runs on (the event
+    loop) while it is captured, so it may include other requests run at its
+    awaits, but not parsing in worker processes (see PARSE_EXECUTOR).
+
+    Profiles are saved to directory as pstats files (e.g. for
+    `python -m pstats` or snakeviz), if it is set, and their top functions
+    by cumulative time are logged.
+    """
+
+    def __init__(self, sample_rate: float, token: str, directory: str,
+                 summary_lines: int = 20,
+                 rnd: Callable[[], float] = random.random):
+        self.sample_rate = sample_rate
+        self.token = token
+        self.directory = directory
+        self.summary_lines = summary_lines
+        self._rnd = rnd
+        self._lock = threading.Lock()
+        self._is_capturing = False
+        self._sequence = itertools.count(1)
+
+    def is_requested(self, header_value: str | None) -> bool:
+        """Whether PROFILE_HEADER value asks to profile the request."""
+
+        return bool(self.token and header_value and hmac.compare_digest(
+            header_value.encode(), self.token.encode()))
+
+    def _start_capture(self, requested: bool) -> bool:
+        if not requested and not (self.sample_rate > 0
+                                  and self._rnd() < self.sample_rate):
+            return False
+        with self._lock:
+            if self._is_capturing:
+                return False
+            self._is_capturing = True
+        return True
+
+    @contextmanager
+    def profile(self, kind: str,
+                requested: bool = False) -> Iterator[CapturedProfile | None]:
+        """Profiles the block, if it is requested or sampled. Yields
+        CapturedProfile, which is complete after the block, or None if the
+        block is not profiled."""
+
+        if not self._start_capture(requested):
+            yield None
+            return
+
+        captured = CapturedProfile(kind)
+        profiler = cProfile.Profile()
+        started_at = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is active, e.g. a debugger
+            with self._lock:
+                self._is_capturing = False
+            yield None
+            return
+        try:
+            yield captured
+        finally:
+            profiler.disable()
+            captured.seconds = time.perf_counter() - started_at
+            with self._lock:
+                self._is_capturing = False
+            self._save(profiler, captured)
+
+    def _save(self, profiler: cProfile.Profile, captured: CapturedProfile):
+        summary = io.StringIO()
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE)
+        stats.print_stats(self.summary_lines)
+        # (file, line, function) -> (calls, primitive calls, total time,
+        # cumulative time, callers)
+        captured.top_functions = sorted(
+            ((f"{os.path.basename(file)}:{line}({function})", cumulative)
+             for (file, line, function), (_, _, _, cumulative, _)
+             in stats.stats.items()),  # pylint: disable=no-member
+            key=lambda item: item[1], reverse=True)[:self.summary_lines]
+
+        if self.directory:
+            captured.path = os.path.join(self.directory, (
+                f"{captured.kind}-{time.strftime('%Y%m%dT%H%M%S')}-"
+                f"{next(self._sequence)}.prof"))
+            try:
+                stats.dump_stats(captured.path)
+            except OSError:
+                logger.exception("Profile %s can not be saved",
+                                 captured.path)
+                captured.path = None
+
+        metrics.PROFILES_CAPTURED.inc(labels=(captured.kind,))
+        logger.info("Profile of %s (%.3f s, saved to %s):\n%s",
+                    captured.kind, captured.seconds, captured.path,
+                    summary.getvalue())
+
+
+# /search requests and partner events refreshes profiler
+profiler = SamplingProfiler(settings.PROFILE_SAMPLE_RATE,
+                            settings.PROFILE_TOKEN, settings.PROFILE_DIR,
+                            settings.PROFILE_SUMMARY_LINES)
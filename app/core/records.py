@@ -0,0 +1,242 @@
+"""Event records module.
+
+Layouts in which LocalEventStorage keeps events. Every layout knows how to
+build a record from PartnerEvent, what start/end values to index records
+by, and how to turn a record back into EventSummary fields.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import sys
+import uuid
+
+from app.core import encoders
+from app.models import PartnerEvent
+
+
+class DictRecords:
+    """Every record is a dict of EventSummary fields, plus start and end
+    datetimes for filtering (see "DB" section in NOTES.md).
+
+    With json_fragments, record also keeps its EventSummary encoded to
+    JSON ("json" field), so responses are joined from ready fragments.
+    """
+
+    # Record fields, which are not a part of EventSummary
+    INTERNAL_FIELDS = frozenset({"start", "end", "json"})
+
+    def __init__(self, json_fragments: bool = False):
+        self.json_fragments = json_fragments
+
+    def make(self, event: PartnerEvent, stored_record: dict | None) -> dict:
+        """Returns record with latest known values of the event. Event id
+        and title are kept from the stored record, if there is one."""
+
+        # str() of date and time is faster than .strftime
+        record = {
+            "id": (stored_record["id"] if stored_record
+                   else str(uuid.uuid4())),
+            "title": (stored_record["title"] if stored_record
+                      else event.title),
+            "start_date": str(event.start.date()),
+            "start_time": str(event.start.time()),
+            "end_date": str(event.end.date()),
+            "end_time": str(event.end.time()),
+            "min_price": event.min_price,
+            "max_price": event.max_price,
+            "start": event.start,
+            "end": event.end,
+        }
+        if self.json_fragments:
+            record["json"] = encoders.dumps(self.summary(record))
+        return record
+
+    @staticmethod
+    def is_unchanged(record: dict, event: PartnerEvent) -> bool:
+        """Whether record has the latest known values of the event."""
+
+        return (record["start"] == event.start
+                and record["end"] == event.end
+                and record["min_price"] == event.min_price
+                and record["max_price"] == event.max_price)
+
+    @staticmethod
+    def start(record: dict) -> datetime:
+        return record["start"]
+
+    @staticmethod
+    def end(record: dict) -> datetime:
+        return record["end"]
+
+    @staticmethod
+    def bound(value: datetime) -> datetime:
+        """Returns value comparable with record start and end."""
+        return value
+
+    @staticmethod
+    def title(record: dict) -> str:
+        return record["title"]
+
+    @staticmethod
+    def start_day(record: dict) -> str:
+        """Returns ISO date of record start, the day it is rolled up by."""
+        return record["start_date"]
+
+    @staticmethod
+    def min_price(record: dict) -> float:
+        return record["min_price"]
+
+    @staticmethod
+    def max_price(record: dict) -> float:
+        return record["max_price"]
+
+    def from_compact(self, compact: EventRecord) -> dict:
+        """Returns record of the event given as compact record, e.g. loaded
+        from snapshot."""
+
+        record = summary_from_timestamps(
+            compact.id, compact.title, compact.start, compact.end,
+            compact.min_price, compact.max_price)
+        record["start"] = datetime.fromtimestamp(compact.start, timezone.utc)
+        record["end"] = datetime.fromtimestamp(compact.end, timezone.utc)
+        if self.json_fragments:
+            record["json"] = encoders.dumps(self.summary(record))
+        return record
+
+    @staticmethod
+    def to_compact(record: dict) -> EventRecord:
+        """Returns compact record of the record, e.g. to save it to
+        snapshot."""
+
+        return EventRecord(
+            id=record["id"], title=record["title"],
+            start=record["start"].timestamp(), end=record["end"].timestamp(),
+            min_price=record["min_price"], max_price=record["max_price"])
+
+    def summary(self, record: dict) -> dict:
+        """Returns EventSummary fields of the record."""
+
+        internal_fields = self.INTERNAL_FIELDS
+        return {k: v for (k, v) in record.items() if k not in internal_fields}
+
+    def json(self, record: dict) -> bytes:
+        """Returns EventSummary of the record encoded to JSON."""
+
+        if self.json_fragments:
+            return record["json"]
+        return encoders.dumps(self.summary(record))
+
+
+class EventRecord:
+    """Compact event record. Start and end are UTC epoch seconds."""
+
+    __slots__ = ("id", "title", "start", "end", "min_price", "max_price",
+                 "json")
+
+    # pylint: disable=redefined-builtin
+    def __init__(self, id, title, start, end, min_price, max_price,
+                 json=None):
+        self.id = id
+        self.title = title
+        self.start = start
+        self.end = end
+        self.min_price = min_price
+        self.max_price = max_price
+        self.json = json
+
+
+class CompactRecords(DictRecords):
+    """Every record is a slotted EventRecord with epoch timestamps and
+    interned title, several times smaller than a dict record. Date and time
+    strings are produced only when a response is built.
+    """
+
+    def make(self, event: PartnerEvent,
+             stored_record: EventRecord | None) -> EventRecord:
+        record = EventRecord(
+            id=stored_record.id if stored_record else str(uuid.uuid4()),
+            title=(stored_record.title if stored_record
+                   else sys.intern(event.title)),
+            start=event.start.timestamp(),
+            end=event.end.timestamp(),
+            min_price=event.min_price,
+            max_price=event.max_price,
+        )
+        if self.json_fragments:
+            record.json = encoders.dumps(self.summary(record))
+        return record
+
+    def from_compact(self, compact: EventRecord) -> EventRecord:
+        if self.json_fragments:
+            compact.json = encoders.dumps(self.summary(compact))
+        return compact
+
+    @staticmethod
+    def to_compact(record: EventRecord) -> EventRecord:
+        return record
+
+    @staticmethod
+    def is_unchanged(record: EventRecord, event: PartnerEvent) -> bool:
+        return (record.start == event.start.timestamp()
+                and record.end == event.end.timestamp()
+                and record.min_price == event.min_price
+                and record.max_price == event.max_price)
+
+    @staticmethod
+    def start(record: EventRecord) -> float:
+        return record.start
+
+    @staticmethod
+    def end(record: EventRecord) -> float:
+        return record.end
+
+    @staticmethod
+    def bound(value: datetime) -> float:
+        return value.timestamp()
+
+    @staticmethod
+    def title(record: EventRecord) -> str:
+        return record.title
+
+    @staticmethod
+    def start_day(record: EventRecord) -> str:
+        return str(datetime.fromtimestamp(record.start, timezone.utc).date())
+
+    @staticmethod
+    def min_price(record: EventRecord) -> float:
+        return record.min_price
+
+    @staticmethod
+    def max_price(record: EventRecord) -> float:
+        return record.max_price
+
+    def summary(self, record: EventRecord) -> dict:
+        return summary_from_timestamps(
+            record.id, record.title, record.start, record.end,
+            record.min_price, record.max_price)
+
+    def json(self, record: EventRecord) -> bytes:
+        if self.json_fragments:
+            return record.json
+        return encoders.dumps(self.summary(record))
+
+
+# pylint: disable=redefined-builtin,too-many-arguments
+def summary_from_timestamps(id: str, title: str, start: float, end: float,
+                            min_price: float, max_price: float) -> dict:
+    """Returns EventSummary fields of event with start and end given as UTC
+    epoch seconds."""
+
+    start = datetime.fromtimestamp(start, timezone.utc)
+    end = datetime.fromtimestamp(end, timezone.utc)
+    return {
+        "id": id,
+        "title": title,
+        "start_date": str(start.date()),
+        "start_time": str(start.time()),
+        "end_date": str(end.date()),
+        "end_time": str(end.time()),
+        "min_price": min_price,
+        "max_price": max_price,
+    }
@@ -0,0 +1,85 @@
+"""Partner API fault tolerance module: circuit breaker and retry backoff."""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Callable
+
+from app.core.logger import logger
+
+
+class CircuitBreaker:
+    """Stops calls to a failing dependency for a while, instead of letting
+    every caller wait for its timeout.
+
+    Closed breaker allows calls. After failure_threshold failures in a row
+    it opens and rejects calls for reset_timeout seconds, then it is
+    half-open: one trial call is allowed, and its result closes or opens
+    the breaker again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if (self._state == self.OPEN and self._clock() - self._opened_at
+                    >= self.reset_timeout):
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Returns whether a call may be made now. Open breaker turns
+        half-open after reset_timeout, and lets one trial call through."""
+
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and (
+                    self._clock() - self._opened_at >= self.reset_timeout):
+                self._state = self.HALF_OPEN
+                return True
+            # open, or half-open with the trial call in flight
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Circuit breaker closed.")
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (
+                    self._state == self.CLOSED
+                    and self._failures >= self.failure_threshold):
+                logger.warning("Circuit breaker opened for %s seconds "
+                               "after %s failures.",
+                               self.reset_timeout, self._failures)
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+def backoff_delay(retry: int, base: float, max_delay: float,
+                  rnd: random.Random | None = None) -> float:
+    """Returns delay (seconds) before given retry (counted from 0), drawn
+    at random up to exponentially growing base * 2 ** retry ("full
+    jitter"), so that retries of many clients do not come in waves."""
+
+    return (rnd or random).uniform(0, min(max_delay, base * 2 ** retry))
@@ -0,0 +1,114 @@
+"""Partner events refresh scheduler module."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+
+from app.controllers.providers import ProvidersController
+from app.controllers.providers import create_providers_controller
+from app.controllers.search import PartnerEventsController
+from app.core import settings
+from app.core.backends import event_storage
+from app.core.logger import logger
+from app.core.profiling import profiler
+from app.core.storage import BaseStorage
+
+
+class RefreshScheduler:
+    """Refreshes storage with partner events periodically and on demand.
+
+    There is at most one refresh in flight at any moment: concurrent
+    callers of refresh() join the one that is already running instead of
+    starting their own download and parse of the same partner feed.
+    """
+
+    def __init__(self, controller: PartnerEventsController
+                 | ProvidersController,
+                 storage: BaseStorage,
+                 interval: float = settings.REFRESH_INTERVAL):
+        self._controller = controller
+        self._storage = storage
+        self._interval = interval
+        self._in_flight: asyncio.Future | None = None
+        self._periodic_task: asyncio.Task | None = None
+        # UTC time of the last successful refresh, None if there was none.
+        self.last_refreshed_at: datetime | None = None
+
+    @property
+    def is_refreshing(self) -> bool:
+        return self._in_flight is not None
+
+    def is_fresh(self, max_age: float) -> bool:
+        """Whether last successful refresh was within max_age seconds."""
+
+        if self.last_refreshed_at is None:
+            return False
+        age = datetime.now(timezone.utc) - self.last_refreshed_at
+        return age.total_seconds() < max_age
+
+    async def refresh(self, max_age: float | None = None) -> bool:
+        """Refreshes storage, or joins the refresh which is in flight.
+
+        If max_age given, does nothing while stored events are fresher than
+        that. Returns whether the (joined) refresh succeeded.
+        """
+
+        if self._in_flight is None:
+            if max_age is not None and self.is_fresh(max_age):
+                return True
+            self._in_flight = asyncio.ensure_future(self._refresh())
+            self._in_flight.add_done_callback(self._clear_in_flight)
+
+        # shield, so that cancelled caller does not cancel shared refresh
+        return await asyncio.shield(self._in_flight)
+
+    def _clear_in_flight(self, _: asyncio.Future):
+        self._in_flight = None
+
+    async def _refresh(self) -> bool:
+        if self._storage.is_read_only:
+            # Storage is refreshed by another process, so this one only
+            # follows the time of that refresh.
+            self.last_refreshed_at = self._storage.refreshed_at
+            return self.last_refreshed_at is not None
+
+        try:
+            with profiler.profile("refresh"):
+                succeeded = await self._controller.handle_new_events_request(
+                    self._storage)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Partner events refresh failed")
+            return False
+
+        if succeeded:
+            self.last_refreshed_at = datetime.now(timezone.utc)
+        return succeeded
+
+    async def _refresh_periodically(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self._interval)
+
+    def start(self):
+        """Starts periodic refresh in background, if interval is set."""
+
+        if self._interval > 0 and self._periodic_task is None:
+            self._periodic_task = asyncio.create_task(
+                self._refresh_periodically())
+
+    async def stop(self):
+        """Stops periodic refresh and closes partner API connections."""
+
+        if self._periodic_task is not None:
+            self._periodic_task.cancel()
+            try:
+                await self._periodic_task
+            except asyncio.CancelledError:
+                pass
+            self._periodic_task = None
+        await self._controller.aclose()
+
+
+refresh_scheduler = RefreshScheduler(create_providers_controller(),
+                                     event_storage)
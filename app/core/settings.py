@@ -4,5 +4,91 @@ import os
 
 
 DEBUG = os.getenv("DEBUG", "")
-REQUEST_TIMEOUT = 60  # 1 minute
-EVENT_PROVIDER_URL = "https://provider.code-challenge.feverup.com/api/events"
+# Timeout of one partner API request attempt, seconds.
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "60"))  # 1 minute
+# Failed partner API requests (connection errors, timeouts, 5xx and 429
+# responses) are retried FETCH_RETRIES times, after random delays of up to
+# FETCH_BACKOFF_BASE * 2 ** retry seconds, but at most FETCH_BACKOFF_MAX.
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "2"))
+FETCH_BACKOFF_BASE = float(os.getenv("FETCH_BACKOFF_BASE", "0.5"))
+FETCH_BACKOFF_MAX = float(os.getenv("FETCH_BACKOFF_MAX", "10"))
+# Whole refresh (all attempts, waiting for a fetch slot, parsing) is given
+# up after REFRESH_DEADLINE seconds (0 - no deadline).
+REFRESH_DEADLINE = float(os.getenv("REFRESH_DEADLINE", "90"))
+# Max number of partner API fetches in flight at once.
+MAX_CONCURRENT_FETCHES = int(os.getenv("MAX_CONCURRENT_FETCHES", "1"))
+# After CIRCUIT_BREAKER_FAILURES failed requests in a row, partner API is
+# not called for CIRCUIT_BREAKER_RESET_TIMEOUT seconds, and events are
+# served from storage only.
+CIRCUIT_BREAKER_FAILURES = int(os.getenv("CIRCUIT_BREAKER_FAILURES", "5"))
+CIRCUIT_BREAKER_RESET_TIMEOUT = float(
+    os.getenv("CIRCUIT_BREAKER_RESET_TIMEOUT", "30"))
+EVENT_PROVIDER_URL = os.getenv(
+    "EVENT_PROVIDER_URL",
+    "https://provider.code-challenge.feverup.com/api/events")
+# More partner providers, fetched concurrently with the one above, as
+# comma separated name=url pairs. Their events are stored with
+# base_event_id prefixed by "name:".
+EVENT_PROVIDERS = os.getenv("EVENT_PROVIDERS", "")
+# Partner events are refreshed in background every REFRESH_INTERVAL seconds
+# (0 disables periodic refresh), and on /search request if stored events
+# are older than that.
+REFRESH_INTERVAL = float(os.getenv("REFRESH_INTERVAL", "60"))
+# Partner API client connection pool, reused for the app lifetime.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+# HTTP/2 requires optional `h2` package: pip install httpx[http2]
+HTTP2 = os.getenv("HTTP2", "")
+# Parse partner API response while it is being downloaded, instead of
+# building the whole xml tree in memory.
+XML_STREAM_PARSING = os.getenv("XML_STREAM_PARSING", "")
+# Worker pool for partner response parsing, so that it does not block the
+# event loop: "thread", "process" or "" (parse on the event loop).
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "")
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "1"))
+# Validate every parsed partner event with PartnerEvent model. Parser
+# produces values of the right types anyway, so it is off by default.
+PARSE_STRICT_VALIDATION = os.getenv("PARSE_STRICT_VALIDATION", "")
+# Fingerprint base_event subtrees of partner response and skip the ones
+# which did not change since the previous response, so that only changed
+# events are parsed and stored.
+INCREMENTAL_REFRESH = os.getenv("INCREMENTAL_REFRESH", "")
+# Max number of events per /search page (limit query param).
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "1000"))
+# Max number of /search responses cached for the current storage version
+# (0 disables the cache).
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+# Max number of storage range query results cached for the current storage
+# version (0 disables the cache), and their max age in seconds (0 - no max).
+STORAGE_CACHE_SIZE = int(os.getenv("STORAGE_CACHE_SIZE", "0"))
+STORAGE_CACHE_TTL = float(os.getenv("STORAGE_CACHE_TTL", "0"))
+# Keep every stored event also encoded to JSON, so /search response is
+# a concatenation of ready JSON fragments rather than serialization.
+STORAGE_JSON_FRAGMENTS = os.getenv("STORAGE_JSON_FRAGMENTS", "")
+# Keep stored events as compact slotted records instead of dicts, which
+# saves memory at the cost of building date/time strings on every read.
+STORAGE_COMPACT_RECORDS = os.getenv("STORAGE_COMPACT_RECORDS", "")
+# Events storage: "local" (in-process memory), "columnar" (in-process NumPy
+# arrays, needs numpy installed), "sqlite" (SQLITE_PATH database file, which
+# survives restarts and is shared by app processes) or "shared" (below).
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "events.sqlite3")
+# Snapshot file, which "local" storage is saved to (at most every
+# SNAPSHOT_INTERVAL seconds, once events changed, and on shutdown), and
+# which it is served from after restart, until it is decoded ("" - no
+# snapshot).
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "")
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "300"))
+# Snapshot file of "shared" storage backend, which is published by one app
+# process and memory-mapped by all of them (e.g. uvicorn --workers N).
+SHARED_SNAPSHOT_PATH = os.getenv("SHARED_SNAPSHOT_PATH", "events.snapshot")
+# Fraction (0 to 1) of /search requests and partner events refreshes which
+# are profiled with cProfile (0 disables sampling, 1 profiles all of them).
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# /search requests with "X-Profile: <PROFILE_TOKEN>" header are profiled,
+# whatever the sample rate ("" - the header is ignored).
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# Directory which profiles are saved to, as pstats files ("" - profiles are
+# only summarized in logs), and number of functions in the summary.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+PROFILE_SUMMARY_LINES = int(os.getenv("PROFILE_SUMMARY_LINES", "20"))
@@ -0,0 +1,236 @@
+"""Shared memory data storage module."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import fcntl
+import logging
+import os
+import threading
+from typing import IO, Iterable, Iterator, List
+
+from app.core.logger import logger
+from app.core.records import CompactRecords, summary_from_timestamps
+from app.core.snapshot import Snapshot, touch_snapshot, write_snapshot
+from app.core.storage import BaseStorage, WriteResult
+from app.models import EventSummary
+from app.models import PartnerEvent
+
+
+class SharedSnapshotStorage(BaseStorage):
+    """BaseStorage implementation shared by several app processes on one
+    host, e.g. uvicorn workers.
+
+    One of the processes, the one which holds the lock file, refreshes
+    events and publishes them as a snapshot file (see app/core/snapshot.py).
+    Every process memory-maps the latest snapshot and reads events right
+    from it, so there is one copy of events in memory and one partner API
+    fetch per refresh, no matter the number of processes. Replaced snapshot
+    is picked up on the next read.
+
+    Snapshot is written in a background thread, so that the refreshing
+    process does not stall its requests for the time of sorting and
+    writing all the events. Writes which come meanwhile are published
+    together, by the next snapshot. Likewise, the process which takes the
+    refresh over decodes the snapshot published before (so that events
+    keep their UUIDs) in background, and its writes wait for it.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._snapshot: Snapshot | None = None
+        # lock file, held open while this process refreshes the storage
+        self._lock_file: IO | None = None
+        self._write_lock = threading.Lock()
+        # refreshing process state: event key -> compact record
+        self._records_layout = CompactRecords()
+        self._records: dict | None = None
+        self._version = 0
+        # set once the refreshing process decoded the published snapshot
+        self.restored = threading.Event()
+        # (storage version, records) waiting to be published, and the
+        # thread publishing them
+        self._publish_lock = threading.Lock()
+        self._pending: tuple | None = None
+        self._publishing: threading.Thread | None = None
+
+    def _current_snapshot(self) -> Snapshot | None:
+        """Returns the latest published snapshot, None if there is none."""
+
+        try:
+            inode = os.stat(self._path).st_ino
+        except FileNotFoundError:
+            return None
+
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.inode != inode:
+            # Readers of the previous snapshot keep their own reference to
+            # it, and it is unmapped once they all are done.
+            snapshot = self._snapshot = Snapshot(self._path)
+        return snapshot
+
+    @property
+    def is_read_only(self) -> bool:
+        """Whether another process refreshes the storage. Process which
+        takes the lock file (e.g. after the refreshing one exited) becomes
+        the refreshing one."""
+
+        if self._lock_file is None:
+            # pylint: disable=consider-using-with
+            lock_file = open(self._path + ".lock", "a+b")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return True
+            self._lock_file = lock_file
+            logger.info("Process %s refreshes shared events storage.",
+                        os.getpid())
+            threading.Thread(target=self._restore, daemon=True,
+                             name="snapshot-restore").start()
+        return False
+
+    def _restore(self):
+        """Continues from the snapshot published by previous process, so
+        that events keep their UUIDs."""
+
+        try:
+            snapshot = self._current_snapshot()
+            self._records = dict(snapshot.items()) if snapshot else {}
+            self._version = snapshot.storage_version if snapshot else 0
+        except (OSError, ValueError):
+            logger.exception("Events snapshot %s can not be decoded, events "
+                             "get new UUIDs", self._path)
+            self._records = {}
+        finally:
+            self.restored.set()
+
+    @property
+    def refreshed_at(self) -> datetime | None:
+        snapshot = self._current_snapshot()
+        if snapshot is None:
+            return None
+        return datetime.fromtimestamp(snapshot.published_at, timezone.utc)
+
+    @property
+    def version(self) -> int:
+        snapshot = self._current_snapshot()
+        return snapshot.storage_version if snapshot else 0
+
+    def get_events(self,
+                   start_from: datetime,
+                   ends_to: datetime) -> List[EventSummary]:
+        """Returns list of EventSummary from the latest snapshot within
+        specified start_from and ends_to time range.
+        """
+
+        result = list(self.iter_events(start_from, ends_to))
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("SharedSnapshotStorage - get_events - result: %s",
+                         result)
+        return result
+
+    def iter_events(self,
+                    start_from: datetime,
+                    ends_to: datetime) -> Iterator[EventSummary]:
+        """Yields EventSummary from the latest snapshot within specified
+        start_from and ends_to time range, ordered by start and event key.
+        """
+
+        snapshot = self._current_snapshot()
+        if snapshot is None:
+            return
+
+        titles, string = snapshot.titles, snapshot.string
+        for index in snapshot.range(start_from.timestamp(),
+                                    ends_to.timestamp()):
+            yield summary_from_timestamps(
+                snapshot.uuid(index), string(titles[index]),
+                snapshot.starts[index], snapshot.ends[index],
+                snapshot.min_prices[index], snapshot.max_prices[index])
+
+    def set_event(self, event: PartnerEvent):
+        """Updates event in shared storage. Creates new record if need."""
+
+        self.set_events([event])
+
+    def set_events(self, events: Iterable[PartnerEvent]) -> WriteResult:
+        """Updates events and publishes new snapshot, if any of them
+        changed. Only the refreshing process may write."""
+
+        layout = self._records_layout
+        inserted = updated = unchanged = 0
+        with self._write_lock:
+            if self.is_read_only:
+                raise RuntimeError(
+                    "Shared events storage is refreshed by another process")
+            if not self.restored.is_set():
+                logger.warning("Storage write waits for events snapshot %s "
+                               "to be decoded.", self._path)
+                self.restored.wait()
+
+            records = self._records
+            for event in events:
+                event_key = (event.base_event_id, event.id)
+                stored_record = records.get(event_key)
+                if stored_record is None:
+                    inserted += 1
+                elif layout.is_unchanged(stored_record, event):
+                    unchanged += 1
+                    continue
+                else:
+                    updated += 1
+                records[event_key] = layout.make(event, stored_record)
+
+            if inserted or updated:
+                self._version += 1
+                self._publish(self._version, records)
+            elif self._current_snapshot() is None:
+                self._publish(self._version, records)
+            elif not self._is_publishing():
+                # let readers know that events were refreshed
+                touch_snapshot(self._path)
+
+        return WriteResult(inserted, updated, unchanged)
+
+    def _is_publishing(self) -> bool:
+        with self._publish_lock:
+            return self._publishing is not None
+
+    def _publish(self, version: int, records: dict):
+        """Publishes snapshot of records in background. Records are copied
+        (records themselves are never changed in place), so that further
+        writes do not change the published state."""
+
+        with self._publish_lock:
+            self._pending = (version, list(records.items()))
+            if self._publishing is None:
+                self._publishing = threading.Thread(
+                    target=self._publish_pending, daemon=True,
+                    name="snapshot-publish")
+                self._publishing.start()
+
+    def _publish_pending(self):
+        while True:
+            with self._publish_lock:
+                pending, self._pending = self._pending, None
+                if pending is None:
+                    self._publishing = None
+                    return
+            try:
+                write_snapshot(self._path, *pending)
+            except OSError:
+                logger.exception("Events snapshot %s can not be published",
+                                 self._path)
+
+    def wait_published(self, timeout: float | None = None) -> bool:
+        """Waits for written events to be published. Returns whether they
+        were within timeout."""
+
+        with self._publish_lock:
+            publishing = self._publishing
+        if publishing is not None:
+            publishing.join(timeout)
+            return not publishing.is_alive()
+        return True
@@ -0,0 +1,206 @@
+"""Binary events snapshot module.
+
+Snapshot is a compact, read-only, columnar file of events, which is
+memory-mapped by readers, so they read events in place (zero-copy),
+and any number of processes share one copy of it in page cache.
+
+Layout (little-endian, every column is 8-byte aligned):
+
+    header      magic, format version, storage version, published at,
+                events count, strings count
+    start       float64[events]  UTC epoch seconds, sorted ascending
+    end         float64[events]  UTC epoch seconds
+    min_price   float64[events]
+    max_price   float64[events]
+    id          16 bytes[events]  UUID
+    title       uint32[events]  index in strings
+    base_id     uint32[events]  index in strings (base_event_id)
+    event_id    uint32[events]  index in strings
+    offsets     uint32[strings + 1]  offsets of strings in data
+    data        UTF-8 bytes of strings
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from typing import Iterable, Iterator, NamedTuple, Tuple
+import uuid
+
+from app.core.records import EventRecord
+
+
+MAGIC = b"FEVT"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sIQdQQ")
+_PUBLISHED_AT = struct.Struct("<d")
+_PUBLISHED_AT_OFFSET = struct.calcsize("<4sIQ")
+
+# (base_event_id, event_id)
+EventKey = Tuple[str, str]
+
+if sys.byteorder != "little":  # arrays are written in native byte order
+    raise ImportError("Events snapshots need little-endian platform")
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+class SnapshotHeader(NamedTuple):
+    magic: bytes
+    format_version: int
+    # storage version the snapshot was taken at
+    storage_version: int
+    # UTC epoch seconds
+    published_at: float
+    events_count: int
+    strings_count: int
+
+
+def write_snapshot(path: str, storage_version: int,
+                   records: Iterable[Tuple[EventKey, EventRecord]]):
+    """Writes snapshot of given records to path atomically: readers see
+    either previous or new snapshot file, never a partially written one.
+    """
+
+    # sorted by start, then by event key
+    records = sorted(records, key=lambda item: (item[1].start, item[0]))
+    strings: dict[str, int] = {}
+
+    def string_index(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    columns = {
+        "start": array("d", (record.start for _, record in records)),
+        "end": array("d", (record.end for _, record in records)),
+        "min_price": array("d", (record.min_price for _, record in records)),
+        "max_price": array("d", (record.max_price for _, record in records)),
+        "id": b"".join(uuid.UUID(record.id).bytes for _, record in records),
+        "title": array("I", (string_index(record.title)
+                             for _, record in records)),
+        "base_id": array("I", (string_index(key[0]) for key, _ in records)),
+        "event_id": array("I", (string_index(key[1]) for key, _ in records)),
+    }
+    encoded_strings = [value.encode() for value in strings]
+    offsets = array("I", [0])
+    for value in encoded_strings:
+        offsets.append(offsets[-1] + len(value))
+    columns["offsets"] = offsets
+    columns["data"] = b"".join(encoded_strings)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as snapshot_file:
+            snapshot_file.write(_HEADER.pack(
+                MAGIC, FORMAT_VERSION, storage_version, time.time(),
+                len(records), len(strings)))
+            for column in columns.values():
+                snapshot_file.write(b"\0" * (
+                    _aligned(snapshot_file.tell()) - snapshot_file.tell()))
+                snapshot_file.write(column)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def touch_snapshot(path: str):
+    """Updates published at time of the snapshot in place, e.g. after a
+    refresh which did not change any event."""
+
+    with open(path, "r+b") as snapshot_file:
+        snapshot_file.seek(_PUBLISHED_AT_OFFSET)
+        snapshot_file.write(_PUBLISHED_AT.pack(time.time()))
+
+
+class Snapshot:
+    """Memory-mapped read-only events snapshot."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as snapshot_file:
+            self.inode = os.fstat(snapshot_file.fileno()).st_ino
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+
+        view = memoryview(self._mmap)
+        header = SnapshotHeader(*_HEADER.unpack_from(view))
+        if header.magic != MAGIC or header.format_version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not an events snapshot")
+        self.storage_version = header.storage_version
+        count = header.events_count
+
+        offset = _HEADER.size
+
+        def column(fmt: str, size: int) -> memoryview:
+            nonlocal offset
+            offset = _aligned(offset)
+            data = view[offset:offset + size]
+            offset += size
+            return data.cast(fmt) if fmt != "B" else data
+
+        self.starts = column("d", 8 * count)
+        self.ends = column("d", 8 * count)
+        self.min_prices = column("d", 8 * count)
+        self.max_prices = column("d", 8 * count)
+        self.ids = column("B", 16 * count)
+        self.titles = column("I", 4 * count)
+        self.base_ids = column("I", 4 * count)
+        self.event_ids = column("I", 4 * count)
+        self._offsets = column("I", 4 * (header.strings_count + 1))
+        self._data = column("B", self._offsets[-1])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def published_at(self) -> float:
+        return _PUBLISHED_AT.unpack_from(
+            self._mmap, _PUBLISHED_AT_OFFSET)[0]
+
+    def string(self, index: int) -> str:
+        return str(self._data[self._offsets[index]:self._offsets[index + 1]],
+                   "utf-8")
+
+    def uuid(self, index: int) -> str:
+        offset = 16 * index
+        return str(uuid.UUID(bytes=bytes(self.ids[offset:offset + 16])))
+
+    def record(self, index: int) -> EventRecord:
+        return EventRecord(
+            id=self.uuid(index),
+            title=sys.intern(self.string(self.titles[index])),
+            start=self.starts[index],
+            end=self.ends[index],
+            min_price=self.min_prices[index],
+            max_price=self.max_prices[index],
+        )
+
+    def key(self, index: int) -> EventKey:
+        return (self.string(self.base_ids[index]),
+                self.string(self.event_ids[index]))
+
+    def range(self, start_from: float, ends_to: float) -> Iterator[int]:
+        """Yields indexes of events within given time range (UTC epoch
+        seconds), in start order."""
+
+        ends = self.ends
+        for index in range(bisect_left(self.starts, start_from),
+                           bisect_right(self.starts, ends_to)):
+            if ends[index] <= ends_to:
+                yield index
+
+    def items(self) -> Iterator[Tuple[EventKey, EventRecord]]:
+        """Yields all the events as (event key, compact record) pairs."""
+
+        for index in range(len(self)):
+            yield self.key(index), self.record(index)
@@ -0,0 +1,216 @@
+"""SQLite data storage module."""
+
+from __future__ import annotations
+
+from datetime import datetime
+import logging
+import sqlite3
+import threading
+from typing import Iterable, Iterator, List
+import uuid
+
+from app.core.logger import logger
+from app.core.records import summary_from_timestamps
+from app.core.storage import BaseStorage, WriteResult
+from app.models import EventSummary
+from app.models import PartnerEvent
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    base_event_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    -- UTC epoch seconds
+    start REAL NOT NULL,
+    "end" REAL NOT NULL,
+    min_price REAL NOT NULL,
+    max_price REAL NOT NULL,
+    PRIMARY KEY (base_event_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS events_start_end ON events (start, "end");
+
+CREATE TABLE IF NOT EXISTS storage_version (version INTEGER NOT NULL);
+INSERT INTO storage_version SELECT 0
+    WHERE NOT EXISTS (SELECT * FROM storage_version);
+"""
+
+_EVENTS_BATCH_SCHEMA = """
+CREATE TEMP TABLE IF NOT EXISTS events_batch (
+    base_event_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    id TEXT,
+    title TEXT NOT NULL,
+    start REAL NOT NULL,
+    "end" REAL NOT NULL,
+    min_price REAL NOT NULL,
+    max_price REAL NOT NULL,
+    PRIMARY KEY (base_event_id, event_id)
+);
+"""
+
+
+class SQLiteEventStorage(BaseStorage):
+    """BaseStorage implementation on SQLite database file.
+
+    Unlike LocalEventStorage, events survive app restarts and are shared
+    by all the app processes using the same database file. Database is in
+    WAL mode, so readers are not blocked by refresh writes.
+    """
+
+    def __init__(self, path: str, page_size: int = 1000):
+        self._path = path
+        self._page_size = page_size
+        # sqlite3 connections can't be shared between threads
+        self._local = threading.local()
+        with self._connection as connection:
+            connection.executescript(_SCHEMA)
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_EVENTS_BATCH_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    @property
+    def version(self) -> int:
+        return self._connection.execute(
+            "SELECT version FROM storage_version").fetchone()[0]
+
+    def iter_event_pages(self,
+                         start_from: datetime,
+                         ends_to: datetime) -> Iterator[List[EventSummary]]:
+        """Yields pages of EventSummary within specified start_from and
+        ends_to time range, ordered by event start and key.
+
+        Every page is a separate query, which continues after the last
+        event of the previous one (keyset pagination), so no cursor is kept
+        open between pages, and pages may be read from different threads.
+        """
+
+        # start <= end, so start <= ends_to as well, which bounds the range
+        # scan over (start, end) index from both sides.
+        params = {"start_from": start_from.timestamp(),
+                  "ends_to": ends_to.timestamp(),
+                  "page_size": self._page_size,
+                  "after": None, "after_base_event_id": None,
+                  "after_event_id": None}
+        while True:
+            page = self._connection.execute(
+                """
+                SELECT id, title, start, "end", min_price, max_price,
+                    base_event_id, event_id
+                FROM events
+                WHERE start >= :start_from AND start <= :ends_to
+                    AND "end" <= :ends_to
+                    AND (:after IS NULL OR (start, base_event_id, event_id)
+                        > (:after, :after_base_event_id, :after_event_id))
+                ORDER BY start, base_event_id, event_id
+                LIMIT :page_size
+                """, params).fetchall()
+            if not page:
+                return
+            yield [summary_from_timestamps(*row[:6]) for row in page]
+
+            # next page starts at the last event, after it in the order
+            (params["after"], params["after_base_event_id"],
+             params["after_event_id"]) = (page[-1][2], *page[-1][6:])
+            params["start_from"] = params["after"]
+
+    def get_events(self,
+                   start_from: datetime,
+                   ends_to: datetime) -> List[EventSummary]:
+        """Returns list of EventSummary from SQLite storage within
+        specified start_from and ends_to time range.
+        """
+
+        result = list(self.iter_events(start_from, ends_to))
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("SQLiteEventStorage - get_events - result: %s",
+                         result)
+        return result
+
+    def iter_events(self,
+                    start_from: datetime,
+                    ends_to: datetime) -> Iterator[EventSummary]:
+        """Yields EventSummary from SQLite storage within specified
+        start_from and ends_to time range, ordered by start, page by page.
+        """
+
+        for page in self.iter_event_pages(start_from, ends_to):
+            yield from page
+
+    def set_event(self, event: PartnerEvent):
+        """Updates event in SQLite storage. Creates new record if need."""
+
+        self.set_events([event])
+
+    def set_events(self, events: Iterable[PartnerEvent]) -> WriteResult:
+        """Updates events in SQLite storage in one transaction. Creates new
+        records if need, and skips events which did not change."""
+
+        connection = self._connection
+        with connection:
+            connection.execute("DELETE FROM events_batch")
+            connection.executemany(
+                """
+                INSERT OR REPLACE INTO events_batch (base_event_id, event_id,
+                    title, start, "end", min_price, max_price)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                ((event.base_event_id, event.id, event.title,
+                  event.start.timestamp(), event.end.timestamp(),
+                  event.min_price, event.max_price) for event in events))
+            batch_size = connection.execute(
+                "SELECT count(*) FROM events_batch").fetchone()[0]
+
+            # UUIDs for events seen for the first time
+            new_keys = connection.execute(
+                """
+                SELECT base_event_id, event_id FROM events_batch AS b
+                WHERE NOT EXISTS (SELECT * FROM events AS e
+                    WHERE e.base_event_id = b.base_event_id
+                        AND e.event_id = b.event_id)
+                """).fetchall()
+            connection.executemany(
+                """
+                UPDATE events_batch SET id = ?
+                WHERE base_event_id = ? AND event_id = ?
+                """,
+                ((str(uuid.uuid4()), *key) for key in new_keys))
+
+            changes_before = connection.total_changes
+            connection.execute(
+                """
+                INSERT INTO events (base_event_id, event_id, id, title,
+                    start, "end", min_price, max_price)
+                SELECT base_event_id, event_id,
+                    -- only new events have UUID, others are not inserted
+                    ifnull(id, ''), title, start, "end", min_price, max_price
+                FROM events_batch WHERE true
+                ON CONFLICT (base_event_id, event_id) DO UPDATE SET
+                    start = excluded.start,
+                    "end" = excluded."end",
+                    min_price = excluded.min_price,
+                    max_price = excluded.max_price
+                WHERE (start, "end", min_price, max_price) IS NOT
+                    (excluded.start, excluded."end",
+                     excluded.min_price, excluded.max_price)
+                """)
+            written = connection.total_changes - changes_before
+
+            if written:
+                connection.execute(
+                    "UPDATE storage_version SET version = version + 1")
+
+        inserted = len(new_keys)
+        return WriteResult(inserted=inserted,
+                           updated=written - inserted,
+                           unchanged=batch_size - written)
@@ -3,19 +3,127 @@
 from __future__ import annotations
 
 from abc import ABCMeta, abstractmethod
-from datetime import datetime
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, time, timezone
+import logging
+from operator import itemgetter
+import re
 import threading
-from typing import List
-import uuid
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Tuple
 
+from app.core import encoders
+from app.core import settings
 from app.core.logger import logger
+from app.core.records import CompactRecords, DictRecords, EventRecord
 from app.models import EventSummary
 from app.models import PartnerEvent
 
 
+class WriteResult(NamedTuple):
+    """Counts of events written to storage in one batch."""
+
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+
+def title_tokens(text: str) -> List[str]:
+    """Returns lowercase words of the text, which titles are indexed and
+    searched by."""
+
+    return re.findall(r"\w+", text.lower())
+
+
+class EventFilter(NamedTuple):
+    """Optional event filters of a range query, besides the time range."""
+
+    # events with some price of at least min_price, and with some price of
+    # at most max_price, i.e. with price range overlapping the given one
+    min_price: float | None = None
+    max_price: float | None = None
+    # words or word prefixes, which all must be in the title (in any case)
+    title: str | None = None
+
+    def matcher(self) -> Callable[[float, float, str], bool]:
+        """Returns function of event min price, max price and title, which
+        tells whether event matches the filter."""
+
+        min_price, max_price = self.min_price, self.max_price
+        query_tokens = title_tokens(self.title or "")
+
+        def matches(event_min_price: float, event_max_price: float,
+                    title: str) -> bool:
+            if min_price is not None and event_max_price < min_price:
+                return False
+            if max_price is not None and event_min_price > max_price:
+                return False
+            if query_tokens:
+                tokens = title_tokens(title)
+                return all(any(token.startswith(query_token)
+                               for token in tokens)
+                           for query_token in query_tokens)
+            return True
+
+        return matches
+
+
+class DayRollup(NamedTuple):
+    """Count and price stats of events which start on one day."""
+
+    count: int = 0
+    min_price: float = float("inf")
+    max_price: float = float("-inf")
+    min_price_sum: float = 0.0
+    max_price_sum: float = 0.0
+
+    def added(self, min_price: float, max_price: float) -> DayRollup:
+        """Returns rollup with the event of given prices added."""
+
+        return DayRollup(
+            self.count + 1,
+            min(self.min_price, min_price),
+            max(self.max_price, max_price),
+            self.min_price_sum + min_price,
+            self.max_price_sum + max_price)
+
+    def removed(self, min_price: float, max_price: float) -> DayRollup:
+        """Returns rollup with the event of given prices removed. Min and
+        max prices are kept as they are, so if the event had either of
+        them, the rollup should be computed again from the day events."""
+
+        return self._replace(
+            count=self.count - 1,
+            min_price_sum=self.min_price_sum - min_price,
+            max_price_sum=self.max_price_sum - max_price)
+
+    def summary(self, day: str) -> dict:
+        """Returns aggregates of the day, as /aggregates returns them."""
+
+        return {
+            "date": day,
+            "count": self.count,
+            "min_price": self.min_price,
+            "max_price": self.max_price,
+            "avg_min_price": self.min_price_sum / self.count,
+            "avg_max_price": self.max_price_sum / self.count,
+        }
+
+
+def rollup_by_day(prices: Iterable[Tuple[str, float, float]]) -> dict:
+    """Returns DayRollup by day of given (day, min price, max price) of
+    events."""
+
+    rollups = {}
+    for day, min_price, max_price in prices:
+        rollups[day] = rollups.get(day, DayRollup()).added(min_price,
+                                                           max_price)
+    return rollups
+
+
 class BaseStorage(metaclass=ABCMeta):
     """This abstract base class defines the two core methods that any storage
-    class must implement: get_events and set_event.
+    class must implement: get_events and set_event, and set_events batch
+    method which storages may override.
 
     Any storage class that wants to use the BaseStorage
     interface will need to implement these methods.
@@ -29,26 +137,332 @@ class BaseStorage(metaclass=ABCMeta):
         specified start_from and ends_to time range."""
         raise NotImplementedError()
 
+    def get_events_json(self,
+                        start_from: datetime,
+                        ends_to: datetime) -> bytes:
+        """Returns JSON array of EventSummary from storage within specified
+        start_from and ends_to time range. Storages which keep events
+        encoded already should override it."""
+
+        return encoders.dumps(self.get_events(start_from, ends_to))
+
+    def iter_events(self,
+                    start_from: datetime,
+                    ends_to: datetime) -> Iterator[EventSummary]:
+        """Yields EventSummary from storage within specified start_from and
+        ends_to time range, ordered by start (events which start at the same
+        time are yielded in the same order every time), so that the range
+        can be read in pages. Storages which can read events lazily should
+        override it."""
+
+        yield from self.get_events(start_from, ends_to)
+
+    def iter_events_json(self,
+                         start_from: datetime,
+                         ends_to: datetime) -> Iterator[bytes]:
+        """Same as iter_events, but yields EventSummary encoded to JSON."""
+
+        for event in self.iter_events(start_from, ends_to):
+            yield encoders.dumps(event)
+
+    def iter_matching_events(self,
+                             start_from: datetime,
+                             ends_to: datetime,
+                             event_filter: EventFilter,
+                             ) -> Iterator[EventSummary]:
+        """Same as iter_events, but yields only events which match the
+        filter. Storages with price or title indexes should override it,
+        this one checks every event of the time range."""
+
+        matches = event_filter.matcher()
+        for event in self.iter_events(start_from, ends_to):
+            if matches(event["min_price"], event["max_price"],
+                       event["title"]):
+                yield event
+
+    def iter_matching_events_json(self,
+                                  start_from: datetime,
+                                  ends_to: datetime,
+                                  event_filter: EventFilter,
+                                  ) -> Iterator[bytes]:
+        """Same as iter_matching_events, but yields EventSummary encoded to
+        JSON."""
+
+        for event in self.iter_matching_events(start_from, ends_to,
+                                               event_filter):
+            yield encoders.dumps(event)
+
+    def get_aggregates(self, start_day: date, end_day: date) -> List[dict]:
+        """Returns event count, min, max and average prices per day, of
+        events which start from start_day to end_day (both included),
+        ordered by day. Days without events are left out. Storages which
+        keep rollups should override it, this one reads every event."""
+
+        end = str(end_day)
+
+        def iter_prices():
+            for event in self.iter_events(
+                    datetime.combine(start_day, time(), timezone.utc),
+                    datetime.max.replace(tzinfo=timezone.utc)):
+                day = str(event["start_date"])
+                if day > end:
+                    # events are ordered by start
+                    break
+                yield day, event["min_price"], event["max_price"]
+
+        rollups = rollup_by_day(iter_prices())
+        return [rollups[day].summary(day) for day in sorted(rollups)]
+
     @abstractmethod
     def set_event(self, event: PartnerEvent):
         """Updates event in storage. Creates new record if need."""
         raise NotImplementedError()
 
+    @property
+    @abstractmethod
+    def version(self) -> int:
+        """Changes on every storage write, so data read from storage (and
+        derived from it) stays valid while the version stays the same."""
+        raise NotImplementedError()
+
+    @property
+    def is_read_only(self) -> bool:
+        """Whether storage is refreshed by another process and is only read
+        by this one, e.g. storage shared by several app processes."""
+        return False
+
+    @property
+    def refreshed_at(self) -> datetime | None:
+        """Time of the last refresh of read-only storage by the process
+        which refreshes it."""
+        return None
+
+    def close(self):
+        """Closes storage once the app does not write to it anymore.
+        Storages which save writes later (e.g. to a file) should override
+        it to save the ones which are not saved yet."""
+
+    def set_events(self, events: Iterable[PartnerEvent]) -> WriteResult:
+        """Updates events in storage in one batch. Creates new records if
+        need. Storages should override it with a cheaper bulk update, which
+        tells inserted events from updated and unchanged ones."""
+
+        updated = 0
+        for event in events:
+            self.set_event(event)
+            updated += 1
+        return WriteResult(updated=updated)
+
+
+class _Snapshot(NamedTuple):
+    """Immutable state of LocalEventStorage, published as a whole."""
+
+    # event key -> event record
+    storage: dict
+    # Sorted lists of (record start or end, event key) pairs, so that range
+    # queries cost O(log n + k) instead of a full scan over all the events
+    # we have ever seen.
+    start_index: list
+    end_index: list
+    # incremented on every write
+    version: int
+    # Sorted lists of (record min or max price, event key) pairs, for price
+    # filters.
+    min_price_index: list = []
+    max_price_index: list = []
+    # title word -> frozenset of keys of events with the word in the title,
+    # and sorted list of the words, for word prefix lookups
+    title_index: dict = {}
+    title_words: list = []
+    # ISO date -> DayRollup of events which start on the day, and sorted
+    # list of the days, so aggregates cost O(days) instead of O(events)
+    day_rollups: dict = {}
+    rollup_days: list = []
+
 
 class LocalEventStorage(BaseStorage):
-    """Concrete implementation of BaseStorage interface."""
+    """Concrete implementation of BaseStorage interface.
+
+    Events are kept as dict records (see DictRecords), or as compact
+    slotted records (see CompactRecords) with compact_records.
+    With json_fragments, every record also keeps its EventSummary encoded
+    to JSON on write, so that get_events_json only joins ready fragments.
+
+    Writers build the new state off to the side and publish it with one
+    reference swap, so readers get consistent snapshots without locks.
+    Records and indexes of a published snapshot are never changed in place.
+    """
 
     _instance = None
     _lock = threading.Lock()
 
+    # Above this number of changes, index is rebuilt with one sort instead
+    # of per entry bisect and shift of the list tail.
+    _INDEX_BULK_UPDATE_THRESHOLD = 64
+
     def __new__(cls, *args, **kwargs):
         with cls._lock:
             if not cls._instance:
                 cls._instance = super().__new__(cls, *args, **kwargs)
         return cls._instance
 
-    def __init__(self, storage_engine=None):
-        self._storage = storage_engine or {}
+    def __init__(self, storage_engine=None,
+                 json_fragments: bool = bool(settings.STORAGE_JSON_FRAGMENTS),
+                 compact_records: bool = bool(
+                     settings.STORAGE_COMPACT_RECORDS)):
+        records_class = CompactRecords if compact_records else DictRecords
+        self._records = records_class(json_fragments)
+        self._write_lock = threading.Lock()
+
+        self._snapshot = self._built_snapshot(storage_engine or {}, 0)
+
+    def _built_snapshot(self, storage: dict, version: int) -> _Snapshot:
+        """Returns snapshot of given records, with indexes built anew."""
+
+        records = self._records
+        title_index = self._updated_title_index(
+            {}, ((key, records.title(record))
+                 for key, record in storage.items()))
+        day_rollups = rollup_by_day(
+            (records.start_day(record), records.min_price(record),
+             records.max_price(record)) for record in storage.values())
+        return _Snapshot(
+            storage,
+            self._sorted_index(storage, records.start),
+            self._sorted_index(storage, records.end),
+            version,
+            self._sorted_index(storage, records.min_price),
+            self._sorted_index(storage, records.max_price),
+            title_index,
+            sorted(title_index),
+            day_rollups,
+            sorted(day_rollups),
+        )
+
+    @staticmethod
+    def _sorted_index(storage: dict, value: Callable) -> list:
+        return sorted((value(record), key) for key, record in storage.items())
+
+    @staticmethod
+    def _updated_title_index(title_index: dict,
+                             titles: Iterable[Tuple[tuple, str]]) -> dict:
+        """Returns copy of the given title index with given (event key,
+        title) pairs added. Given index is not changed."""
+
+        added = {}
+        for key, title in titles:
+            for word in set(title_tokens(title)):
+                added.setdefault(word, []).append(key)
+        if not added:
+            return title_index
+
+        title_index = dict(title_index)
+        for word, keys in added.items():
+            title_index[word] = title_index.get(word, frozenset()).union(keys)
+        return title_index
+
+    def _updated_day_rollups(self, day_rollups: dict, storage: dict,
+                             start_index: list, removed: list,
+                             added: Iterable) -> dict:
+        """Returns copy of the given day rollups with given records removed
+        and added. Days which lost their min or max price event are rolled
+        up again from the events of the day in new storage (a slice of its
+        start index). Given rollups are not changed."""
+
+        records = self._records
+        start_day = records.start_day
+        min_price, max_price = records.min_price, records.max_price
+        day_rollups = dict(day_rollups)
+        stale_days = set()
+        for record in removed:
+            day = start_day(record)
+            rollup = day_rollups[day]
+            if (min_price(record) <= rollup.min_price
+                    or max_price(record) >= rollup.max_price):
+                stale_days.add(day)
+            day_rollups[day] = rollup.removed(min_price(record),
+                                              max_price(record))
+        for record in added:
+            day = start_day(record)
+            day_rollups[day] = day_rollups.get(day, DayRollup()).added(
+                min_price(record), max_price(record))
+
+        def entry_day(entry: tuple) -> str:
+            return start_day(storage[entry[1]])
+
+        for day in stale_days:
+            lo = bisect_left(start_index, day, key=entry_day)
+            hi = bisect_right(start_index, day, key=entry_day, lo=lo)
+            rollup = rollup_by_day(
+                (day, min_price(storage[key]), max_price(storage[key]))
+                for _, key in start_index[lo:hi]).get(day)
+            if rollup is None:
+                del day_rollups[day]
+            else:
+                day_rollups[day] = rollup
+        return day_rollups
+
+    @property
+    def _storage(self) -> dict:
+        return self._snapshot.storage
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    @staticmethod
+    def _range_candidates(snapshot: _Snapshot,
+                          start_from, ends_to) -> Tuple[list, bool]:
+        """Returns entries of events which start or end (whichever gives
+        the smaller slice) within given time range, and whether they are
+        the start index entries.
+
+        Every event with start_from <= start and end <= ends_to both starts
+        and ends within the range, so either slice is a superset of result.
+        """
+
+        by_time = itemgetter(0)
+        start_index, end_index = snapshot.start_index, snapshot.end_index
+        start_lo = bisect_left(start_index, start_from, key=by_time)
+        start_hi = bisect_right(start_index, ends_to, key=by_time)
+        end_lo = bisect_left(end_index, start_from, key=by_time)
+        end_hi = bisect_right(end_index, ends_to, key=by_time)
+
+        if start_hi - start_lo <= end_hi - end_lo:
+            return start_index[start_lo:start_hi], True
+        return end_index[end_lo:end_hi], False
+
+    def _iter_events(self,
+                     start_from: datetime,
+                     ends_to: datetime) -> Iterator:
+        """Yields records of events within specified time range, ordered
+        by start and then by event key."""
+
+        records = self._records
+        start, end = records.start, records.end
+        start_from = records.bound(start_from)
+        ends_to = records.bound(ends_to)
+
+        snapshot = self._snapshot
+        entries, by_start = self._range_candidates(
+            snapshot, start_from, ends_to)
+        if by_start:
+            for _, key in entries:
+                record = snapshot.storage[key]
+                if end(record) <= ends_to:
+                    yield record
+            return
+
+        # Entries of the end index are in end order, so matching records
+        # are sorted the way the start index is.
+        matching = []
+        for _, key in entries:
+            record = snapshot.storage[key]
+            if start_from <= start(record):
+                matching.append((start(record), key, record))
+        matching.sort(key=itemgetter(0, 1))
+        for _, _, record in matching:
+            yield record
 
     def get_events(self,
                    start_from: datetime,
@@ -56,39 +470,289 @@ class LocalEventStorage(BaseStorage):
         """Returns list of EventSummary from local storage within
         specified start_from and ends_to time range.
         """
-        result = []
+        result = list(self.iter_events(start_from, ends_to))
 
-        for event in self._storage.values():
-            if start_from <= event["start"] and event["end"] <= ends_to:
-                result.append({
-                    k: v for (k, v) in event.items() if k not in {
-                        "start", "end"}
-                })
-
-        logger.debug("LocalEventStorage - get_events - result: %s", result)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("LocalEventStorage - get_events - result: %s",
+                         result)
         return result
 
+    def iter_events(self,
+                    start_from: datetime,
+                    ends_to: datetime) -> Iterator[EventSummary]:
+        """Yields EventSummary from local storage within specified
+        start_from and ends_to time range, ordered by start."""
+
+        summary = self._records.summary
+        for record in self._iter_events(start_from, ends_to):
+            yield summary(record)
+
+    def get_events_json(self,
+                        start_from: datetime,
+                        ends_to: datetime) -> bytes:
+        """Returns JSON array of EventSummary from local storage within
+        specified start_from and ends_to time range.
+        """
+
+        if not self._records.json_fragments:
+            return super().get_events_json(start_from, ends_to)
+
+        return b"[" + b",".join(
+            self.iter_events_json(start_from, ends_to)) + b"]"
+
+    def iter_events_json(self,
+                         start_from: datetime,
+                         ends_to: datetime) -> Iterator[bytes]:
+        """Yields EventSummary from local storage within specified
+        start_from and ends_to time range encoded to JSON, ordered by
+        start. With json_fragments, these are the ready fragments."""
+
+        to_json = self._records.json
+        for record in self._iter_events(start_from, ends_to):
+            yield to_json(record)
+
+    def _filter_candidates(self, snapshot: _Snapshot,
+                           event_filter: EventFilter) -> list:
+        """Returns keys of candidate events of every filter, by price and
+        title indexes, as (candidates count, lazy keys) pairs."""
+
+        by_value = itemgetter(0)
+        candidates = []
+        # every lazy keys function binds its own index slice bounds
+        if event_filter.min_price is not None:
+            max_price_index = snapshot.max_price_index
+            lo = bisect_left(max_price_index, event_filter.min_price,
+                             key=by_value)
+            candidates.append((len(max_price_index) - lo, lambda lo=lo: (
+                key for _, key in max_price_index[lo:])))
+        if event_filter.max_price is not None:
+            min_price_index = snapshot.min_price_index
+            hi = bisect_right(min_price_index, event_filter.max_price,
+                              key=by_value)
+            candidates.append((hi, lambda hi=hi: (
+                key for _, key in min_price_index[:hi])))
+
+        title_index, words = snapshot.title_index, snapshot.title_words
+        for query_word in title_tokens(event_filter.title or ""):
+            # words with the query word prefix are a slice of sorted words
+            matching_words = words[
+                bisect_left(words, query_word):
+                bisect_left(words, query_word + "\U0010ffff")]
+            candidates.append((
+                sum(len(title_index[word]) for word in matching_words),
+                lambda matching_words=matching_words: frozenset().union(
+                    *(title_index[word] for word in matching_words))))
+        return candidates
+
+    def _iter_matching(self,
+                       start_from: datetime,
+                       ends_to: datetime,
+                       event_filter: EventFilter) -> Iterator:
+        """Yields records of events within specified time range, which match
+        the filter, ordered by start and then by event key.
+
+        Candidates are read from the most selective index: time range,
+        price or title, and then checked against the other conditions, so
+        selective filters do not scan the whole time range.
+        """
+
+        records = self._records
+        start, end = records.start, records.end
+        min_price, max_price = records.min_price, records.max_price
+        title = records.title
+        matches = event_filter.matcher()
+
+        snapshot = self._snapshot
+        by_time = itemgetter(0)
+        lo, hi = records.bound(start_from), records.bound(ends_to)
+        range_count = min(
+            bisect_right(index, hi, key=by_time)
+            - bisect_left(index, lo, key=by_time)
+            for index in (snapshot.start_index, snapshot.end_index))
+        candidates = min(self._filter_candidates(snapshot, event_filter),
+                         key=itemgetter(0), default=None)
+        if candidates is None or range_count <= candidates[0]:
+            for record in self._iter_events(start_from, ends_to):
+                if matches(min_price(record), max_price(record),
+                           title(record)):
+                    yield record
+            return
+
+        start_from = records.bound(start_from)
+        ends_to = records.bound(ends_to)
+        matching = []
+        storage = snapshot.storage
+        for key in candidates[1]():
+            record = storage[key]
+            if (start_from <= start(record) and end(record) <= ends_to
+                    and matches(min_price(record), max_price(record),
+                                title(record))):
+                matching.append((start(record), key, record))
+        matching.sort(key=itemgetter(0, 1))
+        for _, _, record in matching:
+            yield record
+
+    def iter_matching_events(self,
+                             start_from: datetime,
+                             ends_to: datetime,
+                             event_filter: EventFilter,
+                             ) -> Iterator[EventSummary]:
+        """Yields EventSummary from local storage within specified
+        start_from and ends_to time range, which match the filter, ordered
+        by start."""
+
+        summary = self._records.summary
+        for record in self._iter_matching(start_from, ends_to, event_filter):
+            yield summary(record)
+
+    def iter_matching_events_json(self,
+                                  start_from: datetime,
+                                  ends_to: datetime,
+                                  event_filter: EventFilter,
+                                  ) -> Iterator[bytes]:
+        """Same as iter_matching_events, but yields EventSummary encoded to
+        JSON (the ready fragments, with json_fragments)."""
+
+        to_json = self._records.json
+        for record in self._iter_matching(start_from, ends_to, event_filter):
+            yield to_json(record)
+
+    def get_aggregates(self, start_day: date, end_day: date) -> List[dict]:
+        """Returns event count, min, max and average prices per day, of
+        events which start from start_day to end_day (both included), from
+        the rollups kept up to date on write."""
+
+        snapshot = self._snapshot
+        days, day_rollups = snapshot.rollup_days, snapshot.day_rollups
+        lo = bisect_left(days, str(start_day))
+        hi = bisect_right(days, str(end_day), lo=lo)
+        return [day_rollups[day].summary(day) for day in days[lo:hi]]
+
     def set_event(self, event: PartnerEvent):
-        """Updates event in local storage. Creates new record if need."""
-
-        event_key = (event.base_event_id, event.id)
-        if event_key not in self._storage:
-            self._storage[event_key] = {
-                "id": str(uuid.uuid4()),
-                "title": event.title,
-            }
-
-        # Update event with latest known values
-        self._storage[event_key].update({
-            "start_date": str(event.start.date()),  # faster than .strftime
-            "start_time": str(event.start.time()),
-            "end_date": str(event.end.date()),
-            "end_time": str(event.end.time()),
-            "min_price": event.min_price,
-            "max_price": event.max_price,
-            "start": event.start,
-            "end": event.end,
-        })
+        """Updates event in local storage. Creates new record if need.
+
+        It is a batch of one event, which copies storage and its indexes as
+        any batch does, i.e. it costs O(n) of stored events: events should
+        be written in batches with set_events.
+        """
+
+        self.set_events([event])
+
+    def set_events(self, events: Iterable[PartnerEvent]) -> WriteResult:
+        """Updates events in local storage. Creates new records if need.
+
+        Events which did not change are skipped, and if none changed,
+        storage (and its version) stays the same. Changed events are
+        applied to a copy of storage, which then replaces the current one
+        at once.
+        """
+
+        records = self._records
+        inserted = updated = unchanged = 0
+        with self._write_lock:
+            snapshot = self._snapshot
+            old_storage = snapshot.storage
+            # event key -> new record
+            changed = {}
+
+            for event in events:
+                event_key = (event.base_event_id, event.id)
+                stored_record = changed.get(event_key)
+                if stored_record is None:
+                    stored_record = old_storage.get(event_key)
+
+                if stored_record is None:
+                    inserted += 1
+                elif records.is_unchanged(stored_record, event):
+                    unchanged += 1
+                    continue
+                else:
+                    updated += 1
+                # Update event with latest known values
+                changed[event_key] = records.make(event, stored_record)
+
+            if changed:
+                storage = dict(old_storage)
+                storage.update(changed)
+                old_keys = changed.keys() & old_storage.keys()
+
+                def updated_index(index: list, value: Callable) -> list:
+                    return self._updated_index(
+                        index,
+                        [(value(old_storage[key]), key) for key in old_keys],
+                        [(value(record), key)
+                         for key, record in changed.items()])
+
+                # stored records keep their titles, so only new events are
+                # added to the title index
+                title_index = self._updated_title_index(
+                    snapshot.title_index,
+                    ((key, records.title(record))
+                     for key, record in changed.items()
+                     if key not in old_storage))
+                start_index = updated_index(snapshot.start_index,
+                                            records.start)
+                day_rollups = self._updated_day_rollups(
+                    snapshot.day_rollups, storage, start_index,
+                    [old_storage[key] for key in old_keys], changed.values())
+                self._snapshot = _Snapshot(
+                    storage,
+                    start_index,
+                    updated_index(snapshot.end_index, records.end),
+                    snapshot.version + 1,
+                    updated_index(snapshot.min_price_index,
+                                  records.min_price),
+                    updated_index(snapshot.max_price_index,
+                                  records.max_price),
+                    title_index,
+                    (snapshot.title_words
+                     if len(title_index) == len(snapshot.title_index)
+                     else sorted(title_index)),
+                    day_rollups,
+                    (snapshot.rollup_days
+                     if day_rollups.keys() == snapshot.day_rollups.keys()
+                     else sorted(day_rollups)),
+                )
+
+        return WriteResult(inserted, updated, unchanged)
+
+    def items(self) -> Iterator[Tuple[tuple, EventRecord]]:
+        """Yields all the stored events as (event key, compact record)
+        pairs, e.g. to save them to snapshot (see app/core/snapshot.py)."""
+
+        to_compact = self._records.to_compact
+        for key, record in self._snapshot.storage.items():
+            yield key, to_compact(record)
+
+    def restore(self, items: Iterable[Tuple[tuple, EventRecord]]):
+        """Replaces stored events with given (event key, compact record)
+        pairs, e.g. loaded from snapshot, so that events keep their ids."""
+
+        records = self._records
+        with self._write_lock:
+            storage = {key: records.from_compact(record)
+                       for key, record in items}
+            self._snapshot = self._built_snapshot(
+                storage, self._snapshot.version + 1)
+
+    @classmethod
+    def _updated_index(cls, index: list, removed: list, added: list) -> list:
+        """Returns copy of the given sorted index with entries removed and
+        added. Given index is not changed, as readers may still use it."""
+
+        if len(removed) + len(added) <= cls._INDEX_BULK_UPDATE_THRESHOLD:
+            index = index.copy()
+            for entry in removed:
+                del index[bisect_left(index, entry)]
+            for entry in added:
+                insort(index, entry)
+            return index
+
+        removed = set(removed)
+        index = [entry for entry in index if entry not in removed]
+        index.extend(added)
+        index.sort()
+        return index
 
 
 local_event_storage = LocalEventStorage()
@@ -0,0 +1,237 @@
+"""Warm-start storage module."""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+import logging
+import threading
+import time
+from typing import Iterable, Iterator, List
+
+from app.core.logger import logger
+from app.core.records import summary_from_timestamps
+from app.core.snapshot import Snapshot, write_snapshot
+from app.core.storage import BaseStorage, EventFilter, LocalEventStorage
+from app.core.storage import WriteResult
+from app.models import EventSummary
+from app.models import PartnerEvent
+
+
+class WarmStartStorage(BaseStorage):
+    """LocalEventStorage wrapper, which keeps events across restarts.
+
+    Events are saved to a snapshot file (see app/core/snapshot.py) in
+    background, at most every interval seconds, once they changed, and on
+    close, so that the last writes survive restart too. After
+    restart, events of the saved snapshot are served right away: the file
+    is memory-mapped and only events matching a query are decoded, so
+    /search answers before the first partner API fetch. Meanwhile, the
+    snapshot is decoded into the wrapped storage as a whole in background
+    (so that events keep their UUIDs), and once it is, events are served
+    from the wrapped storage. Writes wait for it, as they apply to the
+    decoded events (refresh writes off the event loop, so it keeps serving
+    the snapshot meanwhile).
+    """
+
+    def __init__(self, storage: LocalEventStorage, path: str,
+                 interval: float):
+        self.storage = storage
+        self._path = path
+        self._interval = interval
+        # snapshot of the previous run, served until it is decoded into
+        # the wrapped storage
+        self._warm_snapshot = self._open_snapshot(path)
+        self._write_lock = threading.Lock()
+        # set once the wrapped storage has events of the snapshot
+        self.restored = threading.Event()
+        self._saving: threading.Thread | None = None
+        # storage version which was saved last, and when (the first change
+        # is saved right away)
+        self._saved_version = storage.version
+        self._saved_at = float("-inf")
+        self._closed = threading.Event()
+
+        if self._warm_snapshot is None:
+            self.restored.set()
+        else:
+            threading.Thread(target=self._restore, daemon=True,
+                             name="snapshot-restore").start()
+        # Writes which were not saved, as they came within interval of the
+        # previous save, are saved by the timer, even if no write follows.
+        threading.Thread(target=self._save_periodically, daemon=True,
+                         name="snapshot-timer").start()
+
+    @staticmethod
+    def _open_snapshot(path: str) -> Snapshot | None:
+        try:
+            snapshot = Snapshot(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.exception("Events snapshot %s can not be loaded", path)
+            return None
+        logger.info("Serving %s events of snapshot %s until the first "
+                    "refresh.", len(snapshot), path)
+        return snapshot
+
+    def _restore(self):
+        started_at = time.perf_counter()
+        try:
+            self.storage.restore(self._warm_snapshot.items())
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Events snapshot %s can not be decoded, events "
+                             "are served from the next refresh on",
+                             self._path)
+        else:
+            logger.info("Events snapshot %s decoded in %.2f s.", self._path,
+                        time.perf_counter() - started_at)
+        self._saved_version = self.storage.version
+        self._warm_snapshot = None
+        self.restored.set()
+
+    @property
+    def version(self) -> int:
+        return self.storage.version
+
+    def get_events(self,
+                   start_from: datetime,
+                   ends_to: datetime) -> List[EventSummary]:
+        """Returns list of EventSummary from wrapped storage, or from the
+        saved snapshot until it is decoded, within specified start_from and
+        ends_to time range."""
+
+        if self._warm_snapshot is None:
+            return self.storage.get_events(start_from, ends_to)
+
+        result = list(self.iter_events(start_from, ends_to))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("WarmStartStorage - get_events - result: %s",
+                         result)
+        return result
+
+    def get_events_json(self,
+                        start_from: datetime,
+                        ends_to: datetime) -> bytes:
+        if self._warm_snapshot is None:
+            return self.storage.get_events_json(start_from, ends_to)
+        return super().get_events_json(start_from, ends_to)
+
+    def iter_events(self,
+                    start_from: datetime,
+                    ends_to: datetime) -> Iterator[EventSummary]:
+        """Yields EventSummary from wrapped storage, or from the saved
+        snapshot until it is decoded, within specified start_from and
+        ends_to time range, ordered by start and event key."""
+
+        snapshot = self._warm_snapshot
+        if snapshot is None:
+            yield from self.storage.iter_events(start_from, ends_to)
+            return
+
+        titles, string = snapshot.titles, snapshot.string
+        for index in snapshot.range(start_from.timestamp(),
+                                    ends_to.timestamp()):
+            yield summary_from_timestamps(
+                snapshot.uuid(index), string(titles[index]),
+                snapshot.starts[index], snapshot.ends[index],
+                snapshot.min_prices[index], snapshot.max_prices[index])
+
+    def iter_events_json(self,
+                         start_from: datetime,
+                         ends_to: datetime) -> Iterator[bytes]:
+        if self._warm_snapshot is None:
+            return self.storage.iter_events_json(start_from, ends_to)
+        return super().iter_events_json(start_from, ends_to)
+
+    def iter_matching_events(self,
+                             start_from: datetime,
+                             ends_to: datetime,
+                             event_filter: EventFilter,
+                             ) -> Iterator[EventSummary]:
+        if self._warm_snapshot is None:
+            return self.storage.iter_matching_events(start_from, ends_to,
+                                                     event_filter)
+        return super().iter_matching_events(start_from, ends_to,
+                                            event_filter)
+
+    def iter_matching_events_json(self,
+                                  start_from: datetime,
+                                  ends_to: datetime,
+                                  event_filter: EventFilter,
+                                  ) -> Iterator[bytes]:
+        if self._warm_snapshot is None:
+            return self.storage.iter_matching_events_json(
+                start_from, ends_to, event_filter)
+        return super().iter_matching_events_json(start_from, ends_to,
+                                                 event_filter)
+
+    def get_aggregates(self, start_day: date, end_day: date) -> List[dict]:
+        if self._warm_snapshot is None:
+            return self.storage.get_aggregates(start_day, end_day)
+        return super().get_aggregates(start_day, end_day)
+
+    def set_event(self, event: PartnerEvent):
+        """Updates event in wrapped storage. Creates new record if need."""
+
+        self.set_events([event])
+
+    def set_events(self, events: Iterable[PartnerEvent]) -> WriteResult:
+        """Updates events in wrapped storage, once the saved snapshot is
+        decoded into it, and saves it to snapshot if it is time to."""
+
+        if not self.restored.is_set():
+            logger.warning("Storage write waits for events snapshot %s to "
+                           "be decoded.", self._path)
+            self.restored.wait()
+        with self._write_lock:
+            write_result = self.storage.set_events(events)
+            self._save_if_due()
+        return write_result
+
+    def _save_periodically(self):
+        # with no interval, writes are checked every second
+        while not self._closed.wait(self._interval or 1.0):
+            if self.restored.is_set():
+                with self._write_lock:
+                    self._save_if_due()
+
+    def _save_if_due(self):
+        if (self.storage.version == self._saved_version
+                or time.monotonic() - self._saved_at < self._interval
+                or (self._saving is not None and self._saving.is_alive())):
+            return
+
+        self._saved_version = self.storage.version
+        self._saved_at = time.monotonic()
+        # Published storage state is never changed in place, so it is
+        # saved while new writes go on.
+        self._saving = threading.Thread(target=self.save, daemon=True,
+                                        name="snapshot")
+        self._saving.start()
+
+    def close(self):
+        """Stops periodic saving, and saves events which changed since the
+        last save, once the save in progress (if any) is done."""
+
+        self._closed.set()
+        with self._write_lock:
+            if self._saving is not None:
+                self._saving.join()
+            if (self.restored.is_set()
+                    and self.storage.version != self._saved_version):
+                self._saved_version = self.storage.version
+                self.save()
+
+    def save(self):
+        """Saves wrapped storage to the snapshot file."""
+
+        started_at = time.perf_counter()
+        try:
+            write_snapshot(self._path, self.storage.version,
+                           self.storage.items())
+        except OSError:
+            logger.exception("Events snapshot %s can not be saved",
+                             self._path)
+            return
+        logger.info("Events snapshot %s saved in %.2f s.", self._path,
+                    time.perf_counter() - started_at)
@@ -2,14 +2,33 @@
 
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
 
 from app.exceptions.handlers import generic_exception_handler
 from app.exceptions.handlers import validation_exception_handler
+from app.core.backends import event_storage
+from app.core.scheduler import refresh_scheduler
+from app.routers import aggregates
+from app.routers import health
+from app.routers import metrics
 from app.routers import search
 
 
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """Runs periodic partner events refresh while the app is up, and closes
+    events storage once refresh is stopped."""
+
+    refresh_scheduler.start()
+    yield
+    await refresh_scheduler.stop()
+    # e.g. saves the last refreshed events to snapshot (see SNAPSHOT_PATH)
+    event_storage.close()
+
+
 app = FastAPI(
     title='Fever Providers API',
     version='1.0.0',
@@ -19,8 +38,12 @@ app = FastAPI(
             'url': 'https://virtserver.swaggerhub.com/luis-pintado-feverup/backend-test/1.0.0',
         }
     ],
+    lifespan=lifespan,
 )
 app.include_router(search.router)
+app.include_router(aggregates.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
 
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, generic_exception_handler)
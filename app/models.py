@@ -70,3 +70,25 @@ class EventList(BaseModel):
 class SearchGetResponse(BaseModel):
     data: EventList | None
     error: Dict[str, Any] | None
+
+
+class DayAggregates(BaseModel):
+    date: date = Field(..., description='Day when the events start')
+    count: int = Field(..., description='Number of the events')
+    min_price: float = Field(
+        ..., description='Min price from all the events of the day')
+    max_price: float = Field(
+        ..., description='Max price from all the events of the day')
+    avg_min_price: float = Field(
+        ..., description='Average min price of the events of the day')
+    avg_max_price: float = Field(
+        ..., description='Average max price of the events of the day')
+
+
+class AggregatesList(BaseModel):
+    days: List[DayAggregates]
+
+
+class AggregatesGetResponse(BaseModel):
+    data: AggregatesList | None
+    error: Dict[str, Any] | None
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Union
+
+from fastapi import APIRouter, Query
+from fastapi import BackgroundTasks, status
+from fastapi.responses import JSONResponse
+
+from app.models import AggregatesGetResponse
+from app.models import SearchGetResponse1, SearchGetResponse2
+from app.core import settings
+from app.core.backends import event_storage as storage
+from app.core.scheduler import refresh_scheduler
+
+router = APIRouter()
+
+
+@router.get(
+    '/aggregates',
+    response_model=AggregatesGetResponse,
+    responses={
+        '400': {'model': SearchGetResponse1},
+        '500': {'model': SearchGetResponse2},
+    },
+)
+async def aggregate_events(
+    starts_at: date = Query(...), ends_at: date = Query(...),
+    background_tasks: BackgroundTasks = BackgroundTasks()
+) -> Union[AggregatesGetResponse, SearchGetResponse1, SearchGetResponse2]:
+    """Reports, per day, the number of events which start on the day, and
+    their min, max and average prices, from starts_at to ends_at day (both
+    included). Days without events are left out.
+
+    Aggregates are read from per day rollups, which storage keeps up to
+    date on write, so wide ranges cost as many days as they have, rather
+    than as many events.
+    """
+
+    if starts_at > ends_at:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "error": {
+                    "code": "400",
+                    "message": "starts_at date later than ends_at.",
+                },
+                "data": None})
+
+    # Stale stored events are refreshed in background, as on /search.
+    background_tasks.add_task(refresh_scheduler.refresh,
+                              max_age=settings.REFRESH_INTERVAL)
+
+    return {
+        "data": {
+            "days": storage.get_aggregates(starts_at, ends_at),
+        },
+        "error": None,
+    }
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from fastapi import APIRouter
+
+from app.core.backends import event_storage
+from app.core.cache import search_response_cache
+from app.core.cached_storage import CachedStorage
+from app.core.scheduler import refresh_scheduler
+
+router = APIRouter()
+
+
+@router.get('/health')
+async def health():
+    """Reports freshness of stored partner events, e.g. for alerting,
+    and /search response and storage query cache stats."""
+
+    last_refreshed_at = refresh_scheduler.last_refreshed_at
+    seconds_since_refresh = None
+    if last_refreshed_at is not None:
+        seconds_since_refresh = (
+            datetime.now(timezone.utc) - last_refreshed_at).total_seconds()
+
+    storage_cache_stats = None
+    if isinstance(event_storage, CachedStorage):
+        storage_cache_stats = event_storage.stats()
+
+    return {
+        "last_refreshed_at": last_refreshed_at,
+        "seconds_since_refresh": seconds_since_refresh,
+        "refreshing": refresh_scheduler.is_refreshing,
+        "search_response_cache": search_response_cache.stats(),
+        "storage_cache": storage_cache_stats,
+    }
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core import metrics
+
+router = APIRouter()
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+async def get_metrics():
+    """Reports app metrics (latencies of partner events fetch, parse,
+    storage writes and /search, and events counters) in Prometheus text
+    format."""
+
+    return PlainTextResponse(metrics.render(),
+                             media_type="text/plain; version=0.0.4")
@@ -1,18 +1,56 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional, Union
+from itertools import islice
+import os
+from typing import Callable, Iterator, Optional, Tuple, Union
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Request
+from fastapi.routing import APIRoute
 from fastapi import BackgroundTasks, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from app.models import SearchGetResponse
 from app.models import SearchGetResponse1, SearchGetResponse2
-from app.controllers.search import PartnerEventsController
-from app.core.storage import local_event_storage as storage
+from app.core import metrics
+from app.core import settings
+from app.core.backends import event_storage as storage
+from app.core.cache import search_response_cache
+from app.core.profiling import PROFILE_HEADER, profiler
+from app.core.scheduler import refresh_scheduler
+from app.core.storage import EventFilter
 
-router = APIRouter()
+
+class TimedRoute(APIRoute):
+    """Route which observes time of request handling (including params
+    validation and response serialization) in SEARCH_SECONDS metric, and
+    profiles the requests which profiler samples or which ask for it with
+    PROFILE_HEADER. Responses to the latter have top functions of the
+    profile in Server-Timing header."""
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+
+        async def timed_route_handler(request: Request) -> Response:
+            is_requested = profiler.is_requested(
+                request.headers.get(PROFILE_HEADER))
+            with metrics.SEARCH_SECONDS.time(), profiler.profile(
+                    "search", is_requested) as captured:
+                response = await route_handler(request)
+            if is_requested and captured is not None:
+                response.headers["Server-Timing"] = captured.server_timing()
+                if captured.path:
+                    response.headers[PROFILE_HEADER] = os.path.basename(
+                        captured.path)
+            return response
+
+        return timed_route_handler
+
+
+router = APIRouter(route_class=TimedRoute)
+
+# Events per chunk of streamed NDJSON response.
+NDJSON_CHUNK_SIZE = 500
 
 
 @router.get(
@@ -24,10 +62,27 @@ router = APIRouter()
     },
 )
 async def search_events(
+    request: Request,
     starts_at: Optional[datetime] = None, ends_at: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1, le=settings.SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    title: Optional[str] = Query(None, min_length=1, max_length=100),
+    stream: bool = False,
     background_tasks: BackgroundTasks = BackgroundTasks()
 ) -> Union[SearchGetResponse, SearchGetResponse1, SearchGetResponse2]:
-    """Lists the available events on a specified time range."""
+    """Lists the available events on a specified time range.
+
+    Events are ordered by start. With limit, only one page of events is
+    returned, starting at offset, and if there are more, "Link" header has
+    URL of the next page (rel="next"). With stream, events are streamed as
+    they are read, as newline delimited JSON (one EventSummary per line).
+
+    Events can be filtered by price, min_price and max_price select events
+    with price range overlapping the given one, and by title, every word of
+    which must start some word of the event title (case insensitive).
+    """
 
     if not starts_at or not ends_at:
         return JSONResponse(
@@ -45,20 +100,93 @@ async def search_events(
     assert starts_at <= ends_at, "starts_at datetime later than ends_at"
 
     # For sake of speed/availability, we will return to user immediately what
-    # we have at this moment in the storage, while the latest data update will
-    # be processed in a handle_new_events_request() in background task,
-    # so the updated data will be available on the next user request.
+    # we have at this moment in the storage. Partner events are refreshed
+    # periodically, but if stored events are stale, the refresh is started
+    # (or joined, if some other request already started it) in background
+    # task, so the updated data will be available on the next user request.
     # More info: https://fastapi.tiangolo.com/tutorial/background-tasks/
 
-    partner_controller = PartnerEventsController()
+    background_tasks.add_task(refresh_scheduler.refresh,
+                              max_age=settings.REFRESH_INTERVAL)
+
+    event_filter = None
+    if min_price is not None or max_price is not None or title is not None:
+        event_filter = EventFilter(min_price, max_price, title)
+
+    if stream:
+        events_json = islice(_iter_events_json(starts_at, ends_at,
+                                               event_filter),
+                             offset, offset + limit if limit else None)
+        return StreamingResponse(_iter_ndjson_chunks(events_json),
+                                 media_type="application/x-ndjson")
+
+    if not (limit or offset or event_filter or search_response_cache.maxsize
+            or settings.STORAGE_JSON_FRAGMENTS):
+        events_list = storage.get_events(starts_at, ends_at)
+        return {
+            "data": {
+                "events": events_list,
+            },
+            "error": None,
+        }
+
+    # Response for the same query and storage version is the same, so it is
+    # encoded once and then returned as is, bypassing response_model
+    # validation and serialization.
+    cache_key = (starts_at, ends_at, offset, limit, event_filter)
+    storage_version = storage.version
+    cached = search_response_cache.get(cache_key, storage_version)
+    if cached is None:
+        cached = _encode_response(starts_at, ends_at, offset, limit,
+                                  event_filter)
+        search_response_cache.set(cache_key, storage_version, cached)
+
+    content, has_next_page = cached
+    headers = {}
+    if has_next_page:
+        next_page_url = request.url.include_query_params(
+            offset=offset + limit, limit=limit)
+        headers["Link"] = f'<{next_page_url}>; rel="next"'
+    return Response(content=content, media_type="application/json",
+                    headers=headers)
+
+
+def _iter_events_json(starts_at: datetime, ends_at: datetime,
+                      event_filter: EventFilter | None) -> Iterator[bytes]:
+    """Yields JSON encoded events within the time range, which match the
+    filter, if any."""
+
+    if event_filter is None:
+        return storage.iter_events_json(starts_at, ends_at)
+    return storage.iter_matching_events_json(starts_at, ends_at, event_filter)
+
+
+def _encode_response(starts_at: datetime, ends_at: datetime,
+                     offset: int, limit: int | None,
+                     event_filter: EventFilter | None = None,
+                     ) -> Tuple[bytes, bool]:
+    """Returns JSON encoded /search response, and whether there are events
+    after the page it has."""
+
+    if limit is None and not offset and event_filter is None:
+        events_json = storage.get_events_json(starts_at, ends_at)
+        has_next_page = False
+    else:
+        # one event past the page tells whether there is the next page
+        page = list(islice(_iter_events_json(starts_at, ends_at, event_filter),
+                           offset, offset + limit + 1 if limit else None))
+        has_next_page = limit is not None and len(page) > limit
+        events_json = b"[" + b",".join(page[:limit]) + b"]"
+
+    content = b"".join((
+        b'{"data":{"events":', events_json, b'},"error":null}'))
+    return content, has_next_page
+
 
-    background_tasks.add_task(partner_controller.handle_new_events_request,
-                              starts_at, ends_at, storage)
+def _iter_ndjson_chunks(events_json: Iterator[bytes]) -> Iterator[bytes]:
+    """Yields JSON encoded events as NDJSON, NDJSON_CHUNK_SIZE lines in
+    every chunk."""
 
-    events_list = storage.get_events(starts_at, ends_at)
-    return {
-        "data": {
-            "events": events_list,
-        },
-        "error": None,
-    }
+    while chunk := list(islice(events_json, NDJSON_CHUNK_SIZE)):
+        chunk.append(b"")
+        yield b"\n".join(chunk)
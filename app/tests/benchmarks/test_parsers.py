@@ -0,0 +1,92 @@
+"""Micro-benchmarks of partner events parsing.
+
+Every benchmark measures events parsed per second (best of ROUNDS runs)
+and fails if it drops below MIN_EVENTS_PER_SEC, so that parsing
+regressions show up when benchmarks are run. The floor is set well below
+the throughput of a developer machine; set BENCHMARK_MIN_EVENTS_PER_SEC to
+tune it for slower hosts (0 only reports throughput).
+
+Wall-clock numbers depend on host load, so benchmarks are skipped unless
+RUN_BENCHMARKS is set; the default test run checks that the parsers agree
+(see app/tests/core/test_parsers.py). Run them with:
+
+    RUN_BENCHMARKS=1 pytest -s app/tests/benchmarks
+"""
+
+import os
+import time
+from typing import Callable, Tuple
+
+from lxml import etree
+import pytest
+
+from app.core import parsers
+from app.tests.stub_provider import iter_feed_chunks, make_feed
+
+
+EVENTS = 5_000
+ROUNDS = 5
+MIN_EVENTS_PER_SEC = float(
+    os.getenv("BENCHMARK_MIN_EVENTS_PER_SEC", "5000"))
+
+pytestmark = pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"),
+                                reason="benchmarks run with RUN_BENCHMARKS=1")
+
+
+def events_per_second(*benchmarks: Tuple[str, Callable[[], int]]) -> list:
+    """Returns best throughput of every given (name, parse) benchmark, where
+    parse() returns number of parsed events, over ROUNDS runs. Rounds of
+    the benchmarks alternate, so that changes of host load affect them
+    alike and their throughputs can be compared."""
+
+    best = [float("inf")] * len(benchmarks)
+    for _ in range(ROUNDS):
+        for index, (_, parse) in enumerate(benchmarks):
+            started_at = time.perf_counter()
+            assert parse() == EVENTS
+            best[index] = min(best[index], time.perf_counter() - started_at)
+
+    throughputs = []
+    for (name, _), seconds in zip(benchmarks, best):
+        throughput = EVENTS / seconds
+        print(f"\n{name}: {throughput:,.0f} events/sec")
+        assert throughput >= MIN_EVENTS_PER_SEC
+        throughputs.append(throughput)
+    return throughputs
+
+
+def test_tree_parsing_throughput():
+    """Benchmarks parsing of the whole partner response, with and without
+    PartnerEvent validation."""
+
+    content = make_feed(EVENTS)
+
+    def parse(strict: bool) -> int:
+        root = etree.fromstring(content)
+        return len(parsers.parse_events_data_from_xml(root, strict=strict))
+
+    fast, strict = events_per_second(
+        ("tree", lambda: parse(strict=False)),
+        ("tree, strict", lambda: parse(strict=True)))
+    assert fast > strict
+
+
+def test_stream_parsing_throughput():
+    """Benchmarks incremental parsing of partner response chunks."""
+
+    chunks = list(iter_feed_chunks(EVENTS))
+
+    events_per_second(("stream", lambda: sum(
+        1 for _ in parsers.iter_events_from_xml_chunks(chunks))))
+
+
+def test_compact_parsing_throughput():
+    """Benchmarks parsing in worker pool form: compact events, turned into
+    Partner Events on the event loop side."""
+
+    content = make_feed(EVENTS)
+
+    events_per_second(("compact", lambda: len([
+        parsers.partner_event_from_compact(compact_event)
+        for compact_event in parsers.parse_compact_events_from_xml(content)[0]
+    ])))
@@ -0,0 +1,97 @@
+"""Tests for multiple partner events providers controller."""
+
+import asyncio
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.controllers.providers import (ProviderRegistry, ProvidersController,
+                                       create_providers_controller)
+from app.controllers.search import PartnerEventsController
+from app.core.storage import WriteResult
+from app.tests.stub_provider import FaultInjector, StubProvider, make_feed
+
+
+def make_controller(*providers):
+    registry = ProviderRegistry()
+    for name, provider in providers:
+        registry.register(name, PartnerEventsController(provider.client()))
+    return ProvidersController(registry)
+
+
+def make_storage_mock():
+    storage = Mock()
+    storage.set_events.return_value = WriteResult()
+    return storage
+
+
+def test_handle_new_events_request():
+    """Tests that providers are fetched concurrently, and that their events
+    are stored in one batch, namespaced by provider."""
+
+    controller = make_controller(
+        ("", FaultInjector(StubProvider(make_feed(2)), [0.2])),
+        ("acme", FaultInjector(StubProvider(make_feed(3)), [0.2])))
+    storage = make_storage_mock()
+
+    started_at = time.perf_counter()
+    assert asyncio.run(controller.handle_new_events_request(storage))
+    assert time.perf_counter() - started_at < 0.35
+
+    storage.set_events.assert_called_once()
+    assert [event.base_event_id
+            for event in storage.set_events.call_args.args[0]] == [
+        "0", "1", "acme:0", "acme:1", "acme:2"]
+
+
+def test_handle_new_events_request__store_failed():
+    """Tests that events of all the providers are fetched and stored again
+    after their batch failed to be stored."""
+
+    providers = [StubProvider(make_feed(2)), StubProvider(make_feed(3))]
+    controller = make_controller(("", providers[0]), ("acme", providers[1]))
+    storage = make_storage_mock()
+    storage.set_events.side_effect = [OSError("disk full"), WriteResult()]
+
+    async def main():
+        with pytest.raises(OSError):
+            await controller.handle_new_events_request(storage)
+        assert await controller.handle_new_events_request(storage)
+
+    asyncio.run(main())
+    assert len(storage.set_events.call_args.args[0]) == 5
+    for provider in providers:
+        assert "If-None-Match" not in provider.requests[1].headers
+
+
+def test_handle_new_events_request__failed_provider():
+    """Tests that events of the other providers are stored when one of them
+    failed, and that refresh fails only when all of them failed."""
+
+    failing_provider = FaultInjector(StubProvider(make_feed(2)), [404, 404])
+    controller = make_controller(
+        ("", failing_provider),
+        ("acme", FaultInjector(StubProvider(make_feed(3)), [None, 404])))
+    storage = make_storage_mock()
+
+    async def main():
+        assert await controller.handle_new_events_request(storage)
+        assert await controller.handle_new_events_request(storage) is False
+
+    asyncio.run(main())
+    storage.set_events.assert_called_once()
+    assert len(storage.set_events.call_args.args[0]) == 3
+
+
+@patch("app.core.settings.EVENT_PROVIDERS",
+       "acme=http://acme.test/events, other=http://other.test/events")
+def test_create_providers_controller():
+    """Tests that providers are registered from settings."""
+
+    controller = create_providers_controller()
+
+    assert [(name, provider.url)
+            for name, provider in controller.registry.items()][1:] == [
+        ("acme", "http://acme.test/events"),
+        ("other", "http://other.test/events")]
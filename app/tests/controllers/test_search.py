@@ -0,0 +1,330 @@
+"""Tests for Partner Events API controller."""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import json
+import threading
+from unittest.mock import Mock, patch
+
+import httpx
+from lxml import etree
+import pytest
+
+from app.controllers.search import PartnerEventsController
+from app.core import parsers
+from app.core.resilience import CircuitBreaker
+from app.core.storage import WriteResult
+from app.tests.events import make_event
+from app.tests.stub_provider import (FaultInjector, StubProvider,
+                                     iter_feed_chunks, make_feed)
+
+
+def make_storage_mock():
+    storage = Mock()
+    storage.set_events.return_value = WriteResult()
+    return storage
+
+
+def parse_json_events(content: bytes) -> list:
+    """Parses partner response of [event id, start, end] JSON lists."""
+
+    return [make_event(*fields) for fields in json.loads(content)]
+
+
+def test_handle_new_events_request():
+    """Tests that partner events are fetched, parsed and stored."""
+
+    provider = StubProvider(make_feed(3))
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+
+    assert asyncio.run(controller.handle_new_events_request(storage))
+
+    storage.set_events.assert_called_once()
+    events = storage.set_events.call_args.args[0]
+    assert len(events) == 3
+    event = events[0]
+    assert (event.base_event_id, event.id, event.title) == (
+        "0", "0", "Event 0")
+    assert (event.min_price, event.max_price) == (10.0, 20.0)
+
+
+def test_handle_new_events_request__stored_off_event_loop():
+    """Tests that events are written to storage in a thread, as the write
+    builds a new version of storage, rather than on event loop."""
+
+    provider = StubProvider(make_feed(3))
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+    store_threads = []
+    storage.set_events.side_effect = lambda events: (
+        store_threads.append(threading.current_thread()) or WriteResult())
+
+    assert asyncio.run(controller.handle_new_events_request(storage))
+
+    assert len(storage.set_events.call_args.args[0]) == 3
+    assert store_threads and store_threads[0] is not threading.main_thread()
+
+
+def test_handle_new_events_request__not_modified():
+    """Tests that unchanged partner events are neither parsed nor stored
+    again, and that changed ones are."""
+
+    provider = StubProvider(make_feed(3))
+    first_etag = provider.etag
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+
+    async def main():
+        await controller.handle_new_events_request(storage)
+        storage.reset_mock()
+
+        # not modified
+        assert await controller.handle_new_events_request(storage)
+        storage.set_events.assert_not_called()
+
+        # modified
+        provider.content = make_feed(4)
+        assert await controller.handle_new_events_request(storage)
+        assert len(storage.set_events.call_args.args[0]) == 4
+
+    asyncio.run(main())
+    assert "If-None-Match" not in provider.requests[0].headers
+    assert provider.requests[1].headers["If-None-Match"] == first_etag
+    assert len(provider.requests) == 3
+
+
+def test_handle_new_events_request__store_failed():
+    """Tests that events which failed to be stored are fetched again, as
+    the next request is not conditional to their response."""
+
+    provider = StubProvider(make_feed(3))
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+    storage.set_events.side_effect = [OSError("disk full"), WriteResult()]
+
+    async def main():
+        with pytest.raises(OSError):
+            await controller.handle_new_events_request(storage)
+        assert await controller.handle_new_events_request(storage)
+
+    asyncio.run(main())
+    assert "If-None-Match" not in provider.requests[1].headers
+    assert storage.set_events.call_count == 2
+    assert len(storage.set_events.call_args.args[0]) == 3
+
+
+@patch("app.core.settings.XML_STREAM_PARSING", "1")
+def test_handle_new_events_request__stream_parsing():
+    """Tests that partner events are stored while response is streamed,
+    and that unchanged events are not parsed again."""
+
+    provider = StubProvider(make_feed(3))
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+
+    async def main():
+        assert await controller.handle_new_events_request(storage)
+        assert len(storage.set_events.call_args.args[0]) == 3
+
+        storage.reset_mock()
+        assert await controller.handle_new_events_request(storage)
+        storage.set_events.assert_not_called()
+
+    asyncio.run(main())
+    assert len(provider.requests) == 2
+
+
+@patch("app.core.settings.INCREMENTAL_REFRESH", "1")
+def test_handle_new_events_request__incremental():
+    """Tests that incremental refresh stores only changed events, and that
+    it does so with stream parsing as well."""
+
+    provider = StubProvider(make_feed(3))
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+
+    async def main():
+        assert await controller.handle_new_events_request(storage)
+        assert len(storage.set_events.call_args.args[0]) == 3
+
+        provider.content = b"".join(iter_feed_chunks(3, price_shifts={1: 5}))
+        assert await controller.handle_new_events_request(storage)
+        assert [event.id for event in storage.set_events.call_args.args[0]
+                ] == ["1"]
+
+        with patch("app.core.settings.XML_STREAM_PARSING", "1"):
+            provider.content = make_feed(2)
+            assert await controller.handle_new_events_request(storage)
+        assert [event.id for event in storage.set_events.call_args.args[0]
+                ] == ["1"]
+
+    asyncio.run(main())
+    assert controller.offline_events == {("2", "2")}
+
+
+@patch("app.core.settings.INCREMENTAL_REFRESH", "1")
+def test_handle_new_events_request__incremental_in_worker_processes():
+    """Tests that incremental parsing runs in worker processes, and that
+    fingerprints of the response parsed there are kept for the next one."""
+
+    provider = StubProvider(make_feed(3))
+    storage = make_storage_mock()
+
+    async def main():
+        assert await controller.handle_new_events_request(storage)
+        assert len(storage.set_events.call_args.args[0]) == 3
+
+        provider.content = make_feed(2)
+        assert await controller.handle_new_events_request(storage)
+        assert storage.set_events.call_args.args[0] == []
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        submit = Mock(wraps=executor.submit)
+        executor.submit = submit
+        controller = PartnerEventsController(provider.client(), executor)
+        asyncio.run(main())
+
+    assert {call.args[0] for call in submit.call_args_list} == {
+        parsers.parse_compact_events_incrementally}
+    assert controller.offline_events == {("2", "2")}
+
+
+def test_handle_new_events_request__parse_content_in_worker_processes():
+    """Tests that response of other format is parsed by the given parser in
+    the worker pool, as xml is."""
+
+    provider = StubProvider(json.dumps([
+        ["1", "2021-05-02T17:32:28Z", "2021-05-02T18:42:38Z"],
+        ["2", "2021-05-01T17:32:28Z", "2021-07-21T18:42:38Z"],
+    ]).encode())
+    storage = make_storage_mock()
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        submit = Mock(wraps=executor.submit)
+        executor.submit = submit
+        controller = PartnerEventsController(
+            provider.client(), executor, parse_content=parse_json_events)
+        assert asyncio.run(controller.handle_new_events_request(storage))
+
+    submit.assert_called_once()
+    assert submit.call_args.args[0] is parse_json_events
+    assert [event.id for event in storage.set_events.call_args.args[0]
+            ] == ["1", "2"]
+
+
+@patch("app.core.settings.FETCH_BACKOFF_BASE", 0)
+def test_handle_new_events_request__retries_transient_errors():
+    """Tests that connection errors and 5xx responses are retried, and that
+    other errors are not."""
+
+    provider = FaultInjector(StubProvider(make_feed(3)), [
+        httpx.ConnectError("refused"), 503, None, 404])
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+
+    async def main():
+        assert await controller.handle_new_events_request(storage)
+        assert provider.calls == 3
+        assert not await controller.handle_new_events_request(storage)
+        assert provider.calls == 4
+
+    asyncio.run(main())
+    storage.set_events.assert_called_once()
+
+
+@patch("app.core.settings.XML_STREAM_PARSING", "1")
+@patch("app.core.settings.FETCH_BACKOFF_BASE", 0)
+def test_handle_new_events_stream__retries_transient_errors():
+    """Tests that failed streamed download is retried from the start."""
+
+    provider = FaultInjector(StubProvider(make_feed(3)), [502])
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+
+    assert asyncio.run(controller.handle_new_events_request(storage))
+    assert provider.calls == 2
+    assert len(storage.set_events.call_args.args[0]) == 3
+
+
+@patch("app.core.settings.FETCH_BACKOFF_BASE", 0)
+@patch("app.core.settings.FETCH_RETRIES", 1)
+@patch("app.core.settings.CIRCUIT_BREAKER_FAILURES", 3)
+def test_handle_new_events_request__circuit_breaker():
+    """Tests that partner API is not called while circuit breaker is open,
+    and that storage is not touched meanwhile."""
+
+    provider = FaultInjector(StubProvider(make_feed(3)), [503] * 4)
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+
+    async def main():
+        assert not await controller.handle_new_events_request(storage)
+        assert not await controller.handle_new_events_request(storage)
+        # the third failure opened the breaker, so there was no retry
+        assert provider.calls == 3
+        for _ in range(3):
+            assert not await controller.handle_new_events_request(storage)
+        assert provider.calls == 3
+
+    asyncio.run(main())
+    storage.set_events.assert_not_called()
+
+
+@patch("app.core.settings.XML_STREAM_PARSING", "1")
+@patch("app.core.settings.FETCH_RETRIES", 0)
+@patch("app.core.settings.CIRCUIT_BREAKER_FAILURES", 1)
+@patch("app.core.settings.CIRCUIT_BREAKER_RESET_TIMEOUT", 0)
+def test_handle_new_events_stream__malformed_response_trips_breaker():
+    """Tests that malformed streamed response during half-open breaker
+    trial opens the breaker again, so partner API is tried again later."""
+
+    stub = StubProvider(b"<eventList><output><base_event")
+    provider = FaultInjector(stub, [503])
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+
+    async def main():
+        assert not await controller.handle_new_events_request(storage)
+        # half-open trial gets malformed response
+        with pytest.raises(etree.XMLSyntaxError):
+            await controller.handle_new_events_request(storage)
+        assert controller.circuit_breaker.state != CircuitBreaker.CLOSED
+
+        stub.content = make_feed(3)
+        assert await controller.handle_new_events_request(storage)
+
+    asyncio.run(main())
+    assert provider.calls == 3
+    assert len(storage.set_events.call_args.args[0]) == 3
+
+
+@patch("app.core.settings.REFRESH_DEADLINE", 0.05)
+def test_handle_new_events_request__deadline():
+    """Tests that refresh is given up once deadline passed, even though
+    partner API request timeout is longer."""
+
+    provider = FaultInjector(StubProvider(make_feed(3)), [10.0])
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+
+    assert not asyncio.run(controller.handle_new_events_request(storage))
+    storage.set_events.assert_not_called()
+    assert provider.in_flight == 0
+
+
+@patch("app.core.settings.MAX_CONCURRENT_FETCHES", 2)
+def test_handle_new_events_request__concurrent_fetches_limit():
+    """Tests that no more than MAX_CONCURRENT_FETCHES fetches are in flight,
+    and that the others wait for them."""
+
+    provider = FaultInjector(StubProvider(make_feed(3)), [0.01] * 5)
+    controller = PartnerEventsController(provider.client())
+    storage = make_storage_mock()
+
+    async def main():
+        return await asyncio.gather(*(
+            controller.handle_new_events_request(storage) for _ in range(5)))
+
+    assert asyncio.run(main()) == [True] * 5
+    assert provider.max_in_flight == 2
@@ -0,0 +1,30 @@
+"""Tests for caches."""
+
+from app.core.cache import VersionedLRUCache
+
+
+def test_versioned_lru_cache():
+    """Tests that VersionedLRUCache evicts least recently used values,
+    and drops all of them once storage version changed."""
+
+    cache = VersionedLRUCache(maxsize=2)
+
+    assert cache.get("a", 1) is None
+    cache.set("a", 1, b"A")
+    cache.set("b", 1, b"B")
+    assert cache.get("a", 1) == b"A"
+    cache.set("c", 1, b"C")  # evicts "b"
+
+    assert cache.get("b", 1) is None
+    assert cache.get("c", 1) == b"C"
+    assert cache.stats() == {
+        "size": 2, "hits": 2, "misses": 2, "hit_ratio": 0.5,
+        "evictions": 1, "expirations": 0}
+
+    # storage write
+    assert cache.get("a", 2) is None
+    assert len(cache) == 0
+
+    # value computed for outdated version is not cached
+    cache.set("a", 1, b"A")
+    assert cache.get("a", 2) is None
@@ -0,0 +1,79 @@
+"""Tests for query results caching storage."""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+import time
+from unittest.mock import Mock, patch
+
+from app.core import metrics
+from app.core.cached_storage import CachedStorage
+
+
+RANGE_START = datetime.fromisoformat("2021-05-01T00:00:00Z")
+RANGE_END = datetime.fromisoformat("2021-08-01T00:00:00Z")
+
+
+def test_cached_storage__invalidated_by_version_and_ttl():
+    """Tests that query results are cached until storage write or until
+    they expire."""
+
+    storage = Mock(version=1)
+    storage.get_events.return_value = [{"id": "1"}]
+    cached_storage = CachedStorage(storage, maxsize=10, ttl=60)
+    counters = (metrics.CACHE_HITS, metrics.CACHE_MISSES,
+                metrics.CACHE_EXPIRATIONS)
+    counts = [counter.value(("storage",)) for counter in counters]
+
+    for _ in range(3):
+        assert cached_storage.get_events(RANGE_START, RANGE_END) == [
+            {"id": "1"}]
+    storage.get_events.assert_called_once_with(RANGE_START, RANGE_END)
+
+    # storage write
+    storage.version = 2
+    cached_storage.get_events(RANGE_START, RANGE_END)
+    assert storage.get_events.call_count == 2
+
+    with patch("time.monotonic", return_value=time.monotonic() + 61):
+        cached_storage.get_events(RANGE_START, RANGE_END)
+    assert storage.get_events.call_count == 3
+
+    assert cached_storage.stats() == {
+        "size": 1, "hits": 2, "misses": 3, "hit_ratio": 0.4,
+        "evictions": 0, "expirations": 1, "coalesced": 0}
+    # exported on /metrics too
+    assert [counter.value(("storage",)) - count
+            for counter, count in zip(counters, counts)] == [2, 3, 1]
+
+
+def test_cached_storage__coalesces_concurrent_queries():
+    """Tests that concurrent identical queries are computed only once."""
+
+    computing = threading.Event()
+    release = threading.Event()
+
+    def get_events_json(*_):
+        computing.set()
+        release.wait(5)
+        return b"[]"
+
+    storage = Mock(version=1)
+    storage.get_events_json.side_effect = get_events_json
+    cached_storage = CachedStorage(storage, maxsize=10)
+    coalesced = metrics.STORAGE_QUERIES_COALESCED.value()
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [executor.submit(cached_storage.get_events_json,
+                                   RANGE_START, RANGE_END)]
+        computing.wait(5)
+        futures += [executor.submit(cached_storage.get_events_json,
+                                    RANGE_START, RANGE_END)
+                    for _ in range(4)]
+        while cached_storage.coalesced < 4:
+            time.sleep(0.001)
+        release.set()
+
+        assert [future.result() for future in futures] == [b"[]"] * 5
+    storage.get_events_json.assert_called_once()
+    assert metrics.STORAGE_QUERIES_COALESCED.value() - coalesced == 4
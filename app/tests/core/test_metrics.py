@@ -0,0 +1,41 @@
+"""Tests for app metrics."""
+
+from app.core.metrics import Counter, Histogram
+
+
+def test_histogram_collect():
+    """Tests that histogram is rendered with cumulative buckets."""
+
+    histogram = Histogram("test_seconds", "Test.", buckets=(0.1, 1),
+                          registry=None)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert list(histogram.collect()) == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        "test_seconds_sum 5.55",
+        "test_seconds_count 3",
+    ]
+
+
+def test_counter_collect():
+    """Tests that counter is rendered per label values."""
+
+    counter = Counter("test_total", "Test.", ("result",), registry=None)
+    counter.inc(2, ("updated",))
+    counter.inc(3, ("inserted",))
+    counter.inc(1, ("updated",))
+
+    assert list(counter.collect()) == [
+        "# HELP test_total Test.",
+        "# TYPE test_total counter",
+        'test_total{result="inserted"} 3',
+        'test_total{result="updated"} 3',
+    ]
+    assert list(Counter("empty_total", "Test.", registry=None).collect())[-1] == (
+        "empty_total 0")
@@ -0,0 +1,98 @@
+"""Tests for data parsers."""
+
+from datetime import datetime, timezone
+
+from lxml import etree
+
+from app.core import parsers
+from app.tests.stub_provider import make_event_xml, make_feed
+
+
+def test_parse_events_data_from_xml__skips_offline_events():
+    """Tests that only online events are parsed."""
+
+    xml = (f'<eventList><output>{make_event_xml(1)}'
+           f'{make_event_xml(2, sell_mode="offline")}</output></eventList>')
+
+    events = parsers.parse_events_data_from_xml(etree.fromstring(xml))
+
+    assert [event.id for event in events] == ["1"]
+
+
+def test_iter_events_from_xml_chunks():
+    """Tests that streaming parser yields the same events as tree parser,
+    no matter how document is split into chunks."""
+
+    content = make_feed(20)
+    chunks = (content[i:i + 7] for i in range(0, len(content), 7))
+
+    events = list(parsers.iter_events_from_xml_chunks(chunks))
+
+    assert events == parsers.parse_events_data_from_xml(
+        etree.fromstring(content))
+    assert len(events) == 20
+
+
+def test_iter_events_from_xml_chunks__unknown_document():
+    """Tests that streaming parser ignores documents of unknown format."""
+
+    xml = f'<otherList><output>{make_event_xml(1)}</output></otherList>'
+
+    assert not list(parsers.iter_events_from_xml_chunks([xml.encode()]))
+
+
+def test_parse_events_data_from_xml__strict_and_fast_paths_agree():
+    """Tests that events built without validation equal validated ones,
+    and the ones built from compact events of worker pool."""
+
+    content = make_feed(20)
+    root = etree.fromstring(content)
+
+    fast_events = parsers.parse_events_data_from_xml(root, strict=False)
+
+    assert fast_events == parsers.parse_events_data_from_xml(root, strict=True)
+    assert fast_events == [
+        parsers.partner_event_from_compact(compact_event)
+        for compact_event in parsers.parse_compact_events_from_xml(content)[0]]
+    assert fast_events[0].start.tzinfo == timezone.utc
+    assert (fast_events[0].min_price, fast_events[0].max_price) == (10, 20)
+
+
+def test_parse_datetime():
+    """Tests that partner API date and time are parsed as UTC."""
+
+    assert parsers.parse_datetime("2021-07-31T20:00:00") == datetime(
+        2021, 7, 31, 20, 0, 0, tzinfo=timezone.utc)
+    assert parsers.parse_datetime("2021-07-31T20:00:00Z") == datetime(
+        2021, 7, 31, 20, 0, 0, tzinfo=timezone.utc)
+
+
+def test_incremental_parser():
+    """Tests that incremental parser returns only new and changed events,
+    and records the ones which disappeared or went offline."""
+
+    def parse(feed, *base_events):
+        xml = f'<eventList><output>{"".join(base_events)}</output></eventList>'
+        parser = feed.parser()
+        events = parser.parse(etree.fromstring(xml))
+        return [event.id for event in events], parser, feed.commit(parser)
+
+    feed = parsers.FeedFingerprints()
+    ids, _, disappeared = parse(feed, make_event_xml(1), make_event_xml(2),
+                                make_event_xml(3))
+    assert ids == ["1", "2", "3"]
+    assert not disappeared
+
+    ids, parser, disappeared = parse(
+        feed, make_event_xml(1), make_event_xml(2, price_shift=5),
+        make_event_xml(4, sell_mode="offline"))
+    assert ids == ["2"]
+    assert (parser.unchanged, parser.filtered) == (1, 1)
+    assert disappeared == {("3", "3")}
+
+    ids, _, disappeared = parse(
+        feed, make_event_xml(1, sell_mode="offline"),
+        make_event_xml(2, price_shift=5), make_event_xml(3))
+    assert ids == ["3"]
+    assert disappeared == {("1", "1")}
+    assert feed.offline_events == {("1", "1")}
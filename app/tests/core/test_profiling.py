@@ -0,0 +1,69 @@
+"""Tests for sampling profiler."""
+
+import asyncio
+import pstats
+from unittest.mock import patch
+
+from app.core import metrics
+from app.core.profiling import SamplingProfiler
+from app.tests.core.test_scheduler import make_scheduler
+
+
+def busy_function():
+    return sum(range(10_000))
+
+
+def test_profile__sampled_and_requested(tmp_path):
+    """Tests that a sample_rate fraction of blocks is profiled, and requested
+    ones always are, one at a time, and that profiles are saved."""
+
+    samples = iter([0.5, 0.3])
+    profiler = SamplingProfiler(0.4, "secret", str(tmp_path),
+                                rnd=lambda: next(samples))
+    captured_before = metrics.PROFILES_CAPTURED.value(("test",))
+
+    with profiler.profile("test") as captured:
+        busy_function()
+    assert captured is None
+
+    with profiler.profile("test") as captured:
+        busy_function()
+        # other blocks are not profiled meanwhile
+        with profiler.profile("test", requested=True) as nested:
+            assert nested is None
+    assert captured.seconds > 0
+    assert any("busy_function" in name
+               for name, _ in captured.top_functions)
+    assert "busy_function" in captured.server_timing(count=20)
+    stats = pstats.Stats(captured.path)
+    assert any(function == "busy_function"
+               for _, _, function in stats.stats)  # pylint: disable=no-member
+
+    with profiler.profile("test", requested=True) as captured:
+        busy_function()
+    assert captured is not None
+    assert len(list(tmp_path.iterdir())) == 2
+    assert metrics.PROFILES_CAPTURED.value(("test",)) == captured_before + 2
+
+
+def test_is_requested():
+    """Tests that profile is requested only with the configured token."""
+
+    assert SamplingProfiler(0, "secret", "").is_requested("secret")
+    assert not SamplingProfiler(0, "secret", "").is_requested("wrong")
+    assert not SamplingProfiler(0, "secret", "").is_requested(None)
+    assert not SamplingProfiler(0, "", "").is_requested("")
+
+
+def test_refresh__profiled():
+    """Tests that sampled partner events refreshes are profiled."""
+
+    scheduler, _ = make_scheduler()
+    profiler = SamplingProfiler(1, "", "")
+
+    with patch("app.core.scheduler.profiler", profiler), \
+            patch.object(profiler, "_save") as save_mock:
+        assert asyncio.run(scheduler.refresh()) is True
+
+    captured = save_mock.call_args.args[1]
+    assert captured.kind == "refresh"
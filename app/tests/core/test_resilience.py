@@ -0,0 +1,55 @@
+"""Tests for partner API fault tolerance helpers."""
+
+import random
+
+from app.core.resilience import CircuitBreaker, backoff_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_circuit_breaker():
+    """Tests that breaker opens after failures in a row, lets one trial
+    call through after reset timeout, and closes once it succeeded."""
+
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10,
+                             clock=clock)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    # failed trial call opens the breaker again
+    clock.now = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+    clock.now = 20
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_backoff_delay():
+    """Tests that backoff delays are random, within exponentially growing
+    bounds, up to max_delay."""
+
+    rnd = random.Random(0)
+    for retry, bound in enumerate([0.5, 1, 2, 4, 5, 5]):
+        delays = [backoff_delay(retry, 0.5, 5, rnd) for _ in range(100)]
+        assert all(0 <= delay <= bound for delay in delays)
+        assert max(delays) > bound / 2
@@ -0,0 +1,70 @@
+"""Tests for partner events refresh scheduler."""
+
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, Mock
+
+from app.core.scheduler import RefreshScheduler
+
+
+def make_scheduler(succeeded=True):
+    async def handle_new_events_request(storage):
+        await asyncio.sleep(0.01)
+        return succeeded
+
+    controller = Mock()
+    controller.handle_new_events_request = AsyncMock(
+        side_effect=handle_new_events_request)
+    storage = Mock(is_read_only=False)
+    return RefreshScheduler(controller, storage, interval=0), controller
+
+
+def test_refresh__concurrent_callers_share_one_fetch():
+    """Tests that concurrent refresh() calls join one in-flight refresh."""
+
+    scheduler, controller = make_scheduler()
+
+    async def main():
+        return await asyncio.gather(*(scheduler.refresh() for _ in range(5)))
+
+    assert asyncio.run(main()) == [True] * 5
+    controller.handle_new_events_request.assert_awaited_once()
+    assert scheduler.last_refreshed_at is not None
+    assert not scheduler.is_refreshing
+
+
+def test_refresh__skipped_while_fresh():
+    """Tests that refresh(max_age) does nothing while data is fresh."""
+
+    scheduler, controller = make_scheduler()
+
+    async def main():
+        await scheduler.refresh()
+        await scheduler.refresh(max_age=60)
+
+    asyncio.run(main())
+    controller.handle_new_events_request.assert_awaited_once()
+
+
+def test_refresh__failed_refresh_keeps_last_refreshed_at():
+    """Tests that failed refresh does not update last_refreshed_at."""
+
+    scheduler, _ = make_scheduler(succeeded=False)
+
+    assert asyncio.run(scheduler.refresh()) is False
+    assert scheduler.last_refreshed_at is None
+    assert not scheduler.is_fresh(60)
+
+
+def test_refresh__read_only_storage_is_not_refreshed():
+    """Tests that process, which does not refresh shared storage, only
+    follows refresh time of the storage."""
+
+    scheduler, controller = make_scheduler()
+    refreshed_at = datetime.now(timezone.utc)
+    scheduler._storage = Mock(  # pylint: disable=protected-access
+        is_read_only=True, refreshed_at=refreshed_at)
+
+    assert asyncio.run(scheduler.refresh()) is True
+    controller.handle_new_events_request.assert_not_awaited()
+    assert scheduler.last_refreshed_at == refreshed_at
@@ -0,0 +1,132 @@
+"""Tests for shared snapshot storage."""
+
+from datetime import datetime
+import threading
+from unittest.mock import patch
+
+from app.core import shared_storage
+
+from app.core.shared_storage import SharedSnapshotStorage
+from app.core.storage import WriteResult
+from app.tests.events import make_event
+
+
+RANGE_START = datetime.fromisoformat("2021-05-01T00:00:00Z")
+RANGE_END = datetime.fromisoformat("2021-08-01T00:00:00Z")
+
+
+def test_readers_see_snapshot_published_by_writer(tmp_path):
+    """Tests that only the first process refreshes the storage, and the
+    others read events it published, with the same UUIDs."""
+
+    path = str(tmp_path / "events.snapshot")
+    writer = SharedSnapshotStorage(path)
+    reader = SharedSnapshotStorage(path)
+    assert not writer.is_read_only
+    assert reader.is_read_only
+    assert reader.get_events(RANGE_START, RANGE_END) == []
+    assert reader.refreshed_at is None
+
+    events = [
+        make_event("1", "2021-05-02T17:32:28Z", "2021-05-02T18:42:38Z"),
+        make_event("2", "2021-05-01T17:32:28Z", "2021-07-21T18:42:38Z"),
+    ]
+    assert writer.set_events(events) == WriteResult(inserted=2)
+    assert writer.wait_published(5)
+
+    result = reader.get_events(RANGE_START, RANGE_END)
+    assert result == writer.get_events(RANGE_START, RANGE_END)
+    assert [event["start_date"] for event in result] == [
+        "2021-05-01", "2021-05-02"]
+    assert result[1] == {
+        "id": result[1]["id"],
+        "title": "Test Event 123",
+        "start_date": "2021-05-02",
+        "start_time": "17:32:28",
+        "end_date": "2021-05-02",
+        "end_time": "18:42:38",
+        "min_price": 25,
+        "max_price": 35,
+    }
+    assert reader.version == 1
+    refreshed_at = reader.refreshed_at
+    assert refreshed_at is not None
+
+    # unchanged events only touch the snapshot
+    assert writer.set_events(events) == WriteResult(unchanged=2)
+    assert reader.version == 1
+    assert reader.refreshed_at >= refreshed_at
+
+    # changed event is published in a new snapshot
+    events[0] = make_event("1", "2021-05-02T17:32:28Z",
+                           "2021-05-02T18:42:38Z", max_price=40)
+    assert writer.set_events(events) == WriteResult(updated=1, unchanged=1)
+    assert writer.wait_published(5)
+    assert reader.version == 2
+    assert [event["max_price"]
+            for event in reader.get_events(RANGE_START, RANGE_END)] == [35, 40]
+
+
+def test_new_writer_keeps_event_ids(tmp_path):
+    """Tests that a process taking the refresh over continues from the
+    published snapshot, so events keep their UUIDs."""
+
+    path = str(tmp_path / "events.snapshot")
+    events = [make_event("1", "2021-05-02T17:32:28Z", "2021-05-02T18:42:38Z")]
+    first_writer = SharedSnapshotStorage(path)
+    first_writer.set_events(events)
+    first_writer.wait_published(5)
+    event_id = first_writer.get_events(RANGE_START, RANGE_END)[0]["id"]
+    # the refreshing process exits
+    first_writer._lock_file.close()  # pylint: disable=protected-access
+
+    second_writer = SharedSnapshotStorage(path)
+    # the published snapshot is decoded in background, and events are read
+    # from it meanwhile
+    decoding = threading.Event()
+    items = shared_storage.Snapshot.items
+    with patch.object(shared_storage.Snapshot, "items",
+                      lambda snapshot: (decoding.wait(), items(snapshot))[1]):
+        assert not second_writer.is_read_only
+        assert not second_writer.restored.is_set()
+        assert second_writer.get_events(
+            RANGE_START, RANGE_END)[0]["id"] == event_id
+        decoding.set()
+        assert second_writer.restored.wait(5)
+    assert second_writer.set_events(events) == WriteResult(unchanged=1)
+    assert second_writer.get_events(RANGE_START, RANGE_END)[0]["id"] == event_id
+
+
+def test_snapshot_is_published_in_background(tmp_path):
+    """Tests that writes do not wait for snapshot to be written, and that
+    writes made meanwhile are published by the next snapshot."""
+
+    path = str(tmp_path / "events.snapshot")
+    writer = SharedSnapshotStorage(path)
+    reader = SharedSnapshotStorage(path)
+    writing, started_writing = threading.Event(), threading.Event()
+    write_snapshot = shared_storage.write_snapshot
+    published_versions = []
+
+    def blocked_write_snapshot(*args):
+        started_writing.set()
+        writing.wait()
+        published_versions.append(args[1])
+        write_snapshot(*args)
+
+    with patch.object(shared_storage, "write_snapshot",
+                      blocked_write_snapshot):
+        for max_price in (35, 40, 45):
+            writer.set_events([make_event(
+                "1", "2021-05-02T17:32:28Z", "2021-05-02T18:42:38Z",
+                max_price=max_price)])
+            assert started_writing.wait(5)
+        assert reader.get_events(RANGE_START, RANGE_END) == []
+
+        writing.set()
+        assert writer.wait_published(5)
+
+    assert published_versions == [1, 3]
+    assert reader.version == 3
+    assert [event["max_price"] for event in reader.get_events(
+        RANGE_START, RANGE_END)] == [45]
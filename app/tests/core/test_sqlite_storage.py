@@ -0,0 +1,39 @@
+"""Tests for SQLite storage."""
+
+from datetime import datetime
+
+from app.core.sqlite_storage import SQLiteEventStorage
+from app.tests.events import make_event
+
+
+def test_events_survive_reopen(tmp_path):
+    """Tests that events and their UUIDs survive storage reopen."""
+
+    path = str(tmp_path / "events.sqlite3")
+    event = make_event("1", "2021-05-02T17:32:28Z", "2021-05-02T18:42:38Z")
+    SQLiteEventStorage(path).set_event(event)
+    range_start = datetime.fromisoformat("2021-05-01T00:00:00Z")
+    range_end = datetime.fromisoformat("2021-05-03T00:00:00Z")
+    stored_events = SQLiteEventStorage(path).get_events(range_start, range_end)
+
+    assert len(stored_events) == 1
+    assert stored_events == SQLiteEventStorage(path).get_events(
+        range_start, range_end)
+
+
+def test_iter_events__pages_through_events_with_the_same_start(tmp_path):
+    """Tests that page boundaries do not skip or repeat events which start
+    at the same time."""
+
+    storage = SQLiteEventStorage(str(tmp_path / "events.sqlite3"),
+                                 page_size=2)
+    storage.set_events([
+        make_event(str(idx), "2021-05-02T17:32:28Z", "2021-05-02T18:42:38Z")
+        for idx in range(5)])
+    range_start = datetime.fromisoformat("2021-05-01T00:00:00Z")
+    range_end = datetime.fromisoformat("2021-05-03T00:00:00Z")
+
+    pages = list(storage.iter_event_pages(range_start, range_end))
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert len({event["id"] for page in pages for event in page}) == 5
@@ -1,10 +1,15 @@
 """Tests for storage layer."""
 
 from datetime import datetime
+import json
 from unittest.mock import patch
 
+from app.core.records import CompactRecords, DictRecords, EventRecord
+from app.core.storage import BaseStorage, EventFilter, WriteResult
+from app.core.storage import _Snapshot
 from app.core.storage import local_event_storage as event_storage
 from app.models import PartnerEvent
+from app.tests.events import make_event
 
 
 class TestEventStorage:
@@ -74,3 +79,295 @@ class TestEventStorage:
             "min_price": 25.0,
             "max_price": 35.0,
         }]
+
+    def test_get_events__uses_index_after_update(self):
+        """Tests that LocalEventStorage range lookups respect both event
+        start and end, and follow events which moved in time on update."""
+
+        event_storage.set_event(make_event(
+            "1", "2030-01-01T10:00:00Z", "2030-01-01T12:00:00Z",
+            base_event_id="333"))
+        event_storage.set_event(make_event(
+            "2", "2030-01-02T10:00:00Z", "2030-01-05T12:00:00Z",
+            base_event_id="333"))
+        event_storage.set_event(make_event(
+            "3", "2030-01-03T10:00:00Z", "2030-01-03T12:00:00Z",
+            base_event_id="333"))
+
+        range_start = datetime.fromisoformat("2030-01-01T00:00:00Z")
+        range_end = datetime.fromisoformat("2030-01-04T00:00:00Z")
+
+        events = event_storage.get_events(range_start, range_end)
+        assert [e["start_date"] for e in events] == [
+            "2030-01-01", "2030-01-03"]
+
+        # move the first event out of the range
+        event_storage.set_event(make_event(
+            "1", "2030-02-01T10:00:00Z", "2030-02-01T12:00:00Z",
+            base_event_id="333"))
+
+        events = event_storage.get_events(range_start, range_end)
+        assert [e["start_date"] for e in events] == ["2030-01-03"]
+
+    def test_set_events(self):
+        """Tests that LocalEventStorage.set_events() applies the whole batch
+        at once and leaves previously published snapshot untouched."""
+
+        range_start = datetime.fromisoformat("2031-01-01T00:00:00Z")
+        range_end = datetime.fromisoformat("2031-02-01T00:00:00Z")
+
+        # above index bulk update threshold, with the same event twice
+        event_storage.set_events(
+            [make_event(idx, f"2031-01-{1 + idx % 28:02}T10:00:00Z",
+                        f"2031-01-{1 + idx % 28:02}T12:00:00Z",
+                        base_event_id="444") for idx in range(100)]
+            + [make_event(0, "2031-01-20T10:00:00Z", "2031-01-20T12:00:00Z",
+                          base_event_id="444")])
+        # pylint: disable=protected-access
+        snapshot = event_storage._snapshot
+        events = event_storage.get_events(range_start, range_end)
+        assert len(events) == 100
+        assert sum(e["start_date"] == "2031-01-20" for e in events) == 4
+
+        event_storage.set_events([
+            make_event(0, "2031-01-21T10:00:00Z", "2031-01-21T12:00:00Z",
+                       base_event_id="444"),
+            make_event(100, "2031-01-21T10:00:00Z", "2031-01-21T12:00:00Z",
+                       base_event_id="444")])
+
+        assert event_storage._snapshot is not snapshot
+        assert snapshot.storage[("444", "0")]["start_date"] == "2031-01-20"
+        assert len(snapshot.start_index) == len(snapshot.storage)
+        events = event_storage.get_events(range_start, range_end)
+        assert len(events) == 101
+        assert sum(e["start_date"] == "2031-01-21" for e in events) == 5
+
+    def test_get_events_json(self):
+        """Tests that LocalEventStorage.get_events_json() returns the same
+        events as get_events(), with or without JSON fragments kept."""
+
+        expected_events = event_storage.get_events(
+            self.event_start, self.event_end)
+        assert json.loads(event_storage.get_events_json(
+            self.event_start, self.event_end)) == expected_events
+
+        # pylint: disable=protected-access
+        with patch.object(event_storage, "_records",
+                          DictRecords(json_fragments=True)), \
+                patch.object(event_storage, "_snapshot",
+                             _Snapshot({}, [], [], 0)), \
+                patch("uuid.uuid4") as uuid4_mock:
+            uuid4_mock.return_value = self.partner_event_uuid
+            event_storage.set_event(self.partner_event)
+            stored_event = event_storage._storage[(
+                self.partner_event.base_event_id, self.partner_event.id)]
+
+            assert json.loads(stored_event["json"]) == expected_events[0]
+            assert json.loads(event_storage.get_events_json(
+                self.event_start, self.event_end)) == expected_events
+            assert event_storage.get_events(
+                self.event_start, self.event_end) == expected_events
+
+    def test_compact_records(self):
+        """Tests that LocalEventStorage with compact records returns the
+        same events as with dict records."""
+
+        expected_events = event_storage.get_events(
+            self.event_start, self.event_end)
+
+        # pylint: disable=protected-access
+        with patch.object(event_storage, "_records", CompactRecords()), \
+                patch.object(event_storage, "_snapshot",
+                             _Snapshot({}, [], [], 0)), \
+                patch("uuid.uuid4") as uuid4_mock:
+            uuid4_mock.return_value = self.partner_event_uuid
+            event_storage.set_event(self.partner_event)
+
+            assert isinstance(event_storage._storage[(
+                self.partner_event.base_event_id, self.partner_event.id)],
+                EventRecord)
+            assert event_storage.get_events(
+                self.event_start, self.event_end) == expected_events
+            assert json.loads(event_storage.get_events_json(
+                self.event_start, self.event_end)) == expected_events
+            assert not event_storage.get_events(
+                self.event_start, self.event_end.replace(second=37))
+
+    def test_set_events__skips_unchanged_events(self):
+        """Tests that LocalEventStorage.set_events() skips events which did
+        not change, and that storage version changes only on changes."""
+
+        version = event_storage.version
+        result = event_storage.set_events([self.partner_event])
+
+        assert result == WriteResult(inserted=0, updated=0, unchanged=1)
+        assert event_storage.version == version
+
+        new_event = self.partner_event.copy(update={"id": "112"})
+        changed_event = self.partner_event.copy(update={"max_price": 45})
+        result = event_storage.set_events([new_event, changed_event])
+
+        assert result == WriteResult(inserted=1, updated=1, unchanged=0)
+        assert event_storage.version == version + 1
+        assert event_storage._storage[("222", "111")]["max_price"] == 45
+
+    def test_iter_events__ordered_by_start(self):
+        """Tests that events are ordered by start and event key, no matter
+        which of the indexes is scanned."""
+
+        # pylint: disable=protected-access
+        with patch.object(event_storage, "_snapshot",
+                          _Snapshot({}, [], [], 0)):
+            event_storage.set_events([
+                make_event("3", "2032-01-02T10:00:00Z", "2032-01-02T11:00:00Z"),
+                make_event("2", "2032-01-01T10:00:00Z", "2032-01-03T12:00:00Z"),
+                make_event("1", "2032-01-02T10:00:00Z", "2032-01-02T12:00:00Z"),
+                # many events start in the range, but end after it, so
+                # the end index slice is the smaller one
+                *(make_event(f"x{idx}", "2032-01-02T10:00:00Z",
+                             "2033-01-01T00:00:00Z") for idx in range(5)),
+            ])
+
+            range_start = datetime.fromisoformat("2032-01-01T00:00:00Z")
+            range_end = datetime.fromisoformat("2032-01-04T00:00:00Z")
+            assert [e["end_time"] for e in event_storage.iter_events(
+                range_start, range_end)] == ["12:00:00", "12:00:00",
+                                             "11:00:00"]
+            assert [json.loads(e)["end_date"]
+                    for e in event_storage.iter_events_json(
+                        range_start, range_end)] == [
+                "2032-01-03", "2032-01-02", "2032-01-02"]
+
+    def test_iter_matching_events(self):
+        """Tests that events are filtered by price and title, with the same
+        result no matter which index candidates are read from, as by
+        checking every event of the time range."""
+
+        end = "2034-06-01T00:00:00Z"
+        # pylint: disable=protected-access
+        with patch.object(event_storage, "_snapshot",
+                          _Snapshot({}, [], [], 0)):
+            event_storage.set_events([
+                make_event("1", "2034-01-01T20:00:00Z", end,
+                           title="Jazz Night", min_price=10, max_price=20),
+                make_event("2", "2034-01-02T20:00:00Z", end,
+                           title="Rock Night", min_price=30, max_price=90),
+                make_event("3", "2034-01-03T20:00:00Z", end,
+                           title="jazz-club Live", min_price=50,
+                           max_price=60),
+                # out of the time range below
+                make_event("4", "2033-01-01T20:00:00Z", end,
+                           title="Jazz Night", min_price=10, max_price=20),
+                *(make_event(f"x{idx}", "2034-02-01T20:00:00Z", end,
+                             title="Comedy", min_price=100, max_price=200)
+                  for idx in range(20)),
+            ])
+            # the price of an updated event is indexed anew
+            event_storage.set_events([
+                make_event("3", "2034-01-03T20:00:00Z", end,
+                           title="jazz-club Live", min_price=55,
+                           max_price=65)])
+
+            range_start = datetime.fromisoformat("2034-01-01T00:00:00Z")
+            range_end = datetime.fromisoformat("2034-07-01T00:00:00Z")
+
+            def titles(event_filter):
+                events = list(event_storage.iter_matching_events(
+                    range_start, range_end, event_filter))
+                assert events == list(BaseStorage.iter_matching_events(
+                    event_storage, range_start, range_end, event_filter))
+                assert [json.loads(e) for e in
+                        event_storage.iter_matching_events_json(
+                            range_start, range_end, event_filter)] == events
+                return [(e["title"], e["min_price"]) for e in events]
+
+            assert titles(EventFilter(title="JAZZ")) == [
+                ("Jazz Night", 10), ("jazz-club Live", 55)]
+            assert titles(EventFilter(title="ja ni")) == [("Jazz Night", 10)]
+            assert titles(EventFilter(title="blues")) == []
+            assert titles(EventFilter(min_price=61)) == [
+                ("Rock Night", 30), ("jazz-club Live", 55),
+                *[("Comedy", 100)] * 20]
+            assert titles(EventFilter(max_price=30)) == [
+                ("Jazz Night", 10), ("Rock Night", 30)]
+            assert titles(EventFilter(min_price=60, max_price=99)) == [
+                ("Rock Night", 30), ("jazz-club Live", 55)]
+            assert titles(EventFilter(min_price=60, title="night")) == [
+                ("Rock Night", 30)]
+            assert titles(EventFilter(max_price=5)) == []
+
+        # a wide price range event, which sorts low by min price, matches
+        # a price range both filters of which are set
+        with patch.object(event_storage, "_snapshot",
+                          _Snapshot({}, [], [], 0)):
+            event_storage.set_events([
+                *(make_event(f"c{idx}", "2034-01-01T20:00:00Z", end,
+                             title="Cheap", min_price=1 + idx % 10,
+                             max_price=10) for idx in range(200)),
+                make_event("w", "2034-01-02T20:00:00Z", end, title="Wide",
+                           min_price=0.5, max_price=100),
+                *(make_event(f"m{idx}", "2034-01-03T20:00:00Z", end,
+                             title="Mid", min_price=60, max_price=70)
+                  for idx in range(3)),
+            ])
+
+            assert titles(EventFilter(min_price=50, max_price=200)) == [
+                ("Wide", 0.5), *[("Mid", 60)] * 3]
+
+    def test_get_aggregates(self):
+        """Tests that day rollups are kept up to date on write, also when
+        the event with the day min or max price changes, and that they give
+        the same aggregates as reading every event."""
+
+        first_day = datetime.fromisoformat("2035-03-01T00:00:00Z").date()
+        last_day = datetime.fromisoformat("2035-03-03T00:00:00Z").date()
+
+        def aggregates():
+            result = event_storage.get_aggregates(first_day, last_day)
+            assert result == BaseStorage.get_aggregates(
+                event_storage, first_day, last_day)
+            return [(day["date"], day["count"], day["min_price"],
+                     day["max_price"], day["avg_min_price"])
+                    for day in result]
+
+        # pylint: disable=protected-access
+        for records in (DictRecords(), CompactRecords()):
+            with patch.object(event_storage, "_records", records), \
+                    patch.object(event_storage, "_snapshot",
+                                 _Snapshot({}, [], [], 0)):
+                event_storage.set_events([
+                    make_event("1", "2035-03-01T10:00:00Z",
+                               "2035-03-01T23:00:00Z",
+                               min_price=10, max_price=20),
+                    make_event("2", "2035-03-01T12:00:00Z",
+                               "2035-03-01T23:00:00Z",
+                               min_price=30, max_price=40),
+                    make_event("3", "2035-03-03T12:00:00Z",
+                               "2035-03-03T23:00:00Z",
+                               min_price=5, max_price=50),
+                    # out of the days range
+                    make_event("4", "2035-03-04T12:00:00Z",
+                               "2035-03-04T23:00:00Z",
+                               min_price=1, max_price=2),
+                ])
+                assert aggregates() == [
+                    ("2035-03-01", 2, 10, 40, 20),
+                    ("2035-03-03", 1, 5, 50, 5),
+                ]
+
+                # the event with the day min price changes, and the only
+                # event of a day moves to another day
+                event_storage.set_events([
+                    make_event("1", "2035-03-01T10:00:00Z",
+                               "2035-03-01T23:00:00Z",
+                               min_price=15, max_price=20),
+                    make_event("3", "2035-03-02T12:00:00Z",
+                               "2035-03-02T23:00:00Z",
+                               min_price=5, max_price=50),
+                ])
+                assert aggregates() == [
+                    ("2035-03-01", 2, 15, 40, 22.5),
+                    ("2035-03-02", 1, 5, 50, 5),
+                ]
+                assert event_storage.get_aggregates(
+                    last_day, last_day) == []
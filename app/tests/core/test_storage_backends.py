@@ -0,0 +1,75 @@
+"""Tests which every storage backend passes the same way."""
+
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.core.sqlite_storage import SQLiteEventStorage
+from app.core.storage import LocalEventStorage, WriteResult
+from app.tests.events import make_event
+
+
+@pytest.fixture(params=["local", "sqlite", "columnar"])
+def storage(request, tmp_path):
+    """Returns empty storage of every backend."""
+
+    if request.param == "sqlite":
+        return SQLiteEventStorage(str(tmp_path / "events.sqlite3"),
+                                  page_size=1)
+    if request.param == "columnar":
+        columnar_storage = pytest.importorskip("app.core.columnar_storage")
+        return columnar_storage.ColumnarEventStorage()
+    return LocalEventStorage()
+
+
+def test_set_events_and_get_events(storage):
+    """Tests that storage stores events, skips unchanged ones, and returns
+    events within time range ordered by start."""
+
+    events = [
+        make_event("1", "2021-05-02T17:32:28Z", "2021-05-02T18:42:38Z"),
+        make_event("2", "2021-05-01T17:32:28Z", "2021-07-21T18:42:38Z"),
+        make_event("3", "2021-05-01T17:32:28Z", "2021-07-22T18:42:38Z"),
+    ]
+
+    with patch("uuid.uuid4") as uuid4_mock:
+        uuid4_mock.return_value = "d4d65b72-2d76-4a20-bfce-dbcdba848146"
+        assert storage.set_events(events) == WriteResult(inserted=3)
+    assert storage.version == 1
+
+    range_start = datetime.fromisoformat("2021-05-01T17:32:28Z")
+    range_end = datetime.fromisoformat("2021-07-21T18:42:38Z")
+    assert storage.get_events(range_start, range_end) == [{
+        "id": "d4d65b72-2d76-4a20-bfce-dbcdba848146",
+        "title": "Test Event 123",
+        "start_date": "2021-05-01",
+        "start_time": "17:32:28",
+        "end_date": "2021-07-21",
+        "end_time": "18:42:38",
+        "min_price": 25,
+        "max_price": 35,
+    }, {
+        "id": "d4d65b72-2d76-4a20-bfce-dbcdba848146",
+        "title": "Test Event 123",
+        "start_date": "2021-05-02",
+        "start_time": "17:32:28",
+        "end_date": "2021-05-02",
+        "end_time": "18:42:38",
+        "min_price": 25,
+        "max_price": 35,
+    }]
+
+    assert storage.set_events(events) == WriteResult(unchanged=3)
+    assert storage.version == 1
+
+    # event "1" starts later now, so it moves behind event "3"
+    events[0] = make_event("1", "2021-05-03T17:32:28.5Z",
+                           "2021-07-23T18:42:38Z", max_price=40)
+    assert storage.set_events(events) == WriteResult(updated=1, unchanged=2)
+    assert storage.version == 2
+    result = storage.get_events(
+        range_start, datetime.fromisoformat("2021-07-23T18:42:38Z"))
+    assert [(event["start_time"], event["max_price"])
+            for event in result] == [("17:32:28", 35), ("17:32:28", 35),
+                                     ("17:32:28.500000", 40)]
@@ -0,0 +1,123 @@
+"""Tests for warm-start storage."""
+
+from datetime import datetime
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.core.records import CompactRecords, DictRecords
+from app.core.snapshot import Snapshot
+from app.core.storage import WriteResult, _Snapshot
+from app.core.storage import local_event_storage
+from app.core.warm_storage import WarmStartStorage
+from app.tests.events import make_event
+
+
+RANGE_START = datetime.fromisoformat("2021-05-01T00:00:00Z")
+RANGE_END = datetime.fromisoformat("2021-08-01T00:00:00Z")
+
+
+def restarted_local_storage():
+    """Returns patch of local storage, which is empty as after restart."""
+
+    # pylint: disable=protected-access
+    return patch.object(local_event_storage, "_snapshot",
+                        _Snapshot({}, [], [], 0))
+
+
+@pytest.mark.parametrize("records", [DictRecords(), CompactRecords(True)])
+def test_events_are_served_from_snapshot_after_restart(tmp_path, records):
+    """Tests that saved events are served after restart before the first
+    write, and that they keep their UUIDs after it."""
+
+    path = str(tmp_path / "events.snapshot")
+    events = [
+        make_event("1", "2021-05-02T17:32:28Z", "2021-05-02T18:42:38Z"),
+        make_event("2", "2021-05-01T17:32:28Z", "2021-07-21T18:42:38Z"),
+    ]
+
+    with patch.object(local_event_storage, "_records", records):
+        with restarted_local_storage():
+            storage = WarmStartStorage(local_event_storage, path, 0)
+            assert storage.restored.is_set()
+            assert storage.get_events(RANGE_START, RANGE_END) == []
+            storage.set_events(events)
+            # pylint: disable=protected-access
+            storage._saving.join()
+            expected_events = storage.get_events(RANGE_START, RANGE_END)
+            storage.close()
+
+        with restarted_local_storage():
+            # decoding in background waits until events are read from the
+            # memory-mapped snapshot
+            decoding = threading.Event()
+            restore = local_event_storage.restore
+            with patch.object(local_event_storage, "restore",
+                              lambda items: (decoding.wait(),
+                                             restore(items))):
+                storage = WarmStartStorage(local_event_storage, path, 3600)
+                assert storage.get_events(RANGE_START, RANGE_END) == (
+                    expected_events)
+                assert json.loads(storage.get_events_json(
+                    RANGE_START, RANGE_END)) == expected_events
+                assert not storage.get_events(RANGE_START,
+                                              datetime.fromisoformat(
+                                                  "2021-05-02T18:00:00Z"))
+                assert not storage.restored.is_set()
+                # pylint: disable=protected-access
+                assert local_event_storage._storage == {}
+
+                decoding.set()
+                assert storage.restored.wait(5)
+            # decoded with no write
+            assert storage.get_events(RANGE_START, RANGE_END) == (
+                expected_events)
+            assert storage.version == local_event_storage.version
+
+            assert storage.set_events([events[0].copy(
+                update={"max_price": 45})]) == WriteResult(updated=1)
+            result = storage.get_events(RANGE_START, RANGE_END)
+            assert [event["id"] for event in result] == [
+                event["id"] for event in expected_events]
+            assert result[1]["max_price"] == 45
+            storage.close()
+
+
+def test_writes_are_saved_without_next_write(tmp_path):
+    """Tests that a write which came within interval of the previous save
+    is saved by the timer, and that the last writes are saved on close."""
+
+    path = str(tmp_path / "events.snapshot")
+    events = [
+        make_event(str(idx), "2021-05-02T17:32:28Z", "2021-05-02T18:42:38Z")
+        for idx in range(3)
+    ]
+
+    with restarted_local_storage():
+        storage = WarmStartStorage(local_event_storage, path, 0.1)
+        # the first change is saved right away
+        storage.set_events(events[:1])
+        # pylint: disable=protected-access
+        storage._saving.join()
+        storage.set_events(events[1:2])
+        for _ in range(50):
+            if Snapshot(path).storage_version == storage.version:
+                break
+            time.sleep(0.1)
+        assert len(Snapshot(path)) == 2
+        storage.close()
+
+    with restarted_local_storage():
+        storage = WarmStartStorage(local_event_storage, path, 3600)
+        assert storage.restored.wait(5)
+        storage.set_events(events[2:])
+        # pylint: disable=protected-access
+        storage._saving.join()
+        storage.set_events([events[0].copy(update={"max_price": 45})])
+        storage.close()
+        assert Snapshot(path).storage_version == storage.version
+        assert len(Snapshot(path)) == 3
+        assert max(Snapshot(path).max_prices) == 45
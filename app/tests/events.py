@@ -0,0 +1,24 @@
+"""Partner events for storage tests."""
+
+from __future__ import annotations
+
+from datetime import datetime
+
+from app.models import PartnerEvent
+
+
+def make_event(event_id: str | int, start: str, end: str,
+               **overrides) -> PartnerEvent:
+    """Returns event which starts at start and ends at end (ISO format),
+    with the other fields overridden by keyword."""
+
+    fields = {
+        "base_event_id": "222",
+        "title": "Test Event 123",
+        "min_price": 25,
+        "max_price": 35,
+        **overrides,
+    }
+    return PartnerEvent(id=str(event_id),
+                        start=datetime.fromisoformat(start),
+                        end=datetime.fromisoformat(end), **fields)
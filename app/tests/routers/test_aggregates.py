@@ -0,0 +1,38 @@
+"""Tests for Aggregates routers."""
+
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+@patch("fastapi.BackgroundTasks.add_task")
+@patch("app.routers.aggregates.storage")
+def test_aggregates_router(storage_mock, _):
+    """Tests that /aggregates returns per day aggregates of storage."""
+
+    day = {
+        "date": "2021-05-01",
+        "count": 3,
+        "min_price": 10.0,
+        "max_price": 50.0,
+        "avg_min_price": 15.0,
+        "avg_max_price": 35.5,
+    }
+    storage_mock.get_aggregates.return_value = [day]
+    client = TestClient(app)
+
+    response = client.get("/aggregates", params={
+        "starts_at": "2021-05-01", "ends_at": "2021-07-21"})
+
+    assert response.status_code == 200
+    assert response.json() == {"data": {"days": [day]}, "error": None}
+    args = storage_mock.get_aggregates.call_args.args
+    assert [str(arg) for arg in args] == ["2021-05-01", "2021-07-21"]
+
+    for params in ({"starts_at": "2021-05-01"},
+                   {"starts_at": "2021-07-22", "ends_at": "2021-07-21"}):
+        response = client.get("/aggregates", params=params)
+        assert response.status_code == 400
+        assert response.json()["data"] is None
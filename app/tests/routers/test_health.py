@@ -0,0 +1,25 @@
+"""Tests for health routers."""
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+@patch("app.routers.health.refresh_scheduler")
+def test_health_router(refresh_scheduler_mock):
+    """Tests that /health handler reports last successful refresh time."""
+
+    refresh_scheduler_mock.last_refreshed_at = datetime(
+        2021, 5, 1, 17, 32, 28, tzinfo=timezone.utc)
+    refresh_scheduler_mock.is_refreshing = False
+
+    response = TestClient(app).get("/health")
+
+    assert response.status_code == 200
+    assert response.json()["last_refreshed_at"] == (
+        "2021-05-01T17:32:28+00:00")
+    assert response.json()["seconds_since_refresh"] > 0
+    assert response.json()["refreshing"] is False
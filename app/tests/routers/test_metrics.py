@@ -0,0 +1,28 @@
+"""Tests for metrics routers."""
+
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core import metrics
+from app.main import app
+
+
+@patch("fastapi.BackgroundTasks.add_task")
+@patch("app.routers.search.storage")
+def test_metrics_router(storage_mock, _):
+    """Tests that /metrics reports /search latency in Prometheus format."""
+
+    storage_mock.get_events_json.return_value = b"[]"
+    client = TestClient(app)
+    searches = metrics.SEARCH_SECONDS.count
+
+    client.get("/search", params={"starts_at": "2021-05-01T17:32:28Z",
+                                  "ends_at": "2021-07-21T17:32:28Z"})
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (f"fever_search_seconds_count {searches + 1}\n"
+            in response.text)
+    assert "# TYPE fever_events_stored_total counter\n" in response.text
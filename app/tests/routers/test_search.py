@@ -1,19 +1,28 @@
 """Tests for Search Events routers."""
 
-from datetime import datetime
-from unittest.mock import patch
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from unittest.mock import Mock, patch
 
 from fastapi.testclient import TestClient
+import httpx
 
 from app.main import app
 from app.controllers.search import PartnerEventsController
+from app.core import encoders
+from app.core import parsers
+from app.core import settings
+from app.core.profiling import SamplingProfiler
+from app.core.scheduler import refresh_scheduler
+from app.core.storage import EventFilter, WriteResult
+from app.tests.stub_provider import StubProvider, make_feed
 
 
 @patch("fastapi.BackgroundTasks.add_task")
 @patch("app.routers.search.storage")
-@patch.object(PartnerEventsController, "handle_new_events_request")
-def test_search_events_router(
-        handle_new_events_request_mock, storage_mock, add_task_mock):
+def test_search_events_router(storage_mock, add_task_mock):
     """Tests that /search handler returns correct response."""
 
     params = {
@@ -21,17 +30,13 @@ def test_search_events_router(
         "ends_at": "2021-07-21T17:32:28Z"
     }
     client = TestClient(app)
-    starts_at = datetime.fromisoformat(params["starts_at"])
-    ends_at = datetime.fromisoformat(params["ends_at"])
 
-    storage_mock.get_events.return_value = []
+    storage_mock.get_events_json.return_value = b"[]"
 
     response = client.get("/search", params=params)
 
     add_task_mock.assert_called_once_with(
-        handle_new_events_request_mock,
-        starts_at, ends_at, storage_mock
-    )
+        refresh_scheduler.refresh, max_age=settings.REFRESH_INTERVAL)
 
     assert response.status_code == 200
 
@@ -41,3 +46,231 @@ def test_search_events_router(
         },
         "error": None,
     }
+
+
+@patch("app.routers.search.refresh_scheduler")
+@patch("app.routers.search.storage")
+def test_search_events_served_while_parsing(storage_mock, _):
+    """Tests that /search is served while a partner response is parsed in
+    background by worker pool."""
+
+    storage_mock.get_events_json.return_value = b"[]"
+    params = {
+        "starts_at": "2021-05-01T17:32:28Z",
+        "ends_at": "2021-07-21T17:32:28Z"
+    }
+    provider = StubProvider(make_feed(5000))
+    refreshed_storage = Mock()
+    refreshed_storage.set_events.return_value = WriteResult()
+    # worker process does not parse until it is released
+    released = multiprocessing.Event()
+
+    async def main():
+        with ProcessPoolExecutor(max_workers=1,
+                                 initializer=released.wait) as executor:
+            try:
+                submit = Mock(wraps=executor.submit)
+                executor.submit = submit
+                controller = PartnerEventsController(provider.client(),
+                                                     executor)
+                refresh = asyncio.create_task(
+                    controller.handle_new_events_request(refreshed_storage))
+                while not submit.called:
+                    # refresh would be done without worker pool
+                    assert not refresh.done()
+                    await asyncio.sleep(0.001)
+
+                async with httpx.AsyncClient(
+                        transport=httpx.ASGITransport(app),
+                        base_url="http://test") as client:
+                    response = await client.get("/search", params=params)
+                assert response.status_code == 200
+                assert not refresh.done()
+            finally:
+                released.set()
+            assert await refresh
+            return submit.call_args.args[0]
+
+    parse = asyncio.run(main())
+    assert parse is parsers.parse_compact_events_from_xml
+    assert len(refreshed_storage.set_events.call_args.args[0]) == 5000
+
+
+@patch("fastapi.BackgroundTasks.add_task")
+@patch("app.routers.search.storage")
+def test_search_events_router__cached_response(storage_mock, _):
+    """Tests that /search response is cached until storage write."""
+
+    params = {
+        "starts_at": "2021-05-01T17:32:28Z",
+        "ends_at": "2021-07-21T17:32:28Z"
+    }
+    event = {
+        "id": "d4d65b72-2d76-4a20-bfce-dbcdba848146",
+        "title": "Test Event 123",
+        "start_date": "2021-05-01",
+        "start_time": "17:32:28",
+        "end_date": "2021-07-21",
+        "end_time": "18:42:38",
+        "min_price": 25.0,
+        "max_price": 35.0,
+    }
+    client = TestClient(app)
+    storage_mock.version = 1
+    storage_mock.get_events_json.return_value = encoders.dumps([event])
+
+    for _ in range(3):
+        response = client.get("/search", params=params)
+        assert response.json() == {
+            "data": {
+                "events": [event],
+            },
+            "error": None,
+        }
+    storage_mock.get_events_json.assert_called_once()
+
+    storage_mock.version = 2
+    storage_mock.get_events_json.return_value = b"[]"
+    response = client.get("/search", params=params)
+
+    assert response.json()["data"]["events"] == []
+    assert storage_mock.get_events_json.call_count == 2
+
+
+def make_events(count: int) -> list:
+    return [{
+        "id": "d4d65b72-2d76-4a20-bfce-dbcdba848146",
+        "title": f"Test Event {idx}",
+        "start_date": "2021-05-01",
+        "start_time": "17:32:28",
+        "end_date": "2021-07-21",
+        "end_time": "18:42:38",
+        "min_price": 25.0,
+        "max_price": 35.0,
+    } for idx in range(count)]
+
+
+@patch("fastapi.BackgroundTasks.add_task")
+@patch("app.routers.search.storage")
+def test_search_events_router__pages(storage_mock, _):
+    """Tests that /search returns pages of events, with link to the next
+    page while there is one."""
+
+    events = make_events(5)
+    storage_mock.version = 1
+    storage_mock.iter_events_json.side_effect = lambda *_: (
+        encoders.dumps(event) for event in events)
+    client = TestClient(app)
+    params = {
+        "starts_at": "2021-05-01T17:32:28Z",
+        "ends_at": "2021-07-21T17:32:28Z",
+        "limit": 2,
+    }
+
+    pages = []
+    url = "/search"
+    while url:
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        pages.append(response.json()["data"]["events"])
+        url = response.links.get("next", {}).get("url")
+        params = None
+
+    assert pages == [events[:2], events[2:4], events[4:]]
+
+    response = client.get("/search", params={
+        "starts_at": "2021-05-01T17:32:28Z",
+        "ends_at": "2021-07-21T17:32:28Z",
+        "limit": 0,
+    })
+    assert response.status_code == 400
+
+
+@patch("fastapi.BackgroundTasks.add_task")
+@patch("app.routers.search.storage")
+def test_search_events_router__stream(storage_mock, _):
+    """Tests that /search streams events as NDJSON."""
+
+    events = make_events(1200)
+    storage_mock.iter_events_json.side_effect = lambda *_: (
+        encoders.dumps(event) for event in events)
+    client = TestClient(app)
+    params = {
+        "starts_at": "2021-05-01T17:32:28Z",
+        "ends_at": "2021-07-21T17:32:28Z",
+        "stream": True,
+    }
+
+    with client.stream("GET", "/search", params=params) as response:
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = list(response.iter_lines())
+
+    assert [json.loads(line) for line in lines] == events
+
+    response = client.get("/search", params={**params, "offset": 1199})
+    assert [json.loads(line) for line in response.iter_lines()] == events[
+        1199:]
+
+
+@patch("fastapi.BackgroundTasks.add_task")
+@patch("app.routers.search.storage")
+def test_search_events_router__filters(storage_mock, _):
+    """Tests that /search passes price and title filters to storage, and
+    that filtered responses are cached apart from unfiltered ones."""
+
+    events = make_events(3)
+    storage_mock.version = 1
+    storage_mock.get_events_json.return_value = encoders.dumps(events)
+    storage_mock.iter_matching_events_json.side_effect = lambda *_: (
+        encoders.dumps(event) for event in events[1:])
+    client = TestClient(app)
+    params = {
+        "starts_at": "2021-05-01T17:32:28Z",
+        "ends_at": "2021-07-21T17:32:28Z",
+    }
+
+    response = client.get("/search", params={
+        **params, "min_price": 20, "title": "test ev"})
+    assert response.json()["data"]["events"] == events[1:]
+    args = storage_mock.iter_matching_events_json.call_args.args
+    assert args[2] == EventFilter(min_price=20, title="test ev")
+
+    response = client.get("/search", params=params)
+    assert response.json()["data"]["events"] == events
+
+    response = client.get("/search", params={
+        **params, "max_price": 40, "stream": True})
+    assert [json.loads(line) for line in response.iter_lines()] == events[1:]
+    args = storage_mock.iter_matching_events_json.call_args.args
+    assert args[2] == EventFilter(max_price=40)
+
+    for invalid_params in ({"min_price": -1}, {"title": ""}):
+        response = client.get("/search", params={**params, **invalid_params})
+        assert response.status_code == 400
+
+
+@patch("fastapi.BackgroundTasks.add_task")
+@patch("app.routers.search.storage")
+def test_search_events_router__profiled(storage_mock, _, tmp_path):
+    """Tests that /search request with profile header is profiled, and its
+    response has the profile summary and saved profile name."""
+
+    storage_mock.get_events_json.return_value = b"[]"
+    params = {
+        "starts_at": "2021-05-01T17:32:28Z",
+        "ends_at": "2021-07-21T17:32:28Z"
+    }
+    client = TestClient(app)
+
+    with patch("app.routers.search.profiler",
+               SamplingProfiler(0, "secret", str(tmp_path))):
+        response = client.get("/search", params=params,
+                              headers={"X-Profile": "secret"})
+        assert response.status_code == 200
+        assert "desc=" in response.headers["Server-Timing"]
+        assert (tmp_path / response.headers["X-Profile"]).exists()
+
+        response = client.get("/search", params=params,
+                              headers={"X-Profile": "wrong"})
+        assert "Server-Timing" not in response.headers
+        assert len(list(tmp_path.iterdir())) == 1
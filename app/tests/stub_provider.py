@@ -0,0 +1,203 @@
+"""Local stub of the partner events API, for tests and benchmarks."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import threading
+from typing import Callable, Iterable, Mapping
+
+import httpx
+
+
+FEED_START = datetime(2021, 6, 1, 20, 0, 0)
+
+
+def make_event_xml(idx: int, sell_mode: str = "online",
+                   start: datetime = FEED_START, price_shift: int = 0) -> str:
+    """Returns base_event xml element with one event and two zones.
+    Prices are raised by price_shift."""
+
+    event_start = start + timedelta(days=idx % 1000, minutes=idx // 1000)
+    event_end = event_start + timedelta(hours=2)
+    return (
+        f'<base_event base_event_id="{idx}" sell_mode="{sell_mode}" '
+        f'organizer_company_id="1" title="Event {idx}">'
+        f'<event event_start_date="{event_start.isoformat()}" '
+        f'event_end_date="{event_end.isoformat()}" event_id="{idx}" '
+        f'sell_from="2021-01-01T00:00:00" '
+        f'sell_to="{event_start.isoformat()}" sold_out="false">'
+        f'<zone zone_id="1" capacity="10" price="{10 + idx % 50 + price_shift}.00" '
+        f'name="Amfiteatre" numbered="true"/>'
+        f'<zone zone_id="2" capacity="0" price="{20 + idx % 50 + price_shift}.00" '
+        f'name="Amfiteatre" numbered="false"/>'
+        f'</event></base_event>')
+
+
+def make_feed(size: int) -> bytes:
+    """Returns partner API xml document with `size` base events."""
+
+    return b"".join(iter_feed_chunks(size))
+
+
+def iter_feed_chunks(size: int, events_per_chunk: int = 1000,
+                     price_shifts: Mapping[int, int] | None = None):
+    """Yields partner API xml document with `size` base events in chunks,
+    so that huge documents do not have to be built in memory at once.
+    price_shifts maps event index to its price shift."""
+
+    price_shifts = price_shifts or {}
+    yield (b'<eventList version="1.0"><output>')
+    for chunk_start in range(0, size, events_per_chunk):
+        chunk_end = min(chunk_start + events_per_chunk, size)
+        yield "".join(
+            make_event_xml(idx, price_shift=price_shifts.get(idx, 0))
+            for idx in range(chunk_start, chunk_end)
+        ).encode()
+    yield b'</output></eventList>'
+
+
+class ChangingFeed:
+    """Synthetic partner feed of `size` base events, which changes between
+    revisions: every next_content() call changes prices of change_rate
+    fraction of events, chosen at random (with fixed seed)."""
+
+    def __init__(self, size: int, change_rate: float = 0.0, seed: int = 0):
+        self.size = size
+        self.change_rate = change_rate
+        self.revision = 0
+        self._random = random.Random(seed)
+        self._price_shifts: dict[int, int] = {}
+
+    def next_content(self) -> bytes:
+        """Returns the next revision of the feed document."""
+
+        if self.revision:
+            changed = round(self.size * self.change_rate)
+            for idx in self._random.sample(range(self.size), changed):
+                self._price_shifts[idx] = self.revision
+        self.revision += 1
+        return b"".join(iter_feed_chunks(
+            self.size, price_shifts=self._price_shifts))
+
+
+class StubProvider:
+    """Partner events API stub, to be used as httpx.MockTransport handler.
+
+    Serves given xml content with ETag and answers conditional requests
+    with 304 Not Modified while the content did not change.
+    """
+
+    def __init__(self, content: bytes):
+        self.requests: list[httpx.Request] = []
+        self.content = content
+
+    @property
+    def content(self) -> bytes:
+        return self._content
+
+    @content.setter
+    def content(self, value: bytes):
+        self._content = value
+        self.etag = f'"{hash(value):x}"'
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304, headers={"ETag": self.etag})
+        return httpx.Response(200, content=self.content,
+                              headers={"ETag": self.etag})
+
+    def client(self) -> httpx.AsyncClient:
+        """Returns async client, which sends all requests to this stub."""
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(self))
+
+
+class FaultInjector:
+    """Async httpx.MockTransport handler, which fails requests to the
+    wrapped handler (e.g. StubProvider) as scripted.
+
+    Every request takes the next fault of faults: an exception (e.g.
+    httpx.ConnectError) is raised, a status code is responded with, and a
+    float delays the request by that many seconds. None, and running out
+    of faults, pass the request to the handler.
+    """
+
+    def __init__(self, handler: Callable[[httpx.Request], httpx.Response],
+                 faults: Iterable = ()):
+        self.handler = handler
+        self.faults = list(faults)
+        self.calls = 0
+        # requests being handled at the moment, and the max of it
+        self.in_flight = self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        fault = self.faults.pop(0) if self.faults else None
+        if isinstance(fault, Exception):
+            raise fault
+        if isinstance(fault, int):
+            return httpx.Response(fault)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if isinstance(fault, float):
+                await asyncio.sleep(fault)
+            return self.handler(request)
+        finally:
+            self.in_flight -= 1
+
+    def client(self) -> httpx.AsyncClient:
+        """Returns async client, which sends all requests to this stub."""
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(self))
+
+
+class StubProviderServer:
+    """Serves partner events API stub over real HTTP on a local port, from
+    a background thread, e.g. for the app running in another process.
+
+    handler is called for every request, the same way as by
+    httpx.MockTransport, so StubProvider can be served as is.
+    """
+
+    def __init__(self, handler: Callable[[httpx.Request], httpx.Response],
+                 host: str = "127.0.0.1", port: int = 0):
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            # pylint: disable=invalid-name
+            def do_GET(self):
+                response = handler(httpx.Request(
+                    "GET", f"http://{host}{self.path}",
+                    headers=dict(self.headers)))
+                self.send_response(response.status_code)
+                for name, value in response.headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(response.content)
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), RequestHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/events"
+
+    def __enter__(self) -> StubProviderServer:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
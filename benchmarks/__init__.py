@@ -0,0 +1,4 @@
+"""Performance benchmarks. Not a part of the app and not collected by pytest.
+
+Run from the repo root, e.g.: `python -m benchmarks.storage_index`.
+"""
@@ -0,0 +1,56 @@
+"""Compares per day aggregates of LocalEventStorage, read from the rollups
+kept up to date on write, with aggregating every event of the range, and
+measures the cost of keeping the rollups on a batch of updates.
+
+Usage: python -m benchmarks.aggregates [SIZE ...]
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import sys
+import timeit
+
+from app.core.storage import BaseStorage, LocalEventStorage
+from benchmarks.storage_index import EPOCH
+from benchmarks.storage_memory import iter_event_batches
+
+
+DEFAULT_SIZES = (100_000, 1_000_000)
+UPDATES = 1000
+
+
+def run(size: int):
+    storage = LocalEventStorage(compact_records=True)
+    for batch in iter_event_batches(size):
+        storage.set_events(batch)
+    # events start every minute, so all of them start within the range
+    start_day = EPOCH.date()
+    end_day = (EPOCH + timedelta(minutes=size)).date()
+
+    def rollups():
+        return storage.get_aggregates(start_day, end_day)
+
+    def scan():
+        return BaseStorage.get_aggregates(storage, start_day, end_day)
+
+    assert rollups() == scan()
+    rollups_seconds = min(timeit.repeat(rollups, number=1, repeat=3))
+    scan_seconds = min(timeit.repeat(scan, number=1, repeat=3))
+    print(f"{size:>10,} events | {len(rollups()):>5} days | rollups "
+          f"{rollups_seconds * 1000:9.2f} ms | every event "
+          f"{scan_seconds * 1000:9.2f} ms | "
+          f"x{scan_seconds / rollups_seconds:8.1f}")
+
+    # every update changes prices, so rollups of the days are updated
+    updates = [event.copy(update={"min_price": event.min_price + 1})
+               for event in next(iter_event_batches(UPDATES, UPDATES))]
+    started_at = timeit.default_timer()
+    storage.set_events(updates)
+    print(f"{size:>10,} events | set_events of {UPDATES:,} updated events "
+          f"in {(timeit.default_timer() - started_at) * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    for n in [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES:
+        run(n)
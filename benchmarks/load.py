@@ -0,0 +1,265 @@
+"""Load test of the app over real HTTP, against a local partner API stub.
+
+Starts partner API stub (see app/tests/stub_provider.py), which serves a
+synthetic feed of --events events, --change-rate fraction of which change
+on every fetch, and the app (uvicorn, in a subprocess) refreshing events
+from the stub every --refresh-interval seconds. Once the first refresh is
+done, --concurrency clients send /search requests for random windows for
+--duration seconds.
+
+Reports /search requests per second and latency percentiles, refresh
+stage times and throughput (read from /metrics) and app memory (from
+/proc, so on Linux only). Results are printed and, with --output, saved as
+JSON together with the git commit, to compare them across commits.
+
+App settings can be given through environment as usual, e.g.:
+
+    STORAGE_BACKEND=columnar python -m benchmarks.load --events 100000
+
+Usage: python -m benchmarks.load [--help]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import platform
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+from app.tests.stub_provider import (FEED_START, ChangingFeed, StubProvider,
+                                     StubProviderServer)
+
+
+# Feed events start within this many days from FEED_START
+# (see make_event_xml).
+FEED_DAYS = 1000
+STARTUP_TIMEOUT = 600
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> str | None:
+    completed = subprocess.run(["git", "rev-parse", "HEAD"],
+                               capture_output=True, text=True, check=False)
+    return completed.stdout.strip() or None
+
+
+def memory_mb(pid: int) -> dict:
+    """Returns current and peak RSS of the process."""
+
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as status:
+            fields = dict(line.split(":", 1) for line in status)
+    except OSError:
+        return {"rss": None, "peak_rss": None}
+    return {"rss": int(fields["VmRSS"].split()[0]) / 1024,
+            "peak_rss": int(fields["VmHWM"].split()[0]) / 1024}
+
+
+def parse_metrics(text: str) -> dict:
+    """Returns samples of Prometheus text format as {name{labels}: value}.
+    """
+
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def percentiles_ms(latencies: list) -> dict:
+    if len(latencies) < 2:
+        return {}
+    cuts = statistics.quantiles(latencies, n=100)
+    return {
+        "mean": statistics.fmean(latencies) * 1000,
+        "p50": cuts[49] * 1000,
+        "p90": cuts[89] * 1000,
+        "p99": cuts[98] * 1000,
+        "max": max(latencies) * 1000,
+    }
+
+
+def wait_for_first_refresh(app_url: str, app_process: subprocess.Popen):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if app_process.poll() is not None:
+            raise RuntimeError("App exited before the first refresh")
+        try:
+            health = httpx.get(f"{app_url}/health").json()
+            if health["last_refreshed_at"] is not None:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError("No refresh within startup timeout")
+
+
+async def search_load(app_url: str, concurrency: int, duration: float,
+                      window: timedelta) -> dict:
+    """Sends /search requests from concurrency clients for duration
+    seconds. Returns requests count, errors and latencies."""
+
+    rnd = random.Random(0)
+    spread = timedelta(days=FEED_DAYS) - window
+    latencies = []
+    errors = 0
+
+    async def client_loop(client: httpx.AsyncClient, deadline: float):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            starts_at = (FEED_START + timedelta(
+                seconds=rnd.randrange(int(spread.total_seconds())))
+            ).replace(tzinfo=timezone.utc)
+            params = {"starts_at": starts_at.isoformat(),
+                      "ends_at": (starts_at + window).isoformat()}
+            started_at = time.perf_counter()
+            try:
+                response = await client.get("/search", params=params)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started_at)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits,
+                                 timeout=60) as client:
+        started_at = time.perf_counter()
+        deadline = started_at + duration
+        await asyncio.gather(*(client_loop(client, deadline)
+                               for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started_at
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "latency_ms": percentiles_ms(latencies),
+    }
+
+
+def refresh_stats(samples: dict, first_refresh_seconds: float,
+                  feed: ChangingFeed) -> dict:
+    def mean(histogram: str) -> float | None:
+        count = samples.get(f"{histogram}_count")
+        return samples[f"{histogram}_sum"] / count if count else None
+
+    busy_seconds = sum(samples.get(f"{histogram}_sum", 0) for histogram in (
+        "fever_provider_fetch_seconds", "fever_parse_seconds",
+        "fever_storage_apply_seconds"))
+    events_parsed = samples.get("fever_events_parsed_total", 0)
+    return {
+        "first_refresh_seconds": first_refresh_seconds,
+        "feed_revisions": feed.revision,
+        "refreshes": samples.get("fever_storage_apply_seconds_count", 0),
+        "fetch_seconds_mean": mean("fever_provider_fetch_seconds"),
+        "parse_seconds_mean": mean("fever_parse_seconds"),
+        "storage_apply_seconds_mean": mean("fever_storage_apply_seconds"),
+        "events_parsed": events_parsed,
+        "events_per_second": (events_parsed / busy_seconds
+                              if busy_seconds else None),
+        "events_stored": {
+            match.group(1): value for name, value in samples.items()
+            if (match := re.fullmatch(
+                r'fever_events_stored_total\{result="(\w+)"\}', name))
+        },
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    feed = ChangingFeed(args.events, args.change_rate)
+    provider = StubProvider(feed.next_content())
+    feed_lock = threading.Lock()
+
+    def next_revision():
+        with feed_lock:
+            provider.content = feed.next_content()
+
+    def serve_feed(request: httpx.Request) -> httpx.Response:
+        with feed_lock:
+            response = provider(request)
+        # the next revision is built in background, so that fetch time
+        # does not include it
+        threading.Thread(target=next_revision).start()
+        return response
+
+    app_port = free_port()
+    app_url = f"http://127.0.0.1:{app_port}"
+    with StubProviderServer(serve_feed) as stub_server:
+        env = {**os.environ,
+               "EVENT_PROVIDER_URL": stub_server.url,
+               "REFRESH_INTERVAL": str(args.refresh_interval)}
+        started_at = time.perf_counter()
+        # pylint: disable=consider-using-with
+        app_process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", "127.0.0.1", "--port", str(app_port),
+             "--log-level", "warning"], env=env)
+        try:
+            wait_for_first_refresh(app_url, app_process)
+            first_refresh_seconds = time.perf_counter() - started_at
+
+            search = asyncio.run(search_load(
+                app_url, args.concurrency, args.duration,
+                timedelta(days=args.window_days)))
+            samples = parse_metrics(httpx.get(f"{app_url}/metrics").text)
+            memory = memory_mb(app_process.pid)
+        finally:
+            app_process.terminate()
+            app_process.wait()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "params": {**vars(args), "output": None},
+        "search": search,
+        "refresh": refresh_stats(samples, first_refresh_seconds, feed),
+        "memory_mb": memory,
+    }
+
+
+def parse_args(argv: list | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--events", type=int, default=100_000,
+                        help="partner feed size (base events)")
+    parser.add_argument("--change-rate", type=float, default=0.01,
+                        help="fraction of events changed on every fetch")
+    parser.add_argument("--refresh-interval", type=float, default=5,
+                        help="app refresh interval, seconds")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="concurrent /search clients")
+    parser.add_argument("--duration", type=float, default=30,
+                        help="/search load duration, seconds")
+    parser.add_argument("--window-days", type=float, default=7,
+                        help="/search time window, days")
+    parser.add_argument("--output", help="JSON file to save results to")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    results = run(arguments)
+    print(json.dumps(results, indent=2))
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
@@ -0,0 +1,62 @@
+"""Compares /search requests per second with the response cache on and
+off, for a handful of repeated query windows over stored events.
+
+Requests are sent in-process through ASGI transport, so numbers reflect
+the app cost only, without network and HTTP server overhead.
+
+Usage: python -m benchmarks.search_cache [SIZE] [REQUESTS]
+"""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+import sys
+import time
+from unittest.mock import patch
+
+import httpx
+
+from app.core.cache import VersionedLRUCache
+from app.core.scheduler import refresh_scheduler
+from app.core.storage import LocalEventStorage
+from app.main import app
+from benchmarks.storage_index import EPOCH, WINDOW, make_storage_engine
+
+
+WINDOWS_COUNT = 5
+
+
+async def measure_rps(requests: int) -> float:
+    windows = [
+        {"starts_at": (EPOCH + idx * WINDOW).isoformat(),
+         "ends_at": (EPOCH + (idx + 1) * WINDOW).isoformat()}
+        for idx in range(WINDOWS_COUNT)
+    ]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app),
+                                 base_url="http://bench") as client:
+        started_at = time.perf_counter()
+        for idx in range(requests):
+            response = await client.get(
+                "/search", params=windows[idx % WINDOWS_COUNT])
+            response.raise_for_status()
+        return requests / (time.perf_counter() - started_at)
+
+
+def run(size: int, requests: int):
+    LocalEventStorage(make_storage_engine(size))
+    # do not let /search trigger partner events refresh
+    refresh_scheduler.last_refreshed_at = (
+        datetime.now(timezone.utc) + timedelta(days=1))
+
+    for cache_size in (0, 256):
+        cache = VersionedLRUCache(cache_size)
+        with patch("app.routers.search.search_response_cache", cache):
+            rps = asyncio.run(measure_rps(requests))
+        print(f"{size:>10,} events | cache {'on ' if cache_size else 'off'} "
+              f"| {rps:8,.0f} requests/s | {cache.stats()}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(*(args + [100_000, 500][len(args):]))
@@ -0,0 +1,73 @@
+"""Compares get_events latency of ColumnarEventStorage (NumPy) with
+LocalEventStorage, and the part of it spent on range filtering alone,
+on the same set of stored events.
+
+Usage: python -m benchmarks.storage_columnar [SIZE]
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import random
+import statistics
+import sys
+import time
+
+from app.core.columnar_storage import ColumnarEventStorage
+from app.core.storage import LocalEventStorage
+from benchmarks.storage_index import EPOCH
+from benchmarks.storage_memory import iter_event_batches
+
+
+DEFAULT_SIZE = 1_000_000
+WINDOWS = (timedelta(hours=3), timedelta(days=1), timedelta(days=7))
+BATCH_SIZE = 100_000
+REPEAT = 20
+
+
+def measure(read, size: int, window: timedelta) -> tuple:
+    """Returns median latency (ms) of read(start, end) and its length."""
+
+    rnd = random.Random(0)
+    # events start every minute; windows wider than all of them start at
+    # EPOCH
+    spread = max(timedelta(minutes=size) - window, timedelta(seconds=1))
+    latencies = []
+    for _ in range(REPEAT):
+        start = EPOCH + timedelta(
+            seconds=rnd.randrange(int(spread.total_seconds())))
+        started_at = time.perf_counter()
+        count = len(read(start, start + window))
+        latencies.append(time.perf_counter() - started_at)
+    return statistics.median(latencies) * 1000, count
+
+
+def run(size: int):
+    local = LocalEventStorage(compact_records=True)
+    columnar = ColumnarEventStorage()
+    for name, storage in (("local", local), ("columnar", columnar)):
+        started_at = time.perf_counter()
+        for batch in iter_event_batches(size, BATCH_SIZE):
+            storage.set_events(batch)
+        print(f"{size:>10,} events | {name:<8} | filled in "
+              f"{time.perf_counter() - started_at:6.1f} s")
+
+    # pylint: disable=protected-access
+    readers = {
+        "local": local.get_events,
+        "local filter": lambda start, end: list(
+            local._iter_events(start, end)),
+        "columnar": columnar.get_events,
+        "columnar filter": lambda start, end: columnar._range_rows(
+            columnar._columns, start, end),
+    }
+    for window in WINDOWS:
+        for name, read in readers.items():
+            latency, count = measure(read, size, window)
+            print(f"{size:>10,} events | {name:<15} | {str(window):>15} "
+                  f"window ({count:>6,} events) "
+                  f"| median {latency:8.3f} ms")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if sys.argv[1:] else DEFAULT_SIZE)
@@ -0,0 +1,55 @@
+"""Compares LocalEventStorage.iter_matching_events, which reads candidates
+from the most selective of time range, price and title indexes, with the
+check of every event of the time range it is planned against.
+
+Usage: python -m benchmarks.storage_filters [SIZE ...]
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import sys
+import timeit
+
+from app.core.storage import BaseStorage, EventFilter, LocalEventStorage
+from benchmarks.storage_index import EPOCH
+from benchmarks.storage_memory import iter_event_batches
+
+
+DEFAULT_SIZES = (100_000, 1_000_000)
+FILTERS = {
+    "title (one base event)": EventFilter(title="base event 1234"),
+    "title (word prefix)": EventFilter(title="event 12"),
+    "min_price (~15%)": EventFilter(min_price=95),
+    "price range (~30%)": EventFilter(min_price=40, max_price=50),
+}
+
+
+def run(size: int):
+    storage = LocalEventStorage(compact_records=True)
+    for batch in iter_event_batches(size):
+        storage.set_events(batch)
+    # every stored event starts within the range
+    start_from, ends_to = EPOCH, EPOCH + timedelta(minutes=size + 180)
+
+    for name, event_filter in FILTERS.items():
+        def indexed(event_filter=event_filter):
+            return sum(1 for _ in storage.iter_matching_events(
+                start_from, ends_to, event_filter))
+
+        def scan(event_filter=event_filter):
+            return sum(1 for _ in BaseStorage.iter_matching_events(
+                storage, start_from, ends_to, event_filter))
+
+        assert indexed() == scan()
+        indexed_seconds = min(timeit.repeat(indexed, number=1, repeat=3))
+        scan_seconds = min(timeit.repeat(scan, number=1, repeat=3))
+        print(f"{size:>10,} events | {name:<24} | {indexed():>8,} found | "
+              f"indexed {indexed_seconds * 1000:9.2f} ms | "
+              f"range scan {scan_seconds * 1000:9.2f} ms | "
+              f"x{scan_seconds / indexed_seconds:7.1f}")
+
+
+if __name__ == "__main__":
+    for n in [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES:
+        run(n)
@@ -0,0 +1,90 @@
+"""Compares indexed LocalEventStorage.get_events range lookups
+with the full scan over all stored events it replaced.
+
+Usage: python -m benchmarks.storage_index [SIZE ...]
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+import random
+import sys
+import timeit
+import uuid
+
+from app.core.storage import LocalEventStorage
+
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+# Events are spread over ~3 years, query windows are one week wide.
+SPREAD = timedelta(days=3 * 365)
+WINDOW = timedelta(days=7)
+
+
+def make_storage_engine(size: int) -> dict:
+    """Returns storage dict of `size` synthetic events in random order."""
+
+    rnd = random.Random(size)
+    engine = {}
+    for idx in range(size):
+        start = EPOCH + timedelta(seconds=rnd.randrange(
+            int(SPREAD.total_seconds())))
+        end = start + timedelta(hours=rnd.randint(1, 48))
+        engine[("1", str(idx))] = {
+            "id": str(uuid.uuid4()),
+            "title": f"Event {idx}",
+            "start_date": str(start.date()),
+            "start_time": str(start.time()),
+            "end_date": str(end.date()),
+            "end_time": str(end.time()),
+            "min_price": 10.0,
+            "max_price": 20.0,
+            "start": start,
+            "end": end,
+        }
+    return engine
+
+
+def full_scan(storage: LocalEventStorage, start_from: datetime,
+              ends_to: datetime) -> list:
+    """Previous get_events implementation: scan of every stored event."""
+
+    result = []
+    # pylint: disable=protected-access
+    for event in storage._storage.values():
+        if start_from <= event["start"] and event["end"] <= ends_to:
+            result.append({
+                k: v for (k, v) in event.items() if k not in {
+                    "start", "end"}
+            })
+    return result
+
+
+def run(size: int, repeat: int = 20):
+    storage = LocalEventStorage(make_storage_engine(size))
+    rnd = random.Random(0)
+    windows = []
+    for _ in range(repeat):
+        start = EPOCH + timedelta(seconds=rnd.randrange(
+            int((SPREAD - WINDOW).total_seconds())))
+        windows.append((start, start + WINDOW))
+
+    by_id = lambda e: e["id"]  # noqa: E731
+    assert all(sorted(storage.get_events(*w), key=by_id)
+               == sorted(full_scan(storage, *w), key=by_id)
+               for w in windows[:3])
+
+    scan = timeit.timeit(
+        lambda: [full_scan(storage, *w) for w in windows], number=1)
+    index = timeit.timeit(
+        lambda: [storage.get_events(*w) for w in windows], number=1)
+
+    print(f"{size:>10,} events | scan {scan / repeat * 1000:10.3f} ms "
+          f"| index {index / repeat * 1000:8.3f} ms "
+          f"| x{scan / index:,.0f}")
+
+
+if __name__ == "__main__":
+    for n in [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES:
+        run(n)
@@ -0,0 +1,65 @@
+"""Compares memory retained by LocalEventStorage with dict records and
+with compact records (indexes included), and the cost of reading events
+back from both.
+
+Usage: python -m benchmarks.storage_memory [SIZE ...]
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import gc
+import sys
+import timeit
+import tracemalloc
+
+from app.core.storage import LocalEventStorage
+from app.models import PartnerEvent
+from benchmarks.storage_index import EPOCH, WINDOW
+
+
+DEFAULT_SIZES = (100_000, 1_000_000)
+BATCH_SIZE = 10_000
+
+
+def iter_event_batches(size: int, batch_size: int = BATCH_SIZE):
+    """Yields batches of synthetic events, starting every minute: ~50
+    events per base event, i.e. the same title for every 50 events."""
+
+    for batch_start in range(0, size, batch_size):
+        batch = []
+        for idx in range(batch_start, min(batch_start + batch_size, size)):
+            start = EPOCH + timedelta(minutes=idx)
+            batch.append(PartnerEvent.construct(
+                id=str(idx), base_event_id=str(idx // 50),
+                title=f"Base event {idx // 50}", start=start,
+                end=start + timedelta(hours=2),
+                min_price=float(idx % 100), max_price=float(idx % 100 + 10)))
+        yield batch
+
+
+def run(size: int):
+    for compact_records in (False, True):
+        gc.collect()
+        tracemalloc.start()
+        storage = LocalEventStorage(compact_records=compact_records)
+        for batch in iter_event_batches(size):
+            storage.set_events(batch)
+        del batch
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        read = timeit.timeit(
+            lambda: storage.get_events(EPOCH, EPOCH + WINDOW), number=5) / 5
+        print(f"{size:>10,} events "
+              f"| {'compact' if compact_records else 'dict':<7} records "
+              f"| {retained / 2 ** 20:8.1f} MB "
+              f"| {retained / size:6.0f} B/event "
+              f"| one week read {read * 1000:6.2f} ms")
+        LocalEventStorage()  # drop stored events
+
+
+if __name__ == "__main__":
+    for n in [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES:
+        run(n)
@@ -0,0 +1,69 @@
+"""Compares get_events read latency of SQLiteEventStorage with
+LocalEventStorage, on the same set of stored events.
+
+Usage: python -m benchmarks.storage_sqlite [SIZE]
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from app.core.sqlite_storage import SQLiteEventStorage
+from app.core.storage import LocalEventStorage
+from benchmarks.storage_index import EPOCH
+from benchmarks.storage_memory import iter_event_batches
+
+
+DEFAULT_SIZE = 1_000_000
+WINDOWS = (timedelta(hours=3), timedelta(days=1), timedelta(days=7))
+BATCH_SIZE = 100_000
+REPEAT = 20
+
+
+def measure(storage, size: int, window: timedelta) -> tuple:
+    """Returns median read latency (ms) and events count per read."""
+
+    rnd = random.Random(0)
+    # events start every minute; windows wider than all of them start at
+    # EPOCH
+    spread = max(timedelta(minutes=size) - window, timedelta(seconds=1))
+    latencies = []
+    for _ in range(REPEAT):
+        start = EPOCH + timedelta(
+            seconds=rnd.randrange(int(spread.total_seconds())))
+        started_at = time.perf_counter()
+        count = len(storage.get_events(start, start + window))
+        latencies.append(time.perf_counter() - started_at)
+    return statistics.median(latencies) * 1000, count
+
+
+def run(size: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storages = {
+            "local": LocalEventStorage(),
+            "sqlite": SQLiteEventStorage(
+                os.path.join(tmp_dir, "events.sqlite3")),
+        }
+        for name, storage in storages.items():
+            started_at = time.perf_counter()
+            for batch in iter_event_batches(size, BATCH_SIZE):
+                storage.set_events(batch)
+            print(f"{size:>10,} events | {name:<6} | filled in "
+                  f"{time.perf_counter() - started_at:6.1f} s")
+
+        for window in WINDOWS:
+            for name, storage in storages.items():
+                latency, count = measure(storage, size, window)
+                print(f"{size:>10,} events | {name:<6} | {str(window):>15} "
+                      f"window ({count:>6,} events) "
+                      f"| median read {latency:8.2f} ms")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if sys.argv[1:] else DEFAULT_SIZE)
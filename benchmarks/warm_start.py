@@ -0,0 +1,125 @@
+"""Measures time to the first useful /search result after restart, with
+SIZE stored events: served lazily from the memory-mapped snapshot
+(WarmStartStorage), with the snapshot decoded into LocalEventStorage
+first, and without snapshot, when the first result waits for the first
+refresh (of which only storage writes are measured, partner API fetch and
+parsing would come on top).
+
+With the lazy start, the snapshot is decoded into LocalEventStorage in
+background, so the stall it causes is measured as well: the slowest range
+query while it is decoded, and the first write after it.
+
+Restarts are measured in fresh processes, from process start (imports
+included) to the first range query result.
+
+Usage: python -m benchmarks.warm_start [SIZE]
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROCESS_STARTED_AT = time.perf_counter()
+
+# pylint: disable=wrong-import-position
+from datetime import timedelta  # noqa: E402
+
+from app.core.storage import LocalEventStorage  # noqa: E402
+from app.core.warm_storage import WarmStartStorage  # noqa: E402
+from benchmarks.storage_index import EPOCH, WINDOW  # noqa: E402
+from benchmarks.storage_memory import iter_event_batches  # noqa: E402
+
+
+DEFAULT_SIZE = 1_000_000
+
+
+def first_result(mode: str, path: str) -> tuple:
+    """Returns seconds from process start to the first query result after
+    restart, and the number of events in it."""
+
+    storage = LocalEventStorage(compact_records=True)
+    if mode == "lazy":
+        storage = WarmStartStorage(storage, path, 3600)
+    elif mode == "eager":
+        # pylint: disable=import-outside-toplevel
+        from app.core.snapshot import Snapshot
+        storage.restore(Snapshot(path).items())
+
+    start = EPOCH + timedelta(days=30)
+    count = len(storage.get_events(start, start + WINDOW))
+    return time.perf_counter() - PROCESS_STARTED_AT, count
+
+
+def decode_stall(path: str) -> tuple:
+    """Returns seconds to decode the snapshot in background after restart,
+    the slowest range query meanwhile, and the first write after it."""
+
+    storage = WarmStartStorage(LocalEventStorage(compact_records=True),
+                               path, 3600)
+    started_at = time.perf_counter()
+    start = EPOCH + timedelta(days=30)
+    slowest_query = 0.0
+    while not storage.restored.is_set():
+        query_started_at = time.perf_counter()
+        storage.get_events(start, start + WINDOW)
+        slowest_query = max(slowest_query,
+                            time.perf_counter() - query_started_at)
+        time.sleep(0.01)
+    decode_seconds = time.perf_counter() - started_at
+
+    event = next(iter_event_batches(1, 1))[0]
+    started_at = time.perf_counter()
+    storage.set_events([event.copy(update={"max_price": 1000.0})])
+    return decode_seconds, slowest_query, time.perf_counter() - started_at
+
+
+def run(size: int):
+    storage = LocalEventStorage(compact_records=True)
+    events = next(iter_event_batches(size, size))
+    started_at = time.perf_counter()
+    storage.set_events(events)
+    cold_seconds = time.perf_counter() - started_at
+    del events
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "events.snapshot")
+        started_at = time.perf_counter()
+        WarmStartStorage(storage, path, 0).save()
+        print(f"{size:>10,} events | snapshot saved in "
+              f"{time.perf_counter() - started_at:6.2f} s, "
+              f"{os.path.getsize(path) / 2 ** 20:6.1f} MiB")
+        print(f"{size:>10,} events | no snapshot  | first refresh stores "
+              f"events in {cold_seconds:8.3f} s (+ fetch and parse)")
+
+        for mode in ("lazy", "eager"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.warm_start", "--restart",
+                 mode, path], capture_output=True, text=True, check=True)
+            # the last line, after app logs
+            seconds, count = output.stdout.split()[-2:]
+            print(f"{size:>10,} events | {mode:<5} start  | first result "
+                  f"({count} events) in {float(seconds):8.3f} s "
+                  f"after restart")
+
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.warm_start", "--restart",
+             "stall", path], capture_output=True, text=True, check=True)
+        decode, slowest_query, first_write = map(
+            float, output.stdout.split()[-3:])
+        print(f"{size:>10,} events | lazy  start  | decoded in background "
+              f"in {decode:8.3f} s, slowest query meanwhile "
+              f"{slowest_query * 1000:8.2f} ms, first write after it "
+              f"{first_write * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:3] == ["--restart", "stall"]:
+        print(*decode_stall(sys.argv[3]))
+    elif sys.argv[1:2] == ["--restart"]:
+        print(*first_result(sys.argv[2], sys.argv[3]))
+    else:
+        run(int(sys.argv[1]) if sys.argv[1:] else DEFAULT_SIZE)
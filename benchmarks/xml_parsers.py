@@ -0,0 +1,82 @@
+"""Compares peak RSS and parse time of the tree xml parser
+(etree.fromstring + parse_events_data_from_xml) with the streaming one
+(iter_events_from_xml_chunks) on synthetic partner feeds.
+
+Every measurement runs in a fresh subprocess, so that peak RSS of one
+does not hide another.
+
+Usage: python -m benchmarks.xml_parsers [SIZE ...]
+"""
+
+from __future__ import annotations
+
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from lxml import etree
+
+from app.core import parsers
+from app.tests.stub_provider import iter_feed_chunks, make_feed
+
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+PARSERS = ("tree", "stream")
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def parse_tree(size: int) -> int:
+    # whole response body, as fetched by fetch_events_from_partner_api
+    content = make_feed(size)
+    root = etree.fromstring(content).getroottree().getroot()
+    return len(parsers.parse_events_data_from_xml(root))
+
+
+def parse_stream(size: int) -> int:
+    return sum(1 for _ in parsers.iter_events_from_xml_chunks(
+        iter_feed_chunks(size)))
+
+
+def measure(parser: str, size: int) -> dict:
+    baseline_rss = max_rss_mb()
+    started_at = time.perf_counter()
+    count = parse_tree(size) if parser == "tree" else parse_stream(size)
+    return {
+        "parser": parser,
+        "events": count,
+        "seconds": time.perf_counter() - started_at,
+        "peak_rss_mb": max_rss_mb() - baseline_rss,
+    }
+
+
+def run(parser: str, size: int) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-m", __spec__.name, "--measure", parser, str(size)],
+        capture_output=True, text=True, check=False)
+    if completed.returncode != 0:
+        return {"parser": parser, "events": size,
+                "error": completed.stderr.strip().splitlines()[-1:]}
+    return json.loads(completed.stdout)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        print(json.dumps(measure(sys.argv[2], int(sys.argv[3]))))
+        sys.exit()
+
+    for n in [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES:
+        for name in PARSERS:
+            result = run(name, n)
+            if "error" in result:
+                print(f"{n:>10,} events | {name:<6} | failed: "
+                      f"{result['error']}")
+                continue
+            print(f"{n:>10,} events | {name:<6} "
+                  f"| {result['seconds']:8.2f} s "
+                  f"| peak RSS +{result['peak_rss_mb']:8.1f} MB "
+                  f"| {result['events'] / result['seconds']:10,.0f} events/s")